@@ -0,0 +1,150 @@
+import asyncio
+import itertools
+import math
+import threading
+
+from django.conf import settings
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, route, retry_after):
+        super().__init__(route)
+        self.route = route
+        self.retry_after = retry_after
+
+
+class RouteClass:
+    def __init__(self, name, paths, max_concurrent, max_queue, max_wait, priority):
+        self.name = name
+        self.paths = tuple(paths)
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.priority = priority
+        self.active = 0
+        self.queued = 0
+        # Moving average of how long an admitted request takes, used to
+        # estimate the wait of a new request before queueing it
+        self.service_time = 0.1
+
+
+class _Waiter:
+    def __init__(self, route, seq, notify):
+        self.route = route
+        self.seq = seq
+        self.notify = notify
+        self.granted = False
+
+
+class AdmissionController:
+    # Per-process concurrency limits per route class plus one limit for all
+    # of them together. A request that can't start right away waits in a
+    # bounded queue; when a slot frees up it goes to the waiting request of
+    # the highest priority class (checkout first) that has room, so traffic
+    # spikes on the catalog can't starve checkouts that are under way.
+    # Requests are turned away immediately when the queue is full or their
+    # estimated wait is above the class's max_wait, and after max_wait if
+    # they still weren't admitted, so admitted requests keep a bounded
+    # latency instead of everything slowing down together.
+    def __init__(self, classes, max_concurrent=None):
+        self.classes = [RouteClass(name, **config) for name, config in classes.items()]
+        self.max_concurrent = max_concurrent
+        self.active = 0
+        self._lock = threading.Lock()
+        self._waiting = []
+        self._seq = itertools.count()
+
+    def classify(self, request):
+        for route in self.classes:
+            if request.path.startswith(route.paths):
+                return route
+        return None
+
+    def _has_room(self, route):
+        if route.active >= route.max_concurrent:
+            return False
+        return self.max_concurrent is None or self.active < self.max_concurrent
+
+    def _admit(self, route):
+        route.active += 1
+        self.active += 1
+
+    def _enter(self, route, notify):
+        # Admits the request (returns None) or queues it (returns the waiter)
+        with self._lock:
+            if self._has_room(route):
+                self._admit(route)
+                return None
+            estimated_wait = (route.queued + 1) * route.service_time / route.max_concurrent
+            if route.queued >= route.max_queue or estimated_wait > route.max_wait:
+                raise AdmissionRejected(route.name, math.ceil(max(estimated_wait, 1)))
+            waiter = _Waiter(route, next(self._seq), notify)
+            route.queued += 1
+            self._waiting.append(waiter)
+            return waiter
+
+    def _leave_queue(self, waiter):
+        # After the wait: True if a slot was handed over meanwhile, otherwise
+        # the waiter is taken out of the queue
+        with self._lock:
+            if waiter.granted:
+                return True
+            self._waiting.remove(waiter)
+            waiter.route.queued -= 1
+            return False
+
+    def _rejected(self, route):
+        retry_after = route.queued * route.service_time / route.max_concurrent
+        return AdmissionRejected(route.name, math.ceil(max(retry_after, 1)))
+
+    def acquire(self, route):
+        event = threading.Event()
+        waiter = self._enter(route, event.set)
+        if waiter is not None:
+            event.wait(route.max_wait)
+            if not self._leave_queue(waiter):
+                raise self._rejected(route)
+
+    async def aacquire(self, route):
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+
+        def notify():
+            loop.call_soon_threadsafe(lambda: granted.done() or granted.set_result(True))
+
+        waiter = self._enter(route, notify)
+        if waiter is None:
+            return
+        try:
+            await asyncio.wait_for(granted, route.max_wait)
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            # Client went away while queued, give back a slot it may have got
+            if self._leave_queue(waiter):
+                self.release(route, route.service_time)
+            raise
+        if not self._leave_queue(waiter):
+            raise self._rejected(route)
+
+    def release(self, route, duration):
+        with self._lock:
+            route.active -= 1
+            self.active -= 1
+            route.service_time = 0.8 * route.service_time + 0.2 * duration
+            while self._waiting:
+                eligible = [waiter for waiter in self._waiting if self._has_room(waiter.route)]
+                if not eligible:
+                    break
+                waiter = min(eligible, key=lambda waiter: (waiter.route.priority, waiter.seq))
+                self._waiting.remove(waiter)
+                waiter.route.queued -= 1
+                waiter.granted = True
+                self._admit(waiter.route)
+                waiter.notify()
+
+
+admission_controller = AdmissionController(
+    getattr(settings, 'ADMISSION_CONTROL', {}),
+    max_concurrent=getattr(settings, 'ADMISSION_MAX_CONCURRENT', None),
+)
@@ -0,0 +1,90 @@
+import datetime
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import (
+    ArchivedOrder, ArchivedOrderItem, ArchivedPayment, Order, OrderItem, OrderStatus, Payment,
+)
+from .reference import order_status
+
+# (order, order item, payment) models of the archive and the hot tier. The
+# archive comes first since its orders are the older ones.
+ORDER_TIERS = (
+    (ArchivedOrder, ArchivedOrderItem, ArchivedPayment),
+    (Order, OrderItem, Payment),
+)
+
+_ORDER_FIELDS = ['id', 'user_id', 'order_date', 'total_amount', 'order_status_id', 'tracking_number', 'shipping_address_id']
+_ITEM_FIELDS = ['id', 'order_id', 'product_id', 'quantity', 'price_per_unit']
+_PAYMENT_FIELDS = ['id', 'order_id', 'payment_method', 'amount', 'payment_date', 'payment_status_id']
+
+
+def archive_cutoff():
+    # Orders placed after this are never in the archive
+    return timezone.now() - datetime.timedelta(days=getattr(settings, 'ORDER_ARCHIVE_AFTER_DAYS', 365))
+
+
+def _archivable_status_ids():
+    status_ids = []
+    for name in getattr(settings, 'ORDER_ARCHIVE_STATUSES', ['DELIVERED', 'CANCELLED']):
+        try:
+            status_ids.append(order_status(name).id)
+        except OrderStatus.DoesNotExist:
+            pass
+    return status_ids
+
+
+def archive_batch(cutoff, status_ids, batch_size=500):
+    # Moves up to batch_size finished orders placed before `cutoff`, with
+    # their items and payments, in one transaction. Orders locked by a
+    # running request are skipped and picked up by a later batch. Returns
+    # the number of orders moved.
+    with transaction.atomic():
+        order_ids = list(
+            Order.objects
+            .select_for_update(skip_locked=True)
+            .filter(order_status_id__in=status_ids, order_date__lt=cutoff)
+            .order_by('order_date')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not order_ids:
+            return 0
+        ArchivedOrder.objects.bulk_create([
+            ArchivedOrder(**row) for row in Order.objects.filter(pk__in=order_ids).values(*_ORDER_FIELDS)
+        ])
+        ArchivedOrderItem.objects.bulk_create([
+            ArchivedOrderItem(**row) for row in OrderItem.objects.filter(order_id__in=order_ids).values(*_ITEM_FIELDS)
+        ])
+        ArchivedPayment.objects.bulk_create([
+            ArchivedPayment(**row) for row in Payment.objects.filter(order_id__in=order_ids).values(*_PAYMENT_FIELDS)
+        ])
+        Payment.objects.filter(order_id__in=order_ids).delete()
+        OrderItem.objects.filter(order_id__in=order_ids).delete()
+        Order.objects.filter(pk__in=order_ids).delete()
+    return len(order_ids)
+
+
+def archive_orders(batch_size=500, pause=0.5, max_batches=None, progress=None):
+    # Runs batches until nothing is left (or max_batches), sleeping `pause`
+    # seconds between them so replication and the live traffic keep up.
+    # Every batch commits on its own, so an interrupted run just continues
+    # where it stopped the next time.
+    cutoff = archive_cutoff()
+    status_ids = _archivable_status_ids()
+    moved = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        count = archive_batch(cutoff, status_ids, batch_size)
+        if not count:
+            break
+        moved += count
+        batches += 1
+        if progress:
+            progress(moved)
+        if count < batch_size:
+            break
+        time.sleep(pause)
+    return moved
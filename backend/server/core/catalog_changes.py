@@ -0,0 +1,85 @@
+from django.conf import settings
+from django.db.models import Max, Min
+
+from .change_log import is_settled, settle_cutoff, settled_count
+from .models import Brand, CatalogChange, Category, Product
+
+
+class ChangesExpired(Exception):
+    # The requested version is older than the retained change log
+    pass
+
+
+def _settle_seconds():
+    return getattr(settings, 'CATALOG_CHANGES_SETTLE_SECONDS', 30)
+
+
+def current_version():
+    # The highest version below which every change is visible. A change
+    # still being committed under a lower version would otherwise be
+    # skipped by a client syncing from here (see core/change_log.py).
+    cutoff = settle_cutoff(_settle_seconds())
+    settled = CatalogChange.objects.filter(changed_at__lte=cutoff).aggregate(version=Max('version'))['version']
+    recent = list(
+        CatalogChange.objects
+        .filter(version__gt=settled or 0)
+        .annotate(settled=is_settled('changed_at', _settle_seconds()))
+        .order_by('version')
+        .values_list('version', 'settled')
+    )
+    if settled is None:
+        settled = recent[0][0] - 1 if recent else 0
+    count = settled_count(settled, recent)
+    return recent[count - 1][0] if count else settled
+
+
+def collect_changes(since, limit=1000):
+    # Reads up to `limit` change log rows after `since` and reduces them to
+    # the latest action per object. Brand and category changes also mark
+    # the products that embed them as changed.
+    oldest = CatalogChange.objects.aggregate(version=Min('version'))['version']
+    if oldest is not None and oldest > since + 1:
+        raise ChangesExpired()
+
+    rows = list(
+        CatalogChange.objects
+        .filter(version__gt=since)
+        .annotate(settled=is_settled('changed_at', _settle_seconds()))
+        .order_by('version')
+        .values_list('version', 'entity', 'object_id', 'action', 'settled')[:limit]
+    )
+    # Everything read is returned, but the version handed back stays below
+    # a gap that an uncommitted change may still fill, so the next sync
+    # reads past it again (re-sent changes are harmless upserts)
+    settled = settled_count(since, [(row[0], row[4]) for row in rows])
+    latest = {}
+    for _, entity, object_id, action, _ in rows:
+        latest[(entity, object_id)] = action
+
+    changed = {'product': set(), 'category': set(), 'brand': set()}
+    deleted = {'product': set(), 'category': set(), 'brand': set()}
+    for (entity, object_id), action in latest.items():
+        if entity not in changed:
+            continue
+        if action == CatalogChange.DELETE:
+            deleted[entity].add(object_id)
+        else:
+            changed[entity].add(object_id)
+
+    if changed['category']:
+        # Products embed their category's parent as well
+        child_categories = Category.objects.filter(parent_id__in=changed['category']).values_list('id', flat=True)
+        affected = Product.objects.filter(category_id__in=changed['category'] | set(child_categories))
+        changed['product'].update(affected.values_list('id', flat=True))
+    if changed['brand']:
+        changed['product'].update(Product.objects.filter(brand_id__in=changed['brand']).values_list('id', flat=True))
+    changed['product'] -= deleted['product']
+
+    return {
+        'version': rows[settled - 1][0] if settled else max(since, 0),
+        'has_more': len(rows) == limit and settled == len(rows),
+        'changed': changed,
+        'deleted': deleted,
+        'categories': Category.objects.filter(pk__in=changed['category']).select_related('parent'),
+        'brands': Brand.objects.filter(pk__in=changed['brand']),
+    }
@@ -0,0 +1,193 @@
+from decimal import Decimal, InvalidOperation
+
+from django.db import connection, transaction
+
+from .feeds import FeedImport
+from .jobs import enqueue
+from .models import Brand, Category, Product, ProductImage
+from .signals import invalidate_catalog
+
+PRODUCT_FIELDS = ['name', 'description', 'price', 'stock_quantity', 'is_active', 'brand_id', 'category_id']
+TRUE_VALUES = {'1', 'true', 'yes', 'y'}
+
+
+def _parse_bool(value, default=True):
+    if value is None or value == '':
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in TRUE_VALUES
+
+
+def _parse_images(value):
+    # None means the feed has no images column, so images are left alone
+    if value is None:
+        return None
+    if isinstance(value, list):
+        urls = value
+    else:
+        urls = str(value).split('|')
+    return [url.strip() for url in urls if url and url.strip()]
+
+
+def _normalize(value):
+    # CSV has no NULL: an empty cell and a NULL column are the same value
+    return None if value == '' else value
+
+
+class CatalogImport(FeedImport):
+    # Upserts products from a feed with the columns id, name, description,
+    # price, stock_quantity, is_active, brand, category, category_parent and
+    # images ("|" separated in CSV, a list in NDJSON). Brands and categories
+    # are matched by name through in-memory maps and created when missing.
+    # Each batch reads the current rows with one query and only writes the
+    # products and images that differ, so re-importing an unchanged feed
+    # costs one SELECT per batch and no writes.
+    key_name = 'product_id'
+
+    def __init__(self, batch_size=1000):
+        super().__init__(batch_size)
+        self.brands = {name.lower(): pk for pk, name in Brand.objects.values_list('id', 'name')}
+        self.categories = {name.lower(): pk for pk, name in Category.objects.values_list('id', 'name')}
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.images_added = 0
+        self.images_removed = 0
+
+    def brand_id(self, name):
+        if not name:
+            return None
+        key = name.strip().lower()
+        if key not in self.brands:
+            self.brands[key] = Brand.objects.create(name=name.strip()).id
+        return self.brands[key]
+
+    def category_id(self, name, parent_name=None):
+        if not name:
+            return None
+        key = name.strip().lower()
+        if key not in self.categories:
+            parent_id = self.category_id(parent_name) if parent_name else None
+            self.categories[key] = Category.objects.create(name=name.strip(), parent_id=parent_id).id
+        return self.categories[key]
+
+    def parse(self, line_number, record):
+        if record is None:
+            self.error(line_number, None, 'Could not parse row.')
+            return None
+
+        raw_id = record.get('id')
+        try:
+            product_id = int(raw_id)
+        except (TypeError, ValueError):
+            self.error(line_number, raw_id, 'id must be an integer.')
+            return None
+
+        name = (record.get('name') or '').strip()
+        if not name or len(name) > 100:
+            self.error(line_number, product_id, 'name is required and at most 100 characters.')
+            return None
+
+        try:
+            price = Decimal(str(record.get('price'))).quantize(Decimal('0.01'))
+            stock_quantity = int(record.get('stock_quantity') or 0)
+        except (InvalidOperation, TypeError, ValueError):
+            self.error(line_number, product_id, 'price and stock_quantity must be numbers.')
+            return None
+
+        product = {
+            'id': product_id,
+            'name': name,
+            'description': record.get('description'),
+            'price': price,
+            'stock_quantity': stock_quantity,
+            'is_active': _parse_bool(record.get('is_active')),
+            'brand_id': self.brand_id(record.get('brand')),
+            'category_id': self.category_id(record.get('category'), record.get('category_parent')),
+        }
+        return product, _parse_images(record.get('images'))
+
+    def apply(self, batch):
+        # Later rows for the same product win
+        products = {product['id']: (product, images) for product, images in batch}
+        current = {
+            row['id']: row
+            for row in Product.objects.filter(pk__in=list(products)).values('id', *PRODUCT_FIELDS)
+        }
+
+        changed = []
+        for product_id, (product, _) in products.items():
+            row = current.get(product_id)
+            if row is None:
+                self.created += 1
+                changed.append(product)
+            elif any(_normalize(row[field]) != _normalize(product[field]) for field in PRODUCT_FIELDS):
+                self.updated += 1
+                changed.append(product)
+            else:
+                self.unchanged += 1
+
+        with transaction.atomic():
+            if changed:
+                Product.objects.bulk_create(
+                    [Product(**product) for product in changed],
+                    update_conflicts=True,
+                    # MySQL upserts on any unique key and rejects unique_fields
+                    unique_fields=['id'] if connection.features.supports_update_conflicts_with_target else None,
+                    update_fields=PRODUCT_FIELDS,
+                )
+            self.sync_images({
+                product_id: images for product_id, (_, images) in products.items() if images is not None
+            })
+
+    def sync_images(self, images_by_product):
+        if not images_by_product:
+            return
+        existing = {}
+        for image_id, product_id, image_url in ProductImage.objects.filter(
+            product_id__in=list(images_by_product)
+        ).values_list('id', 'product_id', 'image_url'):
+            existing.setdefault(product_id, {})[image_url] = image_id
+
+        to_delete = []
+        to_create = []
+        for product_id, urls in images_by_product.items():
+            current = existing.get(product_id, {})
+            to_delete += [image_id for url, image_id in current.items() if url not in urls]
+            to_create += [
+                ProductImage(product_id=product_id, image_url=url)
+                for url in dict.fromkeys(urls) if url not in current
+            ]
+
+        if to_delete:
+            ProductImage.objects.filter(pk__in=to_delete).delete()
+            self.images_removed += len(to_delete)
+        if to_create:
+            ProductImage.objects.bulk_create(to_create)
+            self.images_added += len(to_create)
+
+    def run(self, records, progress=None):
+        summary = super().run(records, progress)
+        # bulk_create() and the image bulk writes send no signals.
+        # Brands and categories are created with create() and invalidate on
+        # their own.
+        if self.created or self.updated:
+            invalidate_catalog('product')
+        if self.images_added or self.images_removed:
+            invalidate_catalog('product_image')
+        if self.images_added:
+            # Bulk created images have no ids here, the worker looks for
+            # every image without variants
+            enqueue('build_image_variants', image_ids=None)
+        return summary
+
+    def summary(self):
+        return dict(
+            super().summary(),
+            created=self.created,
+            updated=self.updated,
+            unchanged=self.unchanged,
+            images_added=self.images_added,
+            images_removed=self.images_removed,
+        )
@@ -0,0 +1,35 @@
+import datetime
+
+from django.db.models import BooleanField, ExpressionWrapper, Q
+from django.db.models.functions import Now
+
+# Helpers for the trigger-written logs (catalog_change, order_event). Their
+# ids come from AUTO_INCREMENT when the row is inserted, but transactions
+# commit in any order: a reader can see id 12 while id 11 is still
+# uncommitted. Readers therefore only move their high-water mark past a
+# gap once a row after it is older than the settle window; an older gap
+# is a transaction that rolled back (or an id InnoDB skipped).
+
+
+def settle_cutoff(seconds):
+    # On the database clock: the log rows get their timestamp from
+    # CURRENT_TIMESTAMP in the database's session time zone, which need not
+    # be the UTC that Django's timezone.now() returns
+    return Now() - datetime.timedelta(seconds=seconds)
+
+
+def is_settled(field, seconds):
+    # Annotation: True for rows older than the settle window
+    return ExpressionWrapper(Q(**{f'{field}__lte': settle_cutoff(seconds)}), output_field=BooleanField())
+
+
+def settled_count(after, rows):
+    # rows: (id, settled) in id order, all above `after`, where settled
+    # comes from is_settled(). Returns how many of them lie below the first
+    # gap that may still be filled.
+    expected = after + 1
+    for index, (row_id, settled) in enumerate(rows):
+        if row_id != expected and not settled:
+            return index
+        expected = row_id + 1
+    return len(rows)
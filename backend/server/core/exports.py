@@ -0,0 +1,132 @@
+import csv
+import datetime
+import io
+import json
+from collections import defaultdict
+
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .archive import ORDER_TIERS
+
+EXPORT_COLUMNS = [
+    'order_id', 'order_date', 'order_status', 'user_id', 'total_amount',
+    'tracking_number', 'address_line', 'city', 'postal_code', 'country',
+    'order_item_id', 'product_id', 'quantity', 'price_per_unit', 'subtotal',
+    'payment_method', 'payment_amount', 'payment_status',
+]
+
+# Columns read from order and the tables joined onto it, then from
+# order_item, in export order
+_ORDER_COLUMNS = [
+    'id', 'order_date', 'order_status__status_name', 'user_id', 'total_amount', 'tracking_number',
+    'shipping_address__address_line',
+    'shipping_address__city__city_name',
+    'shipping_address__city__postal_code',
+    'shipping_address__city__country',
+]
+_ITEM_COLUMNS = ['order_id', 'id', 'product_id', 'quantity', 'price_per_unit']
+
+EXPORT_FORMATS = ('csv', 'ndjson')
+
+
+class ExportFilterError(ValueError):
+    pass
+
+
+def parse_export_filters(date_from=None, date_to=None, status=None):
+    # Turns the raw query/command options into ORM filters for the order tables.
+    # Dates are inclusive days and become a half-open datetime range so that
+    # the index on order_date can be used.
+    filters = {}
+    for name, value, lookup, days in (
+        ('from', date_from, 'order_date__gte', 0),
+        ('to', date_to, 'order_date__lt', 1),
+    ):
+        if not value:
+            continue
+        day = parse_date(value)
+        if day is None:
+            raise ExportFilterError(f'"{name}" must be a date (YYYY-MM-DD).')
+        start = datetime.datetime.combine(day + datetime.timedelta(days=days), datetime.time.min)
+        filters[lookup] = timezone.make_aware(start, datetime.timezone.utc)
+    if status:
+        filters['order_status__status_name'] = status.upper()
+    return filters
+
+
+def _latest_payments(order_ids, payment_model):
+    payments = {}
+    rows = (
+        payment_model.objects
+        .filter(order_id__in=order_ids)
+        .order_by('payment_date', 'id')
+        .values_list('order_id', 'payment_method', 'amount', 'payment_status__status_name')
+    )
+    for order_id, method, amount, payment_status in rows:
+        payments[order_id] = (method, amount, payment_status)
+    return payments
+
+
+def iter_order_lines(filters, batch_size=2000):
+    # Walks the matching orders by (order_date, id) in fixed size batches
+    # (keyset pagination on the order_date index), so a narrow date range
+    # only reads its own orders and memory stays flat no matter how many
+    # lines match. The items and payments of each batch are loaded by
+    # order id. The MySQL driver buffers whole result sets, which rules out
+    # a single .iterator() query for very large exports. Archived orders
+    # come first, then the hot tables.
+    for order_model, item_model, payment_model in ORDER_TIERS:
+        queryset = order_model.objects.filter(**filters).order_by('order_date', 'id').values_list(*_ORDER_COLUMNS)
+        batch = list(queryset[:batch_size])
+        while batch:
+            order_ids = [order[0] for order in batch]
+            items = defaultdict(list)
+            lines = item_model.objects.filter(order_id__in=order_ids).order_by('id').values_list(*_ITEM_COLUMNS)
+            for order_id, *item in lines:
+                items[order_id].append(tuple(item))
+            payments = _latest_payments(order_ids, payment_model)
+            for order in batch:
+                for item in items[order[0]]:
+                    quantity, price_per_unit = item[2], item[3]
+                    subtotal = quantity * price_per_unit if price_per_unit is not None else None
+                    yield order + item + (subtotal,) + payments.get(order[0], (None, None, None))
+            last_date, last_id = batch[-1][1], batch[-1][0]
+            batch = list(queryset.filter(
+                Q(order_date__gt=last_date) | Q(order_date=last_date, id__gt=last_id)
+            )[:batch_size])
+
+
+def _format_value(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    if value is None or isinstance(value, (int, str)):
+        return value
+    return str(value)
+
+
+def iter_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for row in rows:
+        writer.writerow([_format_value(value) for value in row])
+        if buffer.tell() > 64 * 1024:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_ndjson(rows):
+    for row in rows:
+        record = dict(zip(EXPORT_COLUMNS, (_format_value(value) for value in row)))
+        yield json.dumps(record) + '\n'
+
+
+def iter_export(export_format, filters, batch_size=2000):
+    rows = iter_order_lines(filters, batch_size=batch_size)
+    if export_format == 'ndjson':
+        return iter_ndjson(rows)
+    return iter_csv(rows)
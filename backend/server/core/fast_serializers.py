@@ -0,0 +1,194 @@
+from rest_framework import serializers
+
+from .image_variants import represent_variants
+from .models import ArchivedOrder, ArchivedOrderItem, Category, OrderItem, ProductImage, ProductImageVariant
+from .serializers import (
+    BrandSerializer, CategorySerializer, OrderHistorySerializer, OrderItemDetailSerializer,
+    ProductImageSerializer, ProductSerializer,
+)
+
+
+class NotCompilable(Exception):
+    # The serializer has a field the fast path can't reproduce, the caller
+    # falls back to the DRF serializer
+    pass
+
+
+class RowPlan:
+    # Turns values() rows into the dicts a serializer produces for the same
+    # objects. The plan is read from a serializer instance, so trimming done
+    # by ?fields= / ?expand= carries over and the key order is identical.
+    # Fields named in `nested` are filled in by the caller from data that was
+    # loaded for the whole batch at once.
+    def __init__(self, serializer, nested=()):
+        self.fields = []
+        self.lookups = {'id'}
+        for name, field in serializer.fields.items():
+            if name in nested:
+                self.fields.append((name, None, None, ()))
+                continue
+            if field.source == '*' or isinstance(field, (serializers.BaseSerializer, serializers.SerializerMethodField)):
+                raise NotCompilable(name)
+            parts = field.source.split('.')
+            lookup = '__'.join(parts)
+            # Related pks and read-only attributes are rendered as they are
+            if isinstance(field, (serializers.PrimaryKeyRelatedField, serializers.ReadOnlyField)):
+                convert = None
+            else:
+                convert = field.to_representation
+            # DRF leaves a field out when a relation on its source path is
+            # None (e.g. product.name of an item without product)
+            guards = ['__'.join(parts[:depth]) for depth in range(1, len(parts))]
+            self.lookups.update([lookup] + guards)
+            self.fields.append((name, lookup, convert, guards))
+
+    def values(self, queryset, *extra):
+        return queryset.prefetch_related(None).values(*self.lookups.union(extra))
+
+    def joined_lookups(self, prefix, *extra):
+        # The same columns read through a relation, e.g. "brand__name"
+        return [prefix + lookup for lookup in self.lookups.union(extra)]
+
+    def unprefix(self, row, prefix, *extra):
+        return {lookup: row[prefix + lookup] for lookup in self.lookups.union(extra)}
+
+    def represent(self, row, nested=None):
+        data = {}
+        for name, lookup, convert, guards in self.fields:
+            if lookup is None:
+                data[name] = nested[name](row)
+            elif not any(row[guard] is None for guard in guards):
+                value = row[lookup]
+                data[name] = value if value is None or convert is None else convert(value)
+        return data
+
+
+def serialize_categories(category_ids, rows=None):
+    # CategorySerializer embeds the whole parent chain. Parents that are not
+    # in `rows` already are loaded level by level and every category is
+    # rendered once.
+    plan = RowPlan(CategorySerializer(), nested=('parent',))
+    rows = dict(rows or {})
+    pending = set(category_ids) | {row['parent'] for row in rows.values()}
+    pending -= {None} | set(rows)
+    while pending:
+        for row in plan.values(Category.objects.filter(pk__in=pending), 'parent'):
+            rows[row['id']] = row
+        # Ids that don't exist are not asked for again
+        rows.update({category_id: None for category_id in pending if category_id not in rows})
+        pending = {row['parent'] for row in rows.values() if row and row['parent'] is not None} - set(rows)
+
+    data = {}
+
+    def represent(category_id):
+        if rows.get(category_id) is None:
+            return None
+        if category_id not in data:
+            data[category_id] = plan.represent(rows[category_id], {'parent': lambda row: represent(row['parent'])})
+        return data[category_id]
+
+    for category_id in rows:
+        represent(category_id)
+    return data
+
+
+def serialize_product_images(product_ids):
+    plan = RowPlan(ProductImageSerializer(), nested=('variants',))
+    rows = list(plan.values(ProductImage.objects.filter(product_id__in=product_ids).order_by('id'), 'product'))
+    variants = {}
+    for row in ProductImageVariant.objects.filter(image_id__in=[row['id'] for row in rows]).values_list(
+        'image_id', 'variant', 'format', 'width', 'height', 'path'
+    ):
+        variants.setdefault(row[0], []).append(row[1:])
+    getters = {'variants': lambda row: represent_variants(variants.get(row['id'], ()))}
+    images = {}
+    for row in rows:
+        images.setdefault(row['product'], []).append(plan.represent(row, getters))
+    return images
+
+
+def serialize_products(queryset, serializer):
+    # Returns [(product id, data)] for a queryset of products, rendered like
+    # `serializer` (a ProductSerializer instance) would render them. Brand,
+    # category and the category's parent come from the same row (one JOIN,
+    # like select_related), images from one extra query.
+    fields = serializer.fields
+    nested = []
+    extra = []
+    if isinstance(fields.get('brand'), BrandSerializer):
+        brand_plan = RowPlan(BrandSerializer())
+        nested.append('brand')
+        extra += ['brand'] + brand_plan.joined_lookups('brand__')
+    if isinstance(fields.get('category'), CategorySerializer):
+        category_plan = RowPlan(CategorySerializer(), nested=('parent',))
+        nested.append('category')
+        extra += ['category'] + category_plan.joined_lookups('category__', 'parent')
+        extra += ['category__parent'] + category_plan.joined_lookups('category__parent__', 'parent')
+    images = fields.get('images')
+    if isinstance(images, serializers.ListSerializer) and isinstance(images.child, ProductImageSerializer):
+        nested.append('images')
+    plan = RowPlan(serializer, nested=nested)
+
+    rows = list(plan.values(queryset, *extra))
+    getters = {}
+    if 'brand' in nested:
+        brands = {
+            row['brand']: brand_plan.represent(brand_plan.unprefix(row, 'brand__'))
+            for row in rows if row['brand'] is not None
+        }
+        getters['brand'] = lambda row: brands.get(row['brand'])
+    if 'category' in nested:
+        known = {}
+        for row in rows:
+            for prefix in ('category__', 'category__parent__'):
+                if row[prefix + 'id'] is not None:
+                    known[row[prefix + 'id']] = category_plan.unprefix(row, prefix, 'parent')
+        categories = serialize_categories((), rows=known)
+        getters['category'] = lambda row: categories.get(row['category'])
+    if 'images' in nested:
+        images_by_product = serialize_product_images([row['id'] for row in rows])
+        getters['images'] = lambda row: images_by_product.get(row['id'], [])
+    return [(row['id'], plan.represent(row, getters)) for row in rows]
+
+
+def serialize_order_items(order_ids, model=OrderItem):
+    plan = RowPlan(OrderItemDetailSerializer(), nested=('subtotal',))
+    getters = {'subtotal': lambda row: row['quantity'] * row['price_per_unit']}
+    items = {}
+    queryset = model.objects.filter(order_id__in=order_ids).order_by('order_id', 'id')
+    for row in plan.values(queryset, 'order', 'quantity', 'price_per_unit'):
+        items.setdefault(row['order'], []).append(plan.represent(row, getters))
+    return items
+
+
+def serialize_order_history(queryset, serializer):
+    # Returns [(order id, data)] rendered like OrderHistorySerializer, with
+    # the items of all orders loaded in one query instead of two per order.
+    # Works for hot orders and for archived ones.
+    plan = RowPlan(serializer, nested=('items', 'itemCount'))
+    rows = list(plan.values(queryset))
+    item_model = ArchivedOrderItem if queryset.model is ArchivedOrder else OrderItem
+    items = serialize_order_items([row['id'] for row in rows], item_model)
+    getters = {
+        'items': lambda row: items.get(row['id'], []),
+        'itemCount': lambda row: len(items.get(row['id'], ())),
+    }
+    return [(row['id'], plan.represent(row, getters)) for row in rows]
+
+
+FAST_SERIALIZERS = {
+    ProductSerializer: serialize_products,
+    OrderHistorySerializer: serialize_order_history,
+}
+
+
+def fast_serialize(queryset, serializer):
+    # [(pk, data)] for the queryset, or None when `serializer` has no fast
+    # path and has to be run through DRF
+    serialize = FAST_SERIALIZERS.get(type(serializer))
+    if serialize is None:
+        return None
+    try:
+        return serialize(queryset, serializer)
+    except NotCompilable:
+        return None
@@ -0,0 +1,71 @@
+import csv
+import json
+
+IMPORT_FORMATS = ('csv', 'ndjson')
+MAX_REPORTED_ERRORS = 1000
+
+
+def iter_records(lines, import_format):
+    # Yields (line_number, record) from an iterable of text lines. A record
+    # that can't be parsed is yielded as (line_number, None).
+    if import_format == 'ndjson':
+        for line_number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            yield line_number, record if isinstance(record, dict) else None
+    else:
+        reader = csv.DictReader(lines)
+        for record in reader:
+            yield reader.line_num, record
+
+
+class FeedImport:
+    # Base for the feed importers: parse() turns a record into an update (or
+    # reports an error and returns None) and apply() writes a batch of them.
+    key_name = 'id'
+
+    def __init__(self, batch_size=1000):
+        self.batch_size = batch_size
+        self.processed = 0
+        self.error_count = 0
+        self.errors = []
+
+    def error(self, line_number, key, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line_number, self.key_name: key, 'error': message})
+
+    def run(self, records, progress=None):
+        batch = []
+        for line_number, record in records:
+            self.processed += 1
+            update = self.parse(line_number, record)
+            if update is not None:
+                batch.append(update)
+            if len(batch) >= self.batch_size:
+                self.apply(batch)
+                batch = []
+                if progress:
+                    progress(self)
+        if batch:
+            self.apply(batch)
+            if progress:
+                progress(self)
+        return self.summary()
+
+    def parse(self, line_number, record):
+        raise NotImplementedError
+
+    def apply(self, batch):
+        raise NotImplementedError
+
+    def summary(self):
+        return {
+            'processed': self.processed,
+            'error_count': self.error_count,
+            'errors': self.errors,
+        }
@@ -0,0 +1,21 @@
+from django.db.models import Q
+from rest_framework.filters import BaseFilterBackend
+
+
+class UserSearchFilter(BaseFilterBackend):
+    # ?search= matches the start of the email, first name or last name, and
+    # "first last" matches both names. Only prefix matches, so MySQL can use
+    # the unique email index and the name indexes (see ElectroMartV2.sql)
+    # instead of scanning the table the way "contains" does.
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        terms = request.query_params.get(self.search_param, '').split()
+        if not terms:
+            return queryset
+        if len(terms) == 1:
+            term = terms[0]
+            return queryset.filter(
+                Q(email__istartswith=term) | Q(first_name__istartswith=term) | Q(last_name__istartswith=term)
+            )
+        return queryset.filter(first_name__istartswith=terms[0], last_name__istartswith=' '.join(terms[1:]))
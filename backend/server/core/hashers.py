@@ -0,0 +1,9 @@
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+
+class TunablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    # Same algorithm name as Django's PBKDF2 hasher, so existing hashes keep
+    # working. Changing PASSWORD_PBKDF2_ITERATIONS makes must_update() true for
+    # old hashes and they are rehashed on the next successful login.
+    iterations = getattr(settings, 'PASSWORD_PBKDF2_ITERATIONS', PBKDF2PasswordHasher.iterations)
@@ -0,0 +1,101 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password, verify_password
+
+
+class HashingOverloaded(Exception):
+    pass
+
+
+def _init_worker(settings_module):
+    # Needed when the pool uses the "spawn" start method (macOS, Windows)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+    django.setup()
+
+
+def _verify(password, encoded):
+    # Returns (is_correct, must_update)
+    return verify_password(password, encoded)
+
+
+def _hash(password):
+    return make_password(password)
+
+
+class PasswordHashingService:
+    # Runs password hashing on a bounded process pool so that a burst of
+    # logins does not hold the GIL of the worker serving catalog requests.
+    # With workers=0 hashing runs inline on the calling thread. Either way at
+    # most max_pending hashes may be queued or running; beyond that calls
+    # fail fast with HashingOverloaded.
+    def __init__(self, workers=0, max_pending=32):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    initializer=_init_worker,
+                    initargs=(os.environ.get('DJANGO_SETTINGS_MODULE', 'server.settings'),),
+                )
+            return self._executor
+
+    def _acquire(self):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise HashingOverloaded()
+            self._pending += 1
+
+    def _release(self, *args):
+        with self._lock:
+            self._pending -= 1
+
+    def _submit(self, fn, *args):
+        executor = self._get_executor()
+        self._acquire()
+        try:
+            future = executor.submit(fn, *args)
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    def _run(self, fn, *args):
+        if not self.workers:
+            self._acquire()
+            try:
+                return fn(*args)
+            finally:
+                self._release()
+        return self._submit(fn, *args).result()
+
+    def verify(self, password, encoded):
+        return self._run(_verify, password, encoded)
+
+    def hash(self, password):
+        return self._run(_hash, password)
+
+    def check_user_password(self, user, password):
+        # Like check_password(), and rehashes the stored password when the
+        # hasher settings changed since it was created.
+        is_correct, must_update = self.verify(password, user.password)
+        if is_correct and must_update:
+            user.password = self.hash(password)
+            user.save(update_fields=['password'])
+        return is_correct
+
+
+password_hashing = PasswordHashingService(
+    workers=getattr(settings, 'PASSWORD_HASHING_WORKERS', 0),
+    max_pending=getattr(settings, 'PASSWORD_HASHING_MAX_PENDING', 32),
+)
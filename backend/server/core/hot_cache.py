@@ -0,0 +1,44 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+class HotProductCache:
+    # Small per-process LRU for serialized products. Entries expire after
+    # `ttl` seconds, so a price change is picked up without any invalidation.
+    def __init__(self, max_size=256, ttl=30):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+hot_product_cache = HotProductCache(
+    max_size=getattr(settings, 'HOT_PRODUCT_CACHE_SIZE', 256),
+    ttl=getattr(settings, 'HOT_PRODUCT_CACHE_TTL', 30),
+)
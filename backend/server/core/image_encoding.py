@@ -0,0 +1,48 @@
+import hashlib
+import io
+import os
+from pathlib import Path
+
+from PIL import Image, ImageOps
+
+# Resizing and encoding of product image variants. Runs in the worker
+# processes of core/image_variants.py, so nothing in here uses Django.
+
+EXTENSIONS = {'jpeg': 'jpg', 'webp': 'webp'}
+ENCODER_OPTIONS = {'jpeg': {'optimize': True, 'progressive': True}, 'webp': {}}
+
+
+def _store(root, data, extension):
+    # Content addressed: the name is the hash of the file, so a file is
+    # never changed once written and identical variants are stored once
+    digest = hashlib.sha256(data).hexdigest()
+    path = f'{digest[:2]}/{digest}.{extension}'
+    target = root / path
+    if not target.exists():
+        target.parent.mkdir(parents=True, exist_ok=True)
+        temporary = target.with_name(f'{target.name}.{os.getpid()}.tmp')
+        temporary.write_bytes(data)
+        os.replace(temporary, target)
+    return path
+
+
+def encode_variants(source, root, sizes, formats, quality):
+    # Returns (variant, format, width, height, path) for every variant of
+    # one source image
+    with Image.open(io.BytesIO(source)) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+        image.load()
+
+    results = []
+    for variant, size in sizes.items():
+        resized = image.copy()
+        resized.thumbnail(tuple(size), Image.Resampling.LANCZOS)
+        for format in formats:
+            encoded = resized.convert('RGB') if format == 'jpeg' else resized
+            buffer = io.BytesIO()
+            encoded.save(buffer, format=format.upper(), quality=quality, **ENCODER_OPTIONS[format])
+            path = _store(Path(root), buffer.getvalue(), EXTENSIONS[format])
+            results.append((variant, format, resized.width, resized.height, path))
+    return results
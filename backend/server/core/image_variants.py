@@ -0,0 +1,203 @@
+import hashlib
+import json
+import logging
+import multiprocessing
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+
+from .image_encoding import encode_variants
+from .models import ProductImage, ProductImageVariant
+from .signals import invalidate_catalog
+
+logger = logging.getLogger(__name__)
+
+UNCHANGED = object()
+
+
+def variants_dir():
+    return Path(getattr(settings, 'IMAGE_VARIANTS_DIR', settings.BASE_DIR / 'image_variants'))
+
+
+def variant_sizes():
+    # Variant name -> bounding box, the image is scaled down to fit inside it
+    return getattr(settings, 'IMAGE_VARIANTS', {
+        'thumbnail': [160, 160],
+        'card': [480, 480],
+        'detail': [1200, 1200],
+    })
+
+
+def variant_formats():
+    return getattr(settings, 'IMAGE_VARIANT_FORMATS', ['jpeg', 'webp'])
+
+
+def variant_quality():
+    return getattr(settings, 'IMAGE_VARIANT_QUALITY', 82)
+
+
+def current_spec():
+    # Short hash of the variant settings, variants made with other settings
+    # are rebuilt
+    spec = [variant_sizes(), variant_formats(), variant_quality()]
+    return hashlib.sha1(json.dumps(spec, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def variant_url(path):
+    return getattr(settings, 'IMAGE_VARIANTS_URL', '/api/images/') + path
+
+
+def represent_variants(rows):
+    # {variant: {width, height, <format>: url}} from (variant, format, width,
+    # height, path) rows, in the order of IMAGE_VARIANTS and its formats
+    variants = list(variant_sizes())
+    formats = list(variant_formats())
+
+    def position(row):
+        return (
+            variants.index(row[0]) if row[0] in variants else len(variants),
+            formats.index(row[1]) if row[1] in formats else len(formats),
+        )
+
+    data = {}
+    for variant, format, width, height, path in sorted(rows, key=position):
+        data.setdefault(variant, {'width': width, 'height': height})[format] = variant_url(path)
+    return data
+
+
+def _source_opener():
+    # urlopen also reads file:// and ftp:// URLs, image sources are only
+    # fetched over HTTP(S), redirects included
+    opener = urllib.request.OpenerDirector()
+    for handler in [
+        urllib.request.ProxyHandler(), urllib.request.UnknownHandler(), urllib.request.HTTPHandler(),
+        urllib.request.HTTPSHandler(), urllib.request.HTTPDefaultErrorHandler(),
+        urllib.request.HTTPRedirectHandler(), urllib.request.HTTPErrorProcessor(),
+    ]:
+        opener.add_handler(handler)
+    return opener
+
+
+def fetch_source(url):
+    if urllib.parse.urlsplit(url).scheme not in ('http', 'https'):
+        raise ValueError(f'{url} is not an http or https URL')
+    max_bytes = getattr(settings, 'IMAGE_SOURCE_MAX_BYTES', 20 * 1024 * 1024)
+    with _source_opener().open(url, timeout=getattr(settings, 'IMAGE_SOURCE_TIMEOUT', 10)) as response:
+        data = response.read(max_bytes + 1)
+    if len(data) > max_bytes:
+        raise ValueError(f'{url} is larger than {max_bytes} bytes')
+    return data
+
+
+class VariantBuilder:
+    # Builds the variants of product images whose variants are missing or
+    # stale. Sources are downloaded on a thread pool and decoded, resized and
+    # encoded on a process pool (workers=0 encodes on the calling thread).
+    # Only images that changed are encoded again: a new image_url or new
+    # variant settings are seen from the stored rows, and with refresh=True
+    # every source is downloaded again and re-encoded only if its content
+    # hash differs.
+    def __init__(self, workers=0, downloads=8, refresh=False):
+        self.workers = workers
+        self.downloads = downloads
+        self.refresh = refresh
+        self.spec = current_spec()
+        self.built = 0
+        self.unchanged = 0
+        self.failed = 0
+
+    def is_stale(self, image, rows):
+        expected = {(variant, format) for variant in variant_sizes() for format in variant_formats()}
+        if {(row.variant, row.format) for row in rows} != expected:
+            return True
+        return any(row.source_url != image.image_url or row.spec != self.spec for row in rows)
+
+    def run(self, image_ids=None, progress=None):
+        images = ProductImage.objects.order_by('id')
+        if image_ids is not None:
+            images = images.filter(pk__in=image_ids)
+        images = list(images.prefetch_related('variants'))
+        todo = [
+            image for image in images
+            if self.refresh or self.is_stale(image, image.variants.all())
+        ]
+        self.unchanged = len(images) - len(todo)
+
+        encoder = None
+        if self.workers:
+            # Spawned, the download threads are already running
+            encoder = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+        try:
+            with ThreadPoolExecutor(max_workers=self.downloads) as downloader:
+                for image, result in zip(todo, downloader.map(lambda image: self.process(image, encoder), todo)):
+                    if result is None:
+                        self.failed += 1
+                    elif result is UNCHANGED:
+                        self.unchanged += 1
+                    else:
+                        self.save(image, *result)
+                    if progress:
+                        progress(self.summary())
+        finally:
+            if encoder is not None:
+                encoder.shutdown()
+
+        if self.built:
+            invalidate_catalog('product_image')
+        return self.summary()
+
+    def process(self, image, encoder):
+        # Runs on the download threads: (source digest, variants), UNCHANGED
+        # when the source is the same as last time, or None if it failed
+        try:
+            source = fetch_source(image.image_url)
+            digest = hashlib.sha256(source).hexdigest()
+            rows = list(image.variants.all())
+            if rows and not self.is_stale(image, rows) and all(row.source_digest == digest for row in rows):
+                return UNCHANGED
+            args = (source, str(variants_dir()), variant_sizes(), variant_formats(), variant_quality())
+            if encoder is None:
+                variants = encode_variants(*args)
+            else:
+                variants = encoder.submit(encode_variants, *args).result()
+            return digest, variants
+        except Exception:
+            logger.warning('Could not build variants of product image %s (%s)', image.id, image.image_url, exc_info=True)
+            return None
+
+    def save(self, image, digest, variants):
+        with transaction.atomic():
+            ProductImageVariant.objects.filter(image=image).delete()
+            ProductImageVariant.objects.bulk_create([
+                ProductImageVariant(
+                    image=image, variant=variant, format=format, width=width, height=height, path=path,
+                    source_url=image.image_url, source_digest=digest, spec=self.spec,
+                )
+                for variant, format, width, height, path in variants
+            ])
+        self.built += 1
+
+    def summary(self):
+        return {'built': self.built, 'unchanged': self.unchanged, 'failed': self.failed}
+
+
+def prune_variant_files(min_age=3600):
+    # Deletes stored files no variant row points to any more (old sources
+    # and settings). Files newer than min_age seconds are kept, a build may
+    # not have saved their rows yet. Returns the number of files deleted.
+    root = variants_dir()
+    if not root.exists():
+        return 0
+    used = set(ProductImageVariant.objects.values_list('path', flat=True))
+    cutoff = time.time() - min_age
+    deleted = 0
+    for path in root.glob('*/*'):
+        if path.relative_to(root).as_posix() not in used and path.stat().st_mtime < cutoff:
+            path.unlink()
+            deleted += 1
+    return deleted
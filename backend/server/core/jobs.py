@@ -0,0 +1,112 @@
+import contextlib
+import datetime
+import logging
+import traceback
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# Task name -> function, filled in by @task (see core/tasks.py)
+TASKS = {}
+
+
+def task(name, atomic=True):
+    # atomic=False runs the task outside the job's transaction, for long
+    # tasks that commit their work in steps and can safely run again after
+    # a partial run
+    def register(func):
+        func.atomic = atomic
+        TASKS[name] = func
+        return func
+    return register
+
+
+def enqueue(task_name, delay=0, max_attempts=None, **payload):
+    # The job row is written in the caller's transaction, so workers see it
+    # exactly when that transaction commits, and it is never lost after a
+    # commit the way a job queued from an on_commit hook can be.
+    return Job.objects.create(
+        task=task_name,
+        payload=payload,
+        run_at=timezone.now() + datetime.timedelta(seconds=delay),
+        max_attempts=max_attempts or getattr(settings, 'JOB_MAX_ATTEMPTS', 5),
+    )
+
+
+def enqueue_many(jobs, delay=0, max_attempts=None):
+    # [(task name, payload)] written with one INSERT
+    run_at = timezone.now() + datetime.timedelta(seconds=delay)
+    max_attempts = max_attempts or getattr(settings, 'JOB_MAX_ATTEMPTS', 5)
+    return Job.objects.bulk_create([
+        Job(task=task_name, payload=payload, run_at=run_at, max_attempts=max_attempts)
+        for task_name, payload in jobs
+    ])
+
+
+def retry_delay(attempts):
+    # Exponential backoff: 2s, 4s, 8s ... capped by JOB_MAX_RETRY_DELAY
+    base = getattr(settings, 'JOB_RETRY_BASE_DELAY', 2)
+    cap = getattr(settings, 'JOB_MAX_RETRY_DELAY', 600)
+    return min(cap, base * 2 ** max(attempts - 1, 0))
+
+
+def claim_job(worker_name):
+    # Picks the next due job, skipping rows other workers have locked. Jobs
+    # left "running" by a worker that died are picked up again after
+    # JOB_LOCK_TIMEOUT seconds.
+    now = timezone.now()
+    stale = now - datetime.timedelta(seconds=getattr(settings, 'JOB_LOCK_TIMEOUT', 300))
+    with transaction.atomic():
+        job = (
+            Job.objects
+            .select_for_update(skip_locked=True)
+            .filter(status=Job.QUEUED, run_at__lte=now)
+            .order_by('run_at', 'id')
+            .first()
+        )
+        if job is None:
+            job = (
+                Job.objects
+                .select_for_update(skip_locked=True)
+                .filter(status=Job.RUNNING, locked_at__lt=stale)
+                .order_by('locked_at', 'id')
+                .first()
+            )
+        if job is None:
+            return None
+        job.status = Job.RUNNING
+        job.attempts += 1
+        job.locked_by = worker_name
+        job.locked_at = now
+        job.save(update_fields=['status', 'attempts', 'locked_by', 'locked_at'])
+    return job
+
+
+def run_job(job):
+    func = TASKS.get(job.task)
+    try:
+        if func is None:
+            raise LookupError(f'Unknown task "{job.task}"')
+        # Database work done by the task commits together with the job
+        # being marked done, so a retry never applies it twice.
+        with transaction.atomic() if func.atomic else contextlib.nullcontext():
+            func(**job.payload)
+            Job.objects.filter(pk=job.pk).update(status=Job.DONE, locked_by='', locked_at=None)
+        return True
+    except Exception:
+        error = traceback.format_exc()
+        logger.warning('Job %s (%s) failed on attempt %s', job.pk, job.task, job.attempts)
+        if job.attempts >= job.max_attempts or func is None:
+            changes = {'status': Job.FAILED}
+        else:
+            changes = {
+                'status': Job.QUEUED,
+                'run_at': timezone.now() + datetime.timedelta(seconds=retry_delay(job.attempts)),
+            }
+        Job.objects.filter(pk=job.pk).update(last_error=error, locked_by='', locked_at=None, **changes)
+        return False
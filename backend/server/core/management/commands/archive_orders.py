@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from core.archive import archive_orders
+
+
+class Command(BaseCommand):
+    help = 'Move finished orders older than ORDER_ARCHIVE_AFTER_DAYS to the archive tables. Safe to interrupt and rerun.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--pause', type=float, default=0.5, help='Seconds to sleep between batches')
+        parser.add_argument('--max-batches', type=int, default=None)
+
+    def handle(self, *args, **options):
+        moved = archive_orders(
+            batch_size=options['batch_size'],
+            pause=options['pause'],
+            max_batches=options['max_batches'],
+            progress=lambda count: self.stdout.write(f'{count} orders archived'),
+        )
+        self.stdout.write(self.style.SUCCESS(f'Archived {moved} orders.'))
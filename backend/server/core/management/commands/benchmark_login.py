@@ -0,0 +1,68 @@
+import statistics
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import Client
+
+
+class Command(BaseCommand):
+    help = 'Measure login throughput while catalog reads run concurrently in the same process.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--email', required=True, help='Email of an existing user')
+        parser.add_argument('--password', required=True)
+        parser.add_argument('--seconds', type=float, default=10)
+        parser.add_argument('--login-threads', type=int, default=4)
+        parser.add_argument('--catalog-threads', type=int, default=4)
+        parser.add_argument('--catalog-path', default='/api/products/?fields=id,name,price')
+
+    def handle(self, *args, **options):
+        deadline = time.monotonic() + options['seconds']
+        results = {'login': [], 'catalog': [], 'login_status': {}}
+        lock = threading.Lock()
+
+        def run(kind, request):
+            client = Client(SERVER_NAME='localhost')
+            timings = []
+            statuses = {}
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                response = request(client)
+                timings.append(time.perf_counter() - started)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            with lock:
+                results[kind].extend(timings)
+                if kind == 'login':
+                    for code, count in statuses.items():
+                        results['login_status'][code] = results['login_status'].get(code, 0) + count
+
+        def login(client):
+            return client.post(
+                '/api/login/',
+                {'email': options['email'], 'password': options['password']},
+                content_type='application/json',
+            )
+
+        def catalog(client):
+            return client.get(options['catalog_path'])
+
+        threads = [threading.Thread(target=run, args=('login', login)) for _ in range(options['login_threads'])]
+        threads += [threading.Thread(target=run, args=('catalog', catalog)) for _ in range(options['catalog_threads'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        seconds = options['seconds']
+        for kind in ('login', 'catalog'):
+            timings = sorted(results[kind])
+            if not timings:
+                self.stdout.write(f'{kind}: no requests completed')
+                continue
+            p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+            self.stdout.write(
+                f'{kind}: {len(timings) / seconds:.1f} req/s, '
+                f'p50 {statistics.median(timings) * 1000:.1f} ms, p95 {p95 * 1000:.1f} ms'
+            )
+        self.stdout.write(f'login status codes: {results["login_status"]}')
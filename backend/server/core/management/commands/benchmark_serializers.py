@@ -0,0 +1,50 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from core.fast_serializers import fast_serialize
+from core.models import Order, Product
+from core.serializers import OrderHistorySerializer, ProductSerializer
+
+
+class Command(BaseCommand):
+    help = 'Compare CPU time of the DRF serializers and the fast path on the product list and order history.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--limit', type=int, default=1000, help='Rows per run')
+
+    def measure(self, runs, serialize):
+        # Process time, so waiting on the database isn't counted
+        timings = []
+        for _ in range(runs):
+            started = time.process_time()
+            data = serialize()
+            timings.append(time.process_time() - started)
+        return statistics.median(timings), data
+
+    def handle(self, *args, **options):
+        limit = options['limit']
+        cases = [
+            ('products', Product.objects.order_by('id')[:limit], ProductSerializer()),
+            ('order history', Order.objects.order_by('-order_date')[:limit], OrderHistorySerializer()),
+        ]
+        renderer = JSONRenderer()
+        for name, queryset, serializer in cases:
+            def drf():
+                objects = serializer.optimize_queryset(queryset) if hasattr(serializer, 'optimize_queryset') else queryset
+                return type(serializer)(list(objects), many=True).data
+
+            def fast():
+                return [data for _, data in fast_serialize(queryset, serializer)]
+
+            drf_seconds, drf_data = self.measure(options['runs'], drf)
+            fast_seconds, fast_data = self.measure(options['runs'], fast)
+            if renderer.render(drf_data) != renderer.render(fast_data):
+                raise CommandError(f'{name}: fast path output differs from the DRF serializer')
+            self.stdout.write(
+                f'{name} ({len(fast_data)} rows): DRF {drf_seconds * 1000:.1f} ms, '
+                f'fast {fast_seconds * 1000:.1f} ms CPU ({drf_seconds / max(fast_seconds, 1e-9):.1f}x)'
+            )
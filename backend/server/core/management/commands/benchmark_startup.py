@@ -0,0 +1,52 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Runs in a fresh interpreter, so nothing is imported or connected yet
+PROBE = '''
+import json, os, sys, time
+started = time.perf_counter()
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'server.settings')
+from server.wsgi import application
+ready = time.perf_counter()
+from django.test import Client
+client = Client(SERVER_NAME='localhost')
+timings = []
+for _ in range(2):
+    request_started = time.perf_counter()
+    client.get(sys.argv[1])
+    timings.append(time.perf_counter() - request_started)
+print(json.dumps({'startup': ready - started, 'first': timings[0], 'second': timings[1]}))
+'''
+
+
+class Command(BaseCommand):
+    help = 'Compare worker startup time and first request latency with and without the warm-up.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--path', default='/api/products/?fields=id,name,price')
+
+    def probe(self, warmup, path):
+        env = dict(os.environ, DJANGO_WARMUP=warmup)
+        result = subprocess.run(
+            [sys.executable, '-c', PROBE, path],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=True,
+        )
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+    def handle(self, *args, **options):
+        for warmup in ('off', 'full'):
+            runs = [self.probe(warmup, options['path']) for _ in range(options['runs'])]
+            startup, first, second = (
+                statistics.median(run[key] for run in runs) * 1000 for key in ('startup', 'first', 'second')
+            )
+            self.stdout.write(
+                f'warm-up {warmup}: startup {startup:.1f} ms, '
+                f'first request {first:.1f} ms, second request {second:.1f} ms'
+            )
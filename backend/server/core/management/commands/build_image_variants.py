@@ -0,0 +1,24 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from core.image_variants import VariantBuilder, prune_variant_files
+
+
+class Command(BaseCommand):
+    help = 'Make the resized variants of product images that have none or stale ones.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Encoding processes (0 encodes inline)')
+        parser.add_argument('--downloads', type=int, default=8, help='Source images downloaded at once')
+        parser.add_argument('--refresh', action='store_true', help='Download every source again and rebuild the ones that changed')
+        parser.add_argument('--prune', action='store_true', help='Afterwards delete stored files no variant uses any more')
+
+    def handle(self, *args, **options):
+        builder = VariantBuilder(workers=options['workers'], downloads=options['downloads'], refresh=options['refresh'])
+        summary = builder.run()
+        self.stdout.write(self.style.SUCCESS(
+            f'{summary["built"]} images built, {summary["unchanged"]} unchanged, {summary["failed"]} failed.'
+        ))
+        if options['prune']:
+            self.stdout.write(f'Deleted {prune_variant_files()} unused files.')
@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.recommendations import build_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the "frequently bought together" index from order history.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, help='Neighbours served per product (default RECOMMENDATIONS_TOP_K)')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        products = build_index(top_k=options['top_k'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {products} products in {time.perf_counter() - started:.1f}s.'
+        ))
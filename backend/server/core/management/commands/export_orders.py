@@ -0,0 +1,32 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.exports import EXPORT_FORMATS, ExportFilterError, iter_export, parse_export_filters
+
+
+class Command(BaseCommand):
+    help = 'Stream orders joined with order items, payments and addresses as CSV or NDJSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv')
+        parser.add_argument('--from', dest='date_from', help='First order date to include (YYYY-MM-DD)')
+        parser.add_argument('--to', dest='date_to', help='Last order date to include (YYYY-MM-DD)')
+        parser.add_argument('--status', help='Order status name, e.g. DELIVERED')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--output', help='File to write to (defaults to stdout)')
+
+    def handle(self, *args, **options):
+        try:
+            filters = parse_export_filters(options['date_from'], options['date_to'], options['status'])
+        except ExportFilterError as e:
+            raise CommandError(str(e))
+
+        chunks = iter_export(options['format'], filters, batch_size=options['batch_size'])
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as out:
+                for chunk in chunks:
+                    out.write(chunk)
+        else:
+            for chunk in chunks:
+                sys.stdout.write(chunk)
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.feeds import IMPORT_FORMATS, iter_records
+from core.order_updates import OrderUpdateImport
+
+
+class Command(BaseCommand):
+    help = 'Apply order status and tracking number updates from a CSV or NDJSON file of (order_id, status, tracking_number).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=IMPORT_FORMATS, help='Defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        import_format = options['format'] or ('ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv')
+
+        def progress(job):
+            self.stdout.write(f'{job.processed} rows, {job.updated} updated, {job.error_count} errors')
+
+        try:
+            with open(path, newline='', encoding='utf-8-sig') as source:
+                summary = OrderUpdateImport(batch_size=options['batch_size']).run(
+                    iter_records(source, import_format), progress=progress
+                )
+        except OSError as e:
+            raise CommandError(str(e))
+
+        for error in summary['errors']:
+            self.stderr.write(f'line {error["line"]} (order {error["order_id"]}): {error["error"]}')
+        if summary['error_count'] > len(summary['errors']):
+            self.stderr.write(f'... and {summary["error_count"] - len(summary["errors"])} more errors')
+        self.stdout.write(self.style.SUCCESS(
+            f'Done: {summary["processed"]} rows, {summary["updated"]} updated, '
+            f'{summary["unchanged"]} unchanged, {summary["error_count"]} errors.'
+        ))
@@ -0,0 +1,24 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.catalog_changes import current_version
+from core.models import CatalogChange
+
+
+class Command(BaseCommand):
+    help = 'Delete old catalog change log rows. Clients older than the kept window get 410 and reload the catalog.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-days', type=int, default=30)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - datetime.timedelta(days=options['keep_days'])
+        # Always keep the newest row so the current version survives
+        deleted, _ = (
+            CatalogChange.objects
+            .filter(changed_at__lt=cutoff, version__lt=current_version())
+            .delete()
+        )
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} catalog change rows.'))
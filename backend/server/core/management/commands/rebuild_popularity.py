@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.popularity import rebuild_popularity
+
+
+class Command(BaseCommand):
+    help = 'Recompute product.units_sold from order history.'
+
+    def handle(self, *args, **options):
+        changed = rebuild_popularity()
+        self.stdout.write(self.style.SUCCESS(f'Updated units_sold for {changed} products.'))
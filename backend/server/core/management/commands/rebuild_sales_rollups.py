@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from core.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Backfill the sales_rollup table from order history.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', help='First day to rebuild (YYYY-MM-DD)')
+        parser.add_argument('--to', dest='date_to', help='Last day to rebuild (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        days = {}
+        for name in ('date_from', 'date_to'):
+            value = options[name]
+            days[name] = parse_date(value) if value else None
+            if value and days[name] is None:
+                raise CommandError(f'{value} is not a date (YYYY-MM-DD).')
+
+        written = rebuild_rollups(days['date_from'], days['date_to'])
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} sales rollup rows.'))
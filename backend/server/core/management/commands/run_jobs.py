@@ -0,0 +1,50 @@
+import os
+import socket
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+import core.tasks  # noqa: F401 (registers the tasks)
+from core.jobs import claim_job, run_job
+
+
+class Command(BaseCommand):
+    help = 'Process background jobs from the job table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=2, help='Number of worker threads')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to sleep when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='Exit when no job is due instead of polling')
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        base_name = f'{socket.gethostname()}:{os.getpid()}'
+
+        def work(number):
+            name = f'{base_name}:{number}'
+            try:
+                while not stop.is_set():
+                    job = claim_job(name)
+                    if job is None:
+                        if options['once']:
+                            return
+                        stop.wait(options['poll_interval'])
+                        continue
+                    ok = run_job(job)
+                    self.stdout.write(f'[{name}] job {job.id} {job.task}: {"done" if ok else "failed"}')
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=work, args=(n,), daemon=True) for n in range(options['concurrency'])]
+        for thread in threads:
+            thread.start()
+        try:
+            while any(thread.is_alive() for thread in threads):
+                time.sleep(0.5)
+        except KeyboardInterrupt:
+            self.stdout.write('Stopping, waiting for running jobs to finish...')
+            stop.set()
+            for thread in threads:
+                thread.join()
@@ -1,3 +1,9 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.http import JsonResponse
+
+from core.admission import AdmissionRejected, admission_controller
 from core.models import User
 
 class SimpleSessionAuthMiddleware:
@@ -43,3 +49,52 @@ class CustomAnonymousUser:
     @property
     def is_active(self):
         return False
+
+
+class AdmissionControlMiddleware:
+    # Limits concurrent checkout / auth / catalog requests per process (see
+    # core/admission.py and ADMISSION_CONTROL in settings). Sits before the
+    # session middleware so a shed request costs no database work.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        route = admission_controller.classify(request)
+        if route is None:
+            return self.get_response(request)
+        try:
+            admission_controller.acquire(route)
+        except AdmissionRejected as rejected:
+            return overloaded_response(rejected)
+        started = time.monotonic()
+        try:
+            return self.get_response(request)
+        finally:
+            admission_controller.release(route, time.monotonic() - started)
+
+    async def __acall__(self, request):
+        route = admission_controller.classify(request)
+        if route is None:
+            return await self.get_response(request)
+        try:
+            await admission_controller.aacquire(route)
+        except AdmissionRejected as rejected:
+            return overloaded_response(rejected)
+        started = time.monotonic()
+        try:
+            return await self.get_response(request)
+        finally:
+            admission_controller.release(route, time.monotonic() - started)
+
+
+def overloaded_response(rejected):
+    response = JsonResponse({'error': 'The server is busy right now, try again shortly'}, status=503)
+    response['Retry-After'] = str(rejected.retry_after)
+    return response
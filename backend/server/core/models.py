@@ -26,6 +26,7 @@ class Product(models.Model):
     is_active = models.BooleanField(default=True)
     brand = models.ForeignKey(Brand, on_delete=models.CASCADE, db_column='brand_id', null=True)  # Added db_column and null=True
     category = models.ForeignKey(Category, on_delete=models.CASCADE, db_column='category_id', null=True)  # Added db_column and null=True
+    units_sold = models.IntegerField(default=0)  # Kept up to date by core/popularity.py
     class Meta:
         managed = False
         db_table = 'product'
@@ -38,6 +39,23 @@ class ProductImage(models.Model):
         managed = False
         db_table = 'product_image'
 
+class ProductImageVariant(models.Model):
+    # A resized copy of a product image, written by core/image_variants.py
+    image = models.ForeignKey(ProductImage, on_delete=models.CASCADE, related_name='variants')
+    variant = models.CharField(max_length=20)  # thumbnail, card, detail
+    format = models.CharField(max_length=10)  # jpeg, webp
+    width = models.IntegerField()
+    height = models.IntegerField()
+    path = models.CharField(max_length=100)  # Relative to IMAGE_VARIANTS_DIR
+    source_url = models.URLField(max_length=255)
+    source_digest = models.CharField(max_length=64)
+    spec = models.CharField(max_length=16)
+    created_at = models.DateTimeField(auto_now_add=True)
+    class Meta:
+        managed = False
+        db_table = 'product_image_variant'
+        unique_together = [('image', 'variant', 'format')]
+
 class City(models.Model):
     id = models.AutoField(primary_key=True, db_column='city_id')
     city_name = models.CharField(max_length=100)
@@ -139,3 +157,147 @@ class Payment(models.Model):
     class Meta:
         managed = False
         db_table = 'payment'
+
+
+# Pre-aggregated sales per day x category x brand, maintained by core.rollups.
+# category_id / brand_id are 0 for products without a category / brand.
+class SalesRollup(models.Model):
+    id = models.AutoField(primary_key=True, db_column='rollup_id')
+    day = models.DateField()
+    category_id = models.IntegerField(default=0)
+    brand_id = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    units = models.IntegerField(default=0)
+    order_count = models.IntegerField(default=0)
+    class Meta:
+        managed = False
+        db_table = 'sales_rollup'
+        unique_together = [('day', 'category_id', 'brand_id')]
+
+
+# Orders whose lines are counted in sales_rollup, see core.rollups.sync_order
+class SalesRollupOrder(models.Model):
+    order_id = models.IntegerField(primary_key=True)
+    applied_at = models.DateTimeField(auto_now_add=True)
+    class Meta:
+        managed = False
+        db_table = 'sales_rollup_order'
+
+
+# Background jobs, see core/jobs.py and the run_jobs management command
+class Job(models.Model):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    id = models.AutoField(primary_key=True, db_column='job_id')
+    task = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, default=QUEUED)
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=5)
+    run_at = models.DateTimeField()
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    class Meta:
+        managed = False
+        db_table = 'job'
+
+
+# One row per order whose confirmation email was sent (core/tasks.py)
+class OrderConfirmation(models.Model):
+    order_id = models.IntegerField(primary_key=True)
+    sent_at = models.DateTimeField(auto_now_add=True)
+    class Meta:
+        managed = False
+        db_table = 'order_confirmation'
+
+
+# Filled by database triggers on product, product_image, category and brand.
+# version only ever grows, clients sync with /api/products/changes/?since=<version>
+class CatalogChange(models.Model):
+    UPSERT = 'upsert'
+    DELETE = 'delete'
+
+    version = models.BigAutoField(primary_key=True)
+    entity = models.CharField(max_length=20)  # product, category, brand
+    object_id = models.IntegerField()
+    action = models.CharField(max_length=10)
+    changed_at = models.DateTimeField(auto_now_add=True)
+    class Meta:
+        managed = False
+        db_table = 'catalog_change'
+
+
+# Written by a trigger when an order's status or tracking number changes,
+# read by the order event stream (core/order_events.py)
+class OrderEvent(models.Model):
+    id = models.BigAutoField(primary_key=True, db_column='event_id')
+    order = models.ForeignKey(Order, db_column='order_id', on_delete=models.DO_NOTHING, db_constraint=False)
+    user_id = models.IntegerField()
+    order_status = models.ForeignKey(OrderStatus, db_column='order_status_id', on_delete=models.DO_NOTHING, db_constraint=False)
+    tracking_number = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    class Meta:
+        managed = False
+        db_table = 'order_event'
+
+
+# Product pairs from orders placed after the last recommendations build,
+# see core/recommendations.py
+class ProductPairDelta(models.Model):
+    id = models.BigAutoField(primary_key=True, db_column='delta_id')
+    order_id = models.IntegerField()
+    product_id = models.IntegerField()
+    related_product_id = models.IntegerField()
+    class Meta:
+        managed = False
+        db_table = 'product_pair_delta'
+
+
+# Finished orders moved out of the hot order / order_item / payment tables
+# by core/archive.py. Same ids and column names as the hot tables, so the
+# order history serializers and the export read both tiers the same way.
+class ArchivedOrder(models.Model):
+    id = models.IntegerField(primary_key=True, db_column='order_id')
+    user = models.ForeignKey(User, db_column='user_id', on_delete=models.DO_NOTHING, db_constraint=False)
+    order_date = models.DateTimeField()
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    order_status = models.ForeignKey(OrderStatus, on_delete=models.DO_NOTHING, db_constraint=False)
+    tracking_number = models.CharField(max_length=100, blank=True)
+    shipping_address = models.ForeignKey(Address, db_column='shipping_address_id', null=True, blank=True, on_delete=models.DO_NOTHING, db_constraint=False)
+    archived_at = models.DateTimeField(auto_now_add=True)
+    class Meta:
+        managed = False
+        db_table = 'order_archive'
+
+
+class ArchivedOrderItem(models.Model):
+    id = models.IntegerField(primary_key=True, db_column='order_item_id')
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.DO_NOTHING, db_constraint=False)
+    product = models.ForeignKey(Product, null=True, on_delete=models.DO_NOTHING, db_constraint=False)
+    quantity = models.IntegerField()
+    price_per_unit = models.DecimalField(max_digits=10, decimal_places=2)
+
+    @property
+    def subtotal(self):
+        return self.quantity * self.price_per_unit
+
+    class Meta:
+        managed = False
+        db_table = 'order_item_archive'
+
+
+class ArchivedPayment(models.Model):
+    id = models.IntegerField(primary_key=True, db_column='payment_id')
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.DO_NOTHING, db_constraint=False)
+    payment_method = models.CharField(max_length=50)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    payment_date = models.DateTimeField()
+    payment_status = models.ForeignKey(PaymentStatus, on_delete=models.DO_NOTHING, db_constraint=False)
+    class Meta:
+        managed = False
+        db_table = 'payment_archive'
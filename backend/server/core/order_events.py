@@ -0,0 +1,146 @@
+import asyncio
+import logging
+
+from django.conf import settings
+from django.db.models import Max, Min
+
+from .change_log import settle_cutoff
+from .models import OrderEvent
+
+logger = logging.getLogger(__name__)
+
+_EVENT_FIELDS = ('id', 'order_id', 'user_id', 'order_status_id', 'order_status__status_name', 'tracking_number')
+
+
+def _to_event(row):
+    return {
+        'id': row['id'],
+        'order_id': row['order_id'],
+        'user_id': row['user_id'],
+        'order_status_id': row['order_status_id'],
+        'status': row['order_status__status_name'],
+        'tracking_number': row['tracking_number'],
+    }
+
+
+async def events_for_user(user_id, after_id, limit=500):
+    # Replay for a reconnecting client (Last-Event-ID)
+    rows = OrderEvent.objects.filter(user_id=user_id, id__gt=after_id).order_by('id').values(*_EVENT_FIELDS)[:limit]
+    return [_to_event(row) async for row in rows]
+
+
+class OrderEventBroker:
+    # One polling task per process reads new rows from order_event and fans
+    # them out to the queues of the connected users. The database is queried
+    # once per interval however many streams are open, and the task stops
+    # when the last subscriber goes away.
+    # Every poll reads all events above the highest id seen so far, so live
+    # delivery never waits on a gap. Ids skipped on the way may belong to
+    # transactions that commit later (core/change_log.py): they are looked
+    # up again on each poll until they show up or an event after them is
+    # older than the settle window. Each event is published once.
+    def __init__(self, poll_interval=1.0, queue_size=100, settle_seconds=30, batch_size=1000, max_gap=1000):
+        self.poll_interval = poll_interval
+        self.queue_size = queue_size
+        self.settle_seconds = settle_seconds
+        self.batch_size = batch_size
+        # Larger jumps in the ids are taken as skipped AUTO_INCREMENT values
+        # rather than transactions still in flight
+        self.max_gap = max_gap
+        self._subscribers = {}
+        self._task = None
+        self._head_id = None
+        self._missing = set()
+
+    def subscribe(self, user_id):
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.setdefault(user_id, set()).add(queue)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._poll())
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        queues = self._subscribers.get(user_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[user_id]
+
+    def publish(self, event):
+        for queue in self._subscribers.get(event['user_id'], ()):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # A stalled client only misses live events, it catches up
+                # through Last-Event-ID when it reconnects
+                pass
+
+    def _advance(self, event_id):
+        if event_id - self._head_id - 1 <= self.max_gap:
+            self._missing.update(range(self._head_id + 1, event_id))
+        self._head_id = event_id
+
+    async def _start(self):
+        # Events from before the first subscriber are not sent, except ones
+        # that commit later under an id skipped among the unsettled events
+        latest = await OrderEvent.objects.aaggregate(latest=Max('id'))
+        first_recent = await OrderEvent.objects.filter(
+            created_at__gt=settle_cutoff(self.settle_seconds),
+        ).aaggregate(first=Min('id'))
+        self._missing = set()
+        if first_recent['first'] is None:
+            self._head_id = latest['latest'] or 0
+            return
+        below = await OrderEvent.objects.filter(id__lt=first_recent['first']).aaggregate(latest=Max('id'))
+        self._head_id = below['latest'] or 0
+        recent = OrderEvent.objects.filter(id__gt=self._head_id, id__lte=latest['latest']).order_by('id')
+        async for event_id in recent.values_list('id', flat=True):
+            self._advance(event_id)
+
+    async def _poll_once(self):
+        if self._head_id is None:
+            await self._start()
+
+        if self._missing:
+            late = OrderEvent.objects.filter(id__in=self._missing).order_by('id').values(*_EVENT_FIELDS)
+            async for row in late:
+                self._missing.discard(row['id'])
+                self.publish(_to_event(row))
+
+        while True:
+            rows = OrderEvent.objects.filter(id__gt=self._head_id).order_by('id').values(*_EVENT_FIELDS)[:self.batch_size]
+            rows = [row async for row in rows]
+            for row in rows:
+                self._advance(row['id'])
+                self.publish(_to_event(row))
+            if len(rows) < self.batch_size:
+                break
+
+        if self._missing:
+            # An id below an event older than the settle window was rolled back
+            settled = await OrderEvent.objects.filter(
+                id__gt=min(self._missing), id__lte=self._head_id,
+                created_at__lte=settle_cutoff(self.settle_seconds),
+            ).aaggregate(latest=Max('id'))
+            if settled['latest'] is not None:
+                self._missing = {event_id for event_id in self._missing if event_id > settled['latest']}
+
+    async def _poll(self):
+        try:
+            while self._subscribers:
+                try:
+                    await self._poll_once()
+                except Exception:
+                    logger.exception('Polling order events failed')
+                await asyncio.sleep(self.poll_interval)
+        finally:
+            # Start from the newest events again next time instead of
+            # scanning everything that happened while nobody listened
+            self._head_id = None
+            self._missing = set()
+
+
+order_event_broker = OrderEventBroker(
+    poll_interval=getattr(settings, 'ORDER_EVENTS_POLL_INTERVAL', 1.0),
+    settle_seconds=getattr(settings, 'ORDER_EVENTS_SETTLE_SECONDS', 30),
+)
@@ -0,0 +1,84 @@
+from django.db import transaction
+
+from .feeds import FeedImport
+from .models import Order, OrderStatus
+from .rollups import record_status_change
+
+
+class OrderUpdateImport(FeedImport):
+    # Applies (order_id, status, tracking_number) rows in batches: each batch
+    # loads its orders with one query and writes the changes with a single
+    # bulk_update (CASE WHEN ...) inside its own transaction. Empty status or
+    # tracking_number values leave that column unchanged.
+    key_name = 'order_id'
+
+    def __init__(self, batch_size=1000):
+        super().__init__(batch_size)
+        self.statuses = {name.upper(): pk for pk, name in OrderStatus.objects.values_list('id', 'status_name')}
+        self.status_names = {pk: name for name, pk in self.statuses.items()}
+        self.updated = 0
+        self.unchanged = 0
+
+    def parse(self, line_number, record):
+        if record is None:
+            self.error(line_number, None, 'Could not parse row.')
+            return None
+
+        raw_id = record.get('order_id')
+        try:
+            order_id = int(raw_id)
+        except (TypeError, ValueError):
+            self.error(line_number, raw_id, 'order_id must be an integer.')
+            return None
+
+        status_id = None
+        status = (record.get('status') or '').strip().upper()
+        if status:
+            status_id = self.statuses.get(status)
+            if status_id is None:
+                self.error(line_number, order_id, f'Unknown status "{status}".')
+                return None
+
+        tracking_number = (record.get('tracking_number') or '').strip() or None
+        if tracking_number and len(tracking_number) > 100:
+            self.error(line_number, order_id, 'tracking_number is longer than 100 characters.')
+            return None
+
+        if status_id is None and tracking_number is None:
+            self.error(line_number, order_id, 'Nothing to update.')
+            return None
+        return line_number, order_id, status_id, tracking_number
+
+    def apply(self, batch):
+        with transaction.atomic():
+            orders = Order.objects.only('id', 'order_date', 'order_status_id', 'tracking_number').in_bulk(
+                [order_id for _, order_id, _, _ in batch]
+            )
+            changed = {}
+            status_changes = []
+            for line_number, order_id, status_id, tracking_number in batch:
+                order = orders.get(order_id)
+                if order is None:
+                    self.error(line_number, order_id, 'Order not found.')
+                    continue
+                dirty = False
+                if status_id is not None and order.order_status_id != status_id:
+                    status_changes.append((order, self.status_names[status_id]))
+                    order.order_status_id = status_id
+                    dirty = True
+                if tracking_number is not None and order.tracking_number != tracking_number:
+                    order.tracking_number = tracking_number
+                    dirty = True
+                if dirty:
+                    changed[order_id] = order
+                else:
+                    self.unchanged += 1
+
+            if changed:
+                Order.objects.bulk_update(list(changed.values()), ['order_status', 'tracking_number'])
+            for order, new_status in status_changes:
+                record_status_change(order, new_status)
+            self.updated += len(changed)
+
+    def summary(self):
+        return dict(super().summary(), updated=self.updated, unchanged=self.unchanged)
@@ -0,0 +1,90 @@
+import base64
+import json
+import operator
+from functools import reduce
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, CursorPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class UserCursorPagination(CursorPagination):
+    # Keyset pagination on the primary key (?cursor= from next/previous):
+    # every page is a range scan on the index however deep it is, and users
+    # registering meanwhile don't shift the pages
+    ordering = 'id'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
+class ProductKeysetPagination(BasePagination):
+    # Keyset pagination for sorted product lists (?ordering=). The cursor
+    # holds the sort values of the last product on the page, e.g. its price
+    # and id, and the next page starts right after them. With the
+    # (category_id, <sort column>, product_id) indexes a page is an index
+    # range scan whatever its depth, where OFFSET would read and throw away
+    # every row before it. Lists without ?ordering= are not paginated.
+    page_size = 24
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def encode_cursor(self, key):
+        return base64.urlsafe_b64encode(json.dumps(key, cls=DjangoJSONEncoder).encode()).decode()
+
+    def decode_cursor(self, cursor, length):
+        try:
+            key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(key, list) or len(key) != length:
+            raise NotFound(self.invalid_cursor_message)
+        return key
+
+    def after(self, ordering, key):
+        # Rows that sort after `key`: (a > x) OR (a = x AND b > y) ...
+        conditions = []
+        for depth, field in enumerate(ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            equal = {ordering[i].lstrip('-'): key[i] for i in range(depth)}
+            conditions.append(Q(**equal, **{f'{name}__{lookup}': key[depth]}))
+        return reduce(operator.or_, conditions)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not request.query_params.get('ordering'):
+            return None
+        self.request = request
+        ordering = list(queryset.query.order_by)
+        names = [field.lstrip('-') for field in ordering]
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            queryset = queryset.filter(self.after(ordering, self.decode_cursor(cursor, len(ordering))))
+
+        # The keys come from the index alone, the page's rows are then read
+        # by primary key. The ordering ends on the id, so it's the last value.
+        page_size = self.get_page_size(request)
+        keys = list(queryset.values_list(*names)[:page_size + 1])
+        self.next_key = list(keys[page_size - 1]) if len(keys) > page_size else None
+        return queryset.filter(pk__in=[key[-1] for key in keys[:page_size]])
+
+    def get_next_link(self):
+        if self.next_key is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_key))
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
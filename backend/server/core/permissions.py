@@ -0,0 +1,19 @@
+from django.http import JsonResponse
+from rest_framework.permissions import BasePermission
+
+
+class IsAdminRole(BasePermission):
+    # Users are authenticated by SimpleSessionAuthMiddleware, admins have role 'admin'
+    def has_permission(self, request, view):
+        user = request.user
+        return bool(user and user.is_authenticated and getattr(user, 'role', None) == 'admin')
+
+
+def admin_error_response(request):
+    # Same check as IsAdminRole for plain Django views, None when allowed
+    user = request.user
+    if not user or not user.is_authenticated:
+        return JsonResponse({'error': 'Not authenticated'}, status=401)
+    if getattr(user, 'role', None) != 'admin':
+        return JsonResponse({'error': 'Admin role required'}, status=403)
+    return None
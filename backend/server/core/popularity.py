@@ -0,0 +1,48 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import F, Sum
+
+from .archive import ORDER_TIERS
+from .models import OrderItem, Product
+from .signals import invalidate_catalog
+
+
+def record_order_sales(order_id):
+    # Adds the quantities of one order to product.units_sold. Products are
+    # updated in id order so concurrent orders lock their rows in the same
+    # order.
+    quantities = Counter()
+    lines = OrderItem.objects.filter(order_id=order_id, product_id__isnull=False).values_list('product_id', 'quantity')
+    for product_id, quantity in lines:
+        quantities[product_id] += quantity
+    with transaction.atomic():
+        for product_id in sorted(quantities):
+            Product.objects.filter(pk=product_id).update(units_sold=F('units_sold') + quantities[product_id])
+        if quantities:
+            # .update() sends no post_save, and units_sold is only shown
+            # through the order of ?ordering=popularity lists
+            invalidate_catalog('popularity')
+
+
+def rebuild_popularity(batch_size=1000):
+    # Recomputes units_sold for every product from order_item and the order
+    # archive. Returns the number of products whose counter changed.
+    totals = Counter()
+    for _, item_model, _ in ORDER_TIERS:
+        lines = item_model.objects.filter(product_id__isnull=False).order_by().values('product_id').annotate(units=Sum('quantity'))
+        for line in lines.iterator():
+            totals[line['product_id']] += line['units']
+
+    changed = []
+    for product in Product.objects.only('id', 'units_sold').order_by('id').iterator():
+        units = totals.get(product.id, 0)
+        if product.units_sold != units:
+            product.units_sold = units
+            changed.append(product)
+    with transaction.atomic():
+        Product.objects.bulk_update(changed, ['units_sold'], batch_size=batch_size)
+    if changed:
+        # Cached ?ordering=popularity lists would otherwise wait for the TTL
+        invalidate_catalog('popularity')
+    return len(changed)
@@ -0,0 +1,101 @@
+import hashlib
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .hot_cache import HotProductCache
+
+logger = logging.getLogger(__name__)
+
+
+class TaggedCache:
+    # Two tiers: a per-process LRU in front of the shared Django cache. Each
+    # entry is stored under a key that includes the current version of every
+    # tag it depends on ("product", "brand", ...). Invalidating a tag bumps
+    # its version in the shared cache, so every process stops using the old
+    # entries at once and they simply age out of both tiers. A read costs one
+    # round trip to the shared cache for the tag versions, and a local hit
+    # needs nothing else.
+    def __init__(self, alias='default', local_size=512, ttl=300, lock_timeout=10):
+        self.alias = alias
+        self.ttl = ttl
+        self.lock_timeout = lock_timeout
+        self.local = HotProductCache(max_size=local_size, ttl=ttl)
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def tag_versions(self, tags):
+        keys = [f'qc:tag:{tag}' for tag in sorted(tags)]
+        versions = self.shared.get_many(keys)
+        missing = [key for key in keys if key not in versions]
+        if missing:
+            # A tag without a version (new, or evicted) starts from the clock
+            # so entries cached under an evicted version can't come back
+            for key in missing:
+                self.shared.add(key, time.time_ns(), timeout=None)
+            versions.update(self.shared.get_many(missing))
+        return [versions[key] for key in keys]
+
+    def invalidate(self, *tags):
+        for tag in tags:
+            key = f'qc:tag:{tag}'
+            try:
+                self.shared.incr(key)
+            except ValueError:
+                self.shared.set(key, time.time_ns(), timeout=None)
+
+    def get_or_build(self, key, tags, build):
+        # build() returning None is not cached
+        try:
+            versions = self.tag_versions(tags)
+        except Exception:
+            logger.warning('Shared cache unavailable, serving %s uncached', key, exc_info=True)
+            return build()
+        full_key = 'qc:' + hashlib.sha1(f'{key}|{versions}'.encode()).hexdigest()
+
+        value = self.local.get(full_key)
+        if value is not None:
+            return value
+        value = self.shared.get(full_key)
+        if value is None:
+            value = self._build_once(full_key, build)
+        if value is not None:
+            self.local.set(full_key, value)
+        return value
+
+    def _build_once(self, full_key, build):
+        # Stampede protection: the worker that gets the lock rebuilds the
+        # entry, the others wait for its result instead of all querying
+        # MySQL. If it doesn't show up within lock_timeout they build it
+        # themselves.
+        lock_key = full_key + ':lock'
+        if self.shared.add(lock_key, 1, timeout=self.lock_timeout):
+            try:
+                value = build()
+                if value is not None:
+                    self.shared.set(full_key, value, timeout=self.ttl)
+                return value
+            finally:
+                self.shared.delete(lock_key)
+
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            value = self.shared.get(full_key)
+            if value is not None:
+                return value
+            if lock_key not in self.shared:
+                break
+        return build()
+
+
+catalog_cache = TaggedCache(
+    alias=getattr(settings, 'CATALOG_CACHE_ALIAS', 'default'),
+    local_size=getattr(settings, 'CATALOG_CACHE_LOCAL_SIZE', 512),
+    ttl=getattr(settings, 'CATALOG_CACHE_TTL', 300),
+    lock_timeout=getattr(settings, 'CATALOG_CACHE_LOCK_TIMEOUT', 10),
+)
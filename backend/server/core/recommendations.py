@@ -0,0 +1,217 @@
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Count, Max
+
+from .models import ArchivedOrderItem, OrderItem, ProductPairDelta
+
+# Largest order used for pairs, bigger baskets add n^2 pairs for little signal
+MAX_ORDER_PRODUCTS = 50
+
+
+def recommendations_dir():
+    return Path(getattr(settings, 'RECOMMENDATIONS_DIR', settings.BASE_DIR / 'recommendations'))
+
+
+def _top_k():
+    return getattr(settings, 'RECOMMENDATIONS_TOP_K', 20)
+
+
+def _load_order_lines(max_order_id, batch_size=100000):
+    # (order_id, product_id) for every order line in the archive and the hot
+    # table, read in keyset batches straight into NumPy arrays
+    order_chunks, product_chunks = [], []
+    for item_model in (ArchivedOrderItem, OrderItem):
+        lines = item_model.objects.filter(product_id__isnull=False, order_id__lte=max_order_id).order_by('id')
+        last_id = 0
+        while True:
+            batch = list(lines.filter(id__gt=last_id).values_list('id', 'order_id', 'product_id')[:batch_size])
+            if not batch:
+                break
+            array = np.array(batch, dtype=np.int64)
+            order_chunks.append(array[:, 1])
+            product_chunks.append(array[:, 2])
+            last_id = int(array[-1, 0])
+    if not order_chunks:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(order_chunks), np.concatenate(product_chunks)
+
+
+def build_index(top_k=None):
+    # Builds the product x product co-occurrence matrix from order_item and
+    # keeps the 2 * top_k strongest neighbours of every product. The spare
+    # candidates let incremental updates promote a neighbour without a full
+    # rebuild. Returns the number of products in the index.
+    from scipy import sparse
+
+    top_k = top_k or _top_k()
+    keep = 2 * top_k
+    max_order_id = max(
+        model.objects.aggregate(latest=Max('order_id'))['latest'] or 0
+        for model in (ArchivedOrderItem, OrderItem)
+    )
+    orders, products = _load_order_lines(max_order_id)
+
+    product_ids, product_index = np.unique(products, return_inverse=True)
+    _, order_index = np.unique(orders, return_inverse=True)
+    n_products = len(product_ids)
+
+    # Binary order x product incidence, so repeated lines count once
+    baskets = sparse.csr_matrix(
+        (np.ones(len(products), dtype=np.int32), (order_index, product_index)),
+        shape=(order_index.max() + 1 if len(orders) else 0, n_products),
+    )
+    baskets.data[:] = 1
+    basket_sizes = np.diff(baskets.indptr)
+    baskets = baskets[basket_sizes <= MAX_ORDER_PRODUCTS]
+
+    cooccurrence = (baskets.T @ baskets).tocsr()
+    cooccurrence.setdiag(0)
+    cooccurrence.eliminate_zeros()
+
+    # Rank every row's entries by count (descending) in one lexsort and keep
+    # the first `keep` per row
+    rows = np.repeat(np.arange(n_products), np.diff(cooccurrence.indptr))
+    order = np.lexsort((-cooccurrence.data, rows))
+    ranks = np.arange(len(order)) - cooccurrence.indptr[rows[order]]
+    selected = order[ranks < keep]
+
+    neighbors = np.full((n_products, keep), -1, dtype=np.int32)
+    scores = np.zeros((n_products, keep), dtype=np.int32)
+    selected_rows = rows[selected]
+    selected_ranks = ranks[ranks < keep]
+    neighbors[selected_rows, selected_ranks] = product_ids[cooccurrence.indices[selected]]
+    scores[selected_rows, selected_ranks] = cooccurrence.data[selected]
+
+    previous = _current_meta()
+    _write_index(product_ids.astype(np.int32), neighbors, scores, max_order_id)
+    # Workers still serve the previous build until their next reload and
+    # need its deltas. Only deltas that every worker's index includes are
+    # deleted: those covered by the previous build, once it has been current
+    # long enough for all workers to have loaded it.
+    grace = 2 * getattr(settings, 'RECOMMENDATIONS_RELOAD_INTERVAL', 60)
+    if previous is not None and time.time() - previous.get('built_at', 0) > grace:
+        ProductPairDelta.objects.filter(order_id__lte=previous['max_order_id']).delete()
+    return n_products
+
+
+def _current_meta():
+    directory = recommendations_dir()
+    try:
+        build = (directory / 'CURRENT').read_text().strip()
+        return json.loads((directory / build / 'meta.json').read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def _write_index(product_ids, neighbors, scores, max_order_id):
+    # Every build gets its own directory and the CURRENT file is swapped to
+    # point at it, so readers never see a half written index
+    directory = recommendations_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    build = f'build-{time.time_ns()}'
+    (directory / build).mkdir()
+    np.save(directory / build / 'product_ids.npy', product_ids)
+    np.save(directory / build / 'neighbors.npy', neighbors)
+    np.save(directory / build / 'scores.npy', scores)
+    (directory / build / 'meta.json').write_text(json.dumps({'max_order_id': max_order_id, 'built_at': time.time()}))
+
+    pointer = directory / 'CURRENT.tmp'
+    pointer.write_text(build)
+    os.replace(pointer, directory / 'CURRENT')
+
+    # Keep the previous build for processes that still have it mapped
+    builds = sorted(path for path in directory.glob('build-*') if path.is_dir())
+    for old in builds[:-2]:
+        shutil.rmtree(old, ignore_errors=True)
+
+
+class RelatedProductIndex:
+    # Memory-maps the arrays written by build_index(). The page cache is
+    # shared, so every worker process serves from the same physical memory.
+    # CURRENT is checked for a new build every `reload_interval` seconds.
+    def __init__(self, reload_interval=60):
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._checked_at = float('-inf')
+        self._build = None
+        # (arrays, max_order_id of the build), swapped together so a reader
+        # never pairs one build's arrays with another build's deltas
+        self._loaded = (None, 0)
+
+    def load(self):
+        # Returns (arrays or None, max_order_id) of the loaded build
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval:
+            return self._loaded
+        with self._lock:
+            self._checked_at = now
+            directory = recommendations_dir()
+            try:
+                build = (directory / 'CURRENT').read_text().strip()
+                if build != self._build:
+                    meta = json.loads((directory / build / 'meta.json').read_text())
+                    arrays = tuple(
+                        np.load(directory / build / name, mmap_mode='r')
+                        for name in ('product_ids.npy', 'neighbors.npy', 'scores.npy')
+                    )
+                    self._loaded = (arrays, meta['max_order_id'])
+                    self._build = build
+            except (OSError, ValueError, KeyError):
+                pass
+            return self._loaded
+
+    def snapshot_neighbors(self, arrays, product_id):
+        if arrays is None:
+            return {}
+        product_ids, neighbors, scores = arrays
+        position = np.searchsorted(product_ids, product_id)
+        if position >= len(product_ids) or product_ids[position] != product_id:
+            return {}
+        row_neighbors, row_scores = neighbors[position], scores[position]
+        valid = row_neighbors >= 0
+        return dict(zip(row_neighbors[valid].tolist(), row_scores[valid].tolist()))
+
+    def related(self, product_id, limit=None):
+        # Snapshot neighbours plus the pairs of orders placed since the build
+        limit = limit or _top_k()
+        arrays, max_order_id = self.load()
+        counts = self.snapshot_neighbors(arrays, product_id)
+        deltas = (
+            ProductPairDelta.objects
+            .filter(product_id=product_id, order_id__gt=max_order_id)
+            .values('related_product_id')
+            .annotate(count=Count('id'))
+            .values_list('related_product_id', 'count')
+        )
+        for related_id, count in deltas:
+            counts[related_id] = counts.get(related_id, 0) + count
+        ranked = sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+        return [related_id for related_id, _ in ranked[:limit]]
+
+
+related_product_index = RelatedProductIndex(
+    reload_interval=getattr(settings, 'RECOMMENDATIONS_RELOAD_INTERVAL', 60),
+)
+
+
+def record_order_pairs(order_id):
+    # Incremental update for one committed order. The pairs are always
+    # stored: every worker only adds the deltas of orders after the build it
+    # has loaded, which may be older than the one this process sees.
+    product_ids = sorted(set(
+        OrderItem.objects.filter(order_id=order_id, product_id__isnull=False).values_list('product_id', flat=True)
+    ))
+    if len(product_ids) < 2 or len(product_ids) > MAX_ORDER_PRODUCTS:
+        return
+    ProductPairDelta.objects.filter(order_id=order_id).delete()
+    ProductPairDelta.objects.bulk_create([
+        ProductPairDelta(order_id=order_id, product_id=a, related_product_id=b)
+        for a in product_ids for b in product_ids if a != b
+    ])
@@ -0,0 +1,26 @@
+import threading
+
+from .models import OrderStatus
+
+# Small lookup tables that practically never change, loaded once per process
+_lock = threading.Lock()
+_order_statuses = {}
+
+
+def load_reference_data():
+    statuses = {status.status_name.upper(): status for status in OrderStatus.objects.all()}
+    with _lock:
+        _order_statuses.clear()
+        _order_statuses.update(statuses)
+
+
+def order_status(name):
+    # Raises OrderStatus.DoesNotExist like OrderStatus.objects.get() would
+    status = _order_statuses.get(name.upper())
+    if status is None:
+        # Maybe added since the cache was loaded
+        load_reference_data()
+        status = _order_statuses.get(name.upper())
+    if status is None:
+        raise OrderStatus.DoesNotExist(f'Order status "{name}" not found.')
+    return status
@@ -0,0 +1,179 @@
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Coalesce, TruncDate
+
+from .archive import ORDER_TIERS
+from .models import SalesRollup, SalesRollupOrder
+
+
+def _excluded_statuses():
+    return {name.upper() for name in getattr(settings, 'SALES_ROLLUP_EXCLUDED_STATUSES', ['CANCELLED'])}
+
+
+def counts_towards_sales(status_name):
+    return (status_name or '').upper() not in _excluded_statuses()
+
+
+def _order_cells(order):
+    # (category_id, brand_id) -> [revenue, units] for the lines of one order,
+    # read from the tier (hot or archive) the order belongs to
+    item_model = next(item_model for order_model, item_model, _ in ORDER_TIERS if isinstance(order, order_model))
+    cells = defaultdict(lambda: [Decimal('0'), 0])
+    lines = item_model.objects.filter(order_id=order.id).values_list(
+        'product__category_id', 'product__brand_id', 'quantity', 'price_per_unit'
+    )
+    for category_id, brand_id, quantity, price_per_unit in lines:
+        cell = cells[(category_id or 0, brand_id or 0)]
+        cell[0] += quantity * price_per_unit
+        cell[1] += quantity
+    return cells
+
+
+def _add_to_cell(day, category_id, brand_id, revenue, units, orders):
+    key = {'day': day, 'category_id': category_id, 'brand_id': brand_id}
+    delta = {
+        'revenue': F('revenue') + revenue,
+        'units': F('units') + units,
+        'order_count': F('order_count') + orders,
+    }
+    if SalesRollup.objects.filter(**key).update(**delta):
+        return
+    try:
+        with transaction.atomic():
+            SalesRollup.objects.create(revenue=revenue, units=units, order_count=orders, **key)
+    except IntegrityError:
+        # Another request created the row first
+        SalesRollup.objects.filter(**key).update(**delta)
+
+
+def apply_order(order, sign=1):
+    # Adds (sign=1) or removes (sign=-1) one order's lines from the rollups
+    day = order.order_date.astimezone(datetime.timezone.utc).date()
+    with transaction.atomic():
+        for (category_id, brand_id), (revenue, units) in _order_cells(order).items():
+            _add_to_cell(day, category_id, brand_id, sign * revenue, sign * units, sign)
+
+
+def sync_order(order, status_name):
+    # Counts the order in the rollups exactly when status_name counts
+    # towards sales. sales_rollup_order remembers which orders are counted,
+    # so the job of a new order and a status change can run in either order
+    # or twice without counting an order twice or removing sales that were
+    # never added.
+    with transaction.atomic():
+        if counts_towards_sales(status_name):
+            try:
+                with transaction.atomic():
+                    SalesRollupOrder.objects.create(order_id=order.id)
+            except IntegrityError:
+                return
+            apply_order(order, sign=1)
+        elif SalesRollupOrder.objects.filter(order_id=order.id).delete()[0]:
+            apply_order(order, sign=-1)
+
+
+def record_order_placed(order):
+    sync_order(order, order.order_status.status_name)
+
+
+def record_status_change(order, new_status_name):
+    sync_order(order, new_status_name)
+
+
+def _rollup_cells(item_model, date_from, date_to):
+    lines = item_model.objects.exclude(order__order_status__status_name__in=_excluded_statuses())
+    if date_from:
+        start = datetime.datetime.combine(date_from, datetime.time.min, tzinfo=datetime.timezone.utc)
+        lines = lines.filter(order__order_date__gte=start)
+    if date_to:
+        end = datetime.datetime.combine(date_to + datetime.timedelta(days=1), datetime.time.min, tzinfo=datetime.timezone.utc)
+        lines = lines.filter(order__order_date__lt=end)
+    return (
+        lines
+        .annotate(
+            day=TruncDate('order__order_date', tzinfo=datetime.timezone.utc),
+            cell_category=Coalesce('product__category_id', 0),
+            cell_brand=Coalesce('product__brand_id', 0),
+        )
+        .values('day', 'cell_category', 'cell_brand')
+        .annotate(
+            revenue=Sum(F('quantity') * F('price_per_unit')),
+            units=Sum('quantity'),
+            orders=Count('order_id', distinct=True),
+        )
+        .order_by()
+    )
+
+
+def _day_range(queryset, date_from, date_to):
+    if date_from:
+        queryset = queryset.filter(order_date__gte=datetime.datetime.combine(date_from, datetime.time.min, tzinfo=datetime.timezone.utc))
+    if date_to:
+        end = date_to + datetime.timedelta(days=1)
+        queryset = queryset.filter(order_date__lt=datetime.datetime.combine(end, datetime.time.min, tzinfo=datetime.timezone.utc))
+    return queryset
+
+
+def _rebuild_markers(date_from, date_to, batch_size):
+    # The orders of the range that are counted after a rebuild
+    for order_model, _, _ in ORDER_TIERS:
+        orders = _day_range(order_model.objects.all(), date_from, date_to)
+        SalesRollupOrder.objects.filter(order_id__in=orders.values('id')).delete()
+        counted = orders.exclude(order_status__status_name__in=_excluded_statuses()).values_list('id', flat=True)
+        batch = []
+        for order_id in counted.iterator():
+            batch.append(SalesRollupOrder(order_id=order_id))
+            if len(batch) >= batch_size:
+                SalesRollupOrder.objects.bulk_create(batch, ignore_conflicts=True)
+                batch = []
+        SalesRollupOrder.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def rebuild_rollups(date_from=None, date_to=None, batch_size=1000):
+    # Recomputes the rollups for [date_from, date_to] (inclusive days, both
+    # optional) straight from order_item and the order archive, together
+    # with the sales_rollup_order rows of those orders. Returns the number
+    # of rows written.
+    rollups = SalesRollup.objects.all()
+    if date_from:
+        rollups = rollups.filter(day__gte=date_from)
+    if date_to:
+        rollups = rollups.filter(day__lte=date_to)
+
+    # A day can have cells in both tiers (old orders that were still open
+    # when the archive ran), so the tiers are added up before writing
+    cells = defaultdict(lambda: [Decimal('0'), 0, 0])
+    for _, item_model, _ in ORDER_TIERS:
+        for cell in _rollup_cells(item_model, date_from, date_to).iterator():
+            totals = cells[(cell['day'], cell['cell_category'], cell['cell_brand'])]
+            totals[0] += cell['revenue']
+            totals[1] += cell['units']
+            totals[2] += cell['orders']
+
+    written = 0
+    with transaction.atomic():
+        rollups.delete()
+        batch = []
+        for (day, category_id, brand_id), (revenue, units, orders) in cells.items():
+            batch.append(SalesRollup(
+                day=day,
+                category_id=category_id,
+                brand_id=brand_id,
+                revenue=revenue,
+                units=units,
+                order_count=orders,
+            ))
+            if len(batch) >= batch_size:
+                SalesRollup.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+        if batch:
+            SalesRollup.objects.bulk_create(batch)
+            written += len(batch)
+        _rebuild_markers(date_from, date_to, batch_size)
+    return written
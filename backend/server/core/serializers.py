@@ -1,9 +1,84 @@
+from functools import partial
 from rest_framework import serializers
 from .models import (
     Brand, Category, Product, ProductImage, Address, User,
     ShoppingCart, CartItem, OrderStatus, Order, OrderItem,
-    PaymentStatus, Payment 
+    PaymentStatus, Payment, ArchivedOrder, ArchivedOrderItem
 )
+from .image_variants import represent_variants
+
+def _query_param_set(request, name):
+    if request is None:
+        return None
+    value = request.query_params.get(name)
+    if value is None:
+        return None
+    return {part.strip() for part in value.split(',') if part.strip()}
+
+
+class SparseFieldsetMixin:
+    # Supports ?fields=a,b,c and ?expand=relation on top of a ModelSerializer.
+    # Without either parameter the serializer renders exactly as before. With
+    # one of them, nested relations become opt-in: a relation is embedded only
+    # when it is named in ?expand= (or ?fields=), otherwise it falls back to
+    # the flat field given in expandable_fields (None drops it).
+    expandable_fields = {}
+    # Serializer field name -> ORM lookups that field reads through
+    select_related_fields = {}
+    prefetch_related_fields = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        fields = _query_param_set(request, 'fields')
+        expand = _query_param_set(request, 'expand')
+        self.is_sparse = fields is not None or expand is not None
+        if not self.is_sparse:
+            return
+        expand = expand or set()
+
+        for name, flat_field in self.expandable_fields.items():
+            if name not in self.fields or name in expand:
+                continue
+            if fields is not None and name in fields:
+                continue
+            if flat_field is None:
+                self.fields.pop(name)
+            else:
+                self.fields[name] = flat_field()
+
+        if fields is not None:
+            keep = fields | expand
+            for name in list(self.fields):
+                if name not in keep:
+                    self.fields.pop(name)
+
+    def optimize_queryset(self, queryset):
+        # Push the serialized field set down to the ORM so that trimmed
+        # payloads also trim the SELECT list and the related lookups.
+        opts = queryset.model._meta
+        concrete = {field.name for field in opts.concrete_fields}
+        columns = {opts.pk.name}
+        select_related, prefetch_related = [], []
+
+        for name, field in self.fields.items():
+            root = field.source.split('.')[0]
+            if root in concrete:
+                columns.add(root)
+            select_related += self.select_related_fields.get(name, [])
+            prefetch_related += self.prefetch_related_fields.get(name, [])
+
+        for lookup in select_related:
+            columns.add(lookup.split('__')[0])
+
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+        if self.is_sparse:
+            queryset = queryset.only(*columns)
+        return queryset
+
 
 class BrandSerializer(serializers.ModelSerializer):
     class Meta:
@@ -23,18 +98,41 @@ class CategorySerializer(serializers.ModelSerializer):
         return None
 
 class ProductImageSerializer(serializers.ModelSerializer):
+    # Resized copies (core/image_variants.py), empty until the worker made them
+    variants = serializers.SerializerMethodField()
+
     class Meta:
         model = ProductImage
-        fields = '__all__'
+        fields = ['id', 'image_url', 'product', 'variants']
 
-class ProductSerializer(serializers.ModelSerializer):
+    def get_variants(self, obj):
+        return represent_variants(
+            (variant.variant, variant.format, variant.width, variant.height, variant.path)
+            for variant in obj.variants.all()
+        )
+
+class ProductSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     brand = BrandSerializer(read_only=True)
     category = CategorySerializer(read_only=True)
     images = ProductImageSerializer(source='productimage_set', many=True, read_only=True)
 
+    expandable_fields = {
+        'brand': partial(serializers.PrimaryKeyRelatedField, read_only=True),
+        'category': partial(serializers.PrimaryKeyRelatedField, read_only=True),
+        'images': None,
+    }
+    select_related_fields = {
+        'brand': ['brand'],
+        'category': ['category__parent'],
+    }
+    prefetch_related_fields = {
+        'images': ['productimage_set__variants'],
+    }
+
     class Meta:
         model = Product
-        fields = '__all__'
+        # Sales figures are only used for ?ordering=popularity
+        exclude = ['units_sold']
 
 
 class AddressSerializer(serializers.ModelSerializer):
@@ -44,10 +142,15 @@ class AddressSerializer(serializers.ModelSerializer):
         fields = ['address_line', 'city']
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     address_line = serializers.SerializerMethodField()
     city_name = serializers.SerializerMethodField()
 
+    select_related_fields = {
+        'address_line': ['address'],
+        'city_name': ['address__city'],
+    }
+
     class Meta:
         model = User
         fields = [
@@ -133,12 +236,17 @@ class OrderHistorySerializer(serializers.ModelSerializer):
             'status'  # Add this field to the list
         ]
     
+    def order_items(self, obj):
+        # Archived orders (core/archive.py) keep their items in the archive too
+        model = ArchivedOrderItem if isinstance(obj, ArchivedOrder) else OrderItem
+        return model.objects.filter(order_id=obj.id)
+
     def get_items(self, obj):
-        order_items = OrderItem.objects.filter(order=obj)
+        order_items = self.order_items(obj)
         return OrderItemDetailSerializer(order_items, many=True).data
     
     def get_itemCount(self, obj):
-        return OrderItem.objects.filter(order=obj).count()
+        return self.order_items(obj).count()
 
 class PaymentStatusSerializer(serializers.ModelSerializer):
     class Meta:
@@ -0,0 +1,38 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .hot_cache import hot_product_cache
+from .jobs import enqueue
+from .models import Brand, Category, Product, ProductImage
+from .query_cache import catalog_cache
+
+# Cache tag of every catalog model (see core/query_cache.py)
+CATALOG_TAGS = {
+    Product: 'product',
+    Brand: 'brand',
+    Category: 'category',
+    ProductImage: 'product_image',
+}
+
+
+def invalidate_catalog(*tags):
+    # After commit, otherwise another worker could cache the old rows again
+    # under the new tag version before this transaction is visible
+    def invalidate():
+        catalog_cache.invalidate(*tags)
+        hot_product_cache.clear()
+    transaction.on_commit(invalidate)
+
+
+@receiver([post_save, post_delete])
+def catalog_changed(sender, **kwargs):
+    tag = CATALOG_TAGS.get(sender)
+    if tag is not None:
+        invalidate_catalog(tag)
+
+
+@receiver(post_save, sender=ProductImage)
+def product_image_saved(sender, instance, **kwargs):
+    # The resized variants are made by the job worker (core/image_variants.py)
+    enqueue('build_image_variants', image_ids=[instance.id])
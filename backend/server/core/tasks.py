@@ -0,0 +1,80 @@
+from functools import partial
+
+from django.conf import settings
+from django.core.mail import send_mail
+from django.db import transaction
+
+from .image_variants import VariantBuilder
+from .jobs import task
+from .models import Order, OrderConfirmation, OrderItem, Payment, PaymentStatus
+from .popularity import record_order_sales
+from .recommendations import record_order_pairs
+from .rollups import record_order_placed
+
+
+@task('create_payment')
+def create_payment(order_id, payment_method='card'):
+    if Payment.objects.filter(order_id=order_id).exists():
+        return
+    order = Order.objects.get(pk=order_id)
+    pending, _ = PaymentStatus.objects.get_or_create(status_name='PENDING')
+    Payment.objects.create(
+        order=order,
+        payment_method=payment_method,
+        amount=order.total_amount,
+        payment_status=pending,
+    )
+
+
+@task('assign_tracking_number')
+def assign_tracking_number(order_id):
+    Order.objects.filter(pk=order_id, tracking_number='').update(
+        tracking_number=f'EM{order_id:010d}'
+    )
+
+
+@task('update_sales_rollups')
+def update_sales_rollups(order_id):
+    record_order_placed(Order.objects.select_related('order_status').get(pk=order_id))
+
+
+@task('record_order_pairs')
+def update_recommendations(order_id):
+    record_order_pairs(order_id)
+
+
+@task('update_popularity')
+def update_popularity(order_id):
+    record_order_sales(order_id)
+
+
+@task('build_image_variants', atomic=False)
+def build_image_variants(image_ids=None):
+    # Each image's variants commit on their own, so a failed download
+    # doesn't undo the others. The retry only builds the images that are
+    # still missing variants.
+    summary = VariantBuilder().run(image_ids)
+    if summary['failed']:
+        raise RuntimeError(f'{summary["failed"]} product images could not be processed')
+
+
+@task('send_order_confirmation')
+def send_order_confirmation(order_id):
+    # The row is written in the job's transaction and the email only goes
+    # out after it committed, so a failed commit or a second run of the
+    # job (stale lock) never sends it twice. A send that fails is logged.
+    _, created = OrderConfirmation.objects.get_or_create(order_id=order_id)
+    if not created:
+        return
+    order = Order.objects.select_related('user').get(pk=order_id)
+    lines = [
+        f'{item.quantity} x {item.product.name if item.product else "Unknown product"} ({item.price_per_unit})'
+        for item in OrderItem.objects.filter(order=order).select_related('product')
+    ]
+    transaction.on_commit(partial(
+        send_mail,
+        subject=f'ElectroMart order #{order.id} confirmed',
+        message='\n'.join([f'Thank you for your order, {order.user.first_name}!', ''] + lines + ['', f'Total: {order.total_amount}']),
+        from_email=getattr(settings, 'DEFAULT_FROM_EMAIL', None),
+        recipient_list=[order.user.email],
+    ), robust=True)
@@ -1,3 +1,1017 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import functools
+import http.server
+import io
+import shutil
+import tempfile
+import threading
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
+from urllib.parse import quote
 
-# Create your tests here.
+from django.apps import apps
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, identify_hasher
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from . import tasks  # noqa: F401 (registers the job tasks)
+from .admission import admission_controller
+from .catalog_changes import collect_changes, current_version
+from .exports import iter_order_lines, parse_export_filters
+from .fast_serializers import fast_serialize
+from .hashers import TunablePBKDF2PasswordHasher
+from .hashing import password_hashing
+from .hot_cache import hot_product_cache
+from .image_variants import VariantBuilder, fetch_source
+from .jobs import TASKS, claim_job, enqueue, run_job, task
+from .models import (
+    Address, ArchivedOrder, ArchivedOrderItem, ArchivedPayment, Brand, CatalogChange, Category, City, Job,
+    Order, OrderEvent, OrderItem, OrderStatus, Payment, PaymentStatus, Product, ProductImage,
+    ProductImageVariant, SalesRollup, User,
+)
+from .order_events import OrderEventBroker
+from .query_cache import TaggedCache, catalog_cache
+from .reference import load_reference_data
+from .rollups import rebuild_rollups, record_order_placed, record_status_change, sync_order
+from .serializers import OrderHistorySerializer, ProductSerializer, UserSerializer
+from .signals import invalidate_catalog
+from .views import OrderViewSet
+
+
+class UnmanagedTablesTestCase(TestCase):
+    # The models are unmanaged, so the test database gets their tables here
+    @classmethod
+    def setUpClass(cls):
+        cls.unmanaged_models = [model for model in apps.get_app_config('core').get_models() if not model._meta.managed]
+        with connection.schema_editor() as editor:
+            for model in cls.unmanaged_models:
+                editor.create_model(model)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        with connection.schema_editor() as editor:
+            for model in reversed(cls.unmanaged_models):
+                editor.delete_model(model)
+
+    def setUp(self):
+        # Invalidations run on commit, which never happens inside a test, and
+        # the cached order statuses would point at rolled back rows
+        caches[catalog_cache.alias].clear()
+        catalog_cache.local.clear()
+        hot_product_cache.clear()
+        load_reference_data()
+
+
+class FastSerializerParityTests(UnmanagedTablesTestCase):
+    # The fast path must render byte for byte what the DRF serializers render
+    @classmethod
+    def setUpTestData(cls):
+        brand = Brand.objects.create(name='Apple', description='Phones')
+        root = Category.objects.create(name='Electronics', description='All electronics')
+        parent = Category.objects.create(name='Computers', description='', parent=root)
+        laptops = Category.objects.create(name='Laptops', description='Portable', parent=parent)
+        for i in range(1, 5):
+            product = Product.objects.create(
+                name=f'Product {i}', description='x' * i, price=f'{i * 10}.5', stock_quantity=i,
+                brand=brand if i % 2 else None, category=laptops if i != 3 else root,
+            )
+            for n in range(i % 3):
+                image = ProductImage.objects.create(product=product, image_url=f'http://img.test/{i}/{n}.jpg')
+                if n:
+                    for variant, format in [('detail', 'webp'), ('thumbnail', 'jpeg'), ('thumbnail', 'webp')]:
+                        ProductImageVariant.objects.create(
+                            image=image, variant=variant, format=format, width=160, height=120,
+                            path=f'{format}/{image.id}.{format}', source_url=image.image_url, source_digest='0' * 64, spec='test',
+                        )
+        Product.objects.create(name='Bare', price='1.00', stock_quantity=0, is_active=False)
+
+        city = City.objects.create(city_name='Oslo', postal_code='0150', country='Norway')
+        address = Address.objects.create(address_line='Street 1', city=city)
+        user = User.objects.create(username='u', email='u@test.no', first_name='U', last_name='T', phone='1', address=address)
+        processing = OrderStatus.objects.create(status_name='PROCESSING')
+        for i in range(3):
+            order = Order.objects.create(
+                user=user, total_amount='99.90', order_status=processing,
+                tracking_number='' if i else 'TRK1', shipping_address=address if i != 1 else None,
+            )
+            for product in Product.objects.all()[:i + 1]:
+                OrderItem.objects.create(order=order, product=product, quantity=i + 1, price_per_unit=product.price)
+        # A line whose product was deleted: DRF leaves product_name out
+        OrderItem.objects.create(order=order, product=None, quantity=1, price_per_unit='5.00')
+        archived = ArchivedOrder.objects.create(
+            id=1000, user=user, order_date=order.order_date, total_amount='12.00',
+            order_status=processing, tracking_number='TRK0', shipping_address=address,
+        )
+        ArchivedOrderItem.objects.create(id=1000, order=archived, product_id=1, quantity=2, price_per_unit='6.00')
+        ArchivedOrderItem.objects.create(id=1001, order=archived, product_id=None, quantity=1, price_per_unit='0.00')
+        cls.user_id = user.id
+
+    def render(self, data):
+        return JSONRenderer().render(data)
+
+    def assert_parity(self, queryset, serializer):
+        fast = fast_serialize(queryset, serializer)
+        self.assertIsNotNone(fast)
+        objects = list(queryset)
+        drf = type(serializer)(objects, many=True, context=serializer.context).data
+        self.assertEqual(self.render([data for _, data in fast]), self.render(drf))
+        self.assertEqual([pk for pk, _ in fast], [obj.pk for obj in objects])
+
+    def product_serializer(self, query=''):
+        request = Request(APIRequestFactory().get(f'/api/products/?{query}'))
+        return ProductSerializer(context={'request': request})
+
+    def test_products_full_representation(self):
+        queryset = Product.objects.order_by('id')
+        self.assert_parity(queryset, self.product_serializer())
+
+    def test_products_sparse_fieldsets(self):
+        for query in ('fields=id,name,price', 'expand=brand', 'fields=name,images', 'fields=category&expand=brand'):
+            with self.subTest(query=query):
+                self.assert_parity(Product.objects.order_by('-id'), self.product_serializer(query))
+
+    def test_order_history(self):
+        queryset = Order.objects.order_by('-order_date', '-id')
+        self.assert_parity(queryset, OrderHistorySerializer())
+
+    def test_archived_order_history(self):
+        self.assert_parity(ArchivedOrder.objects.all(), OrderHistorySerializer())
+
+    def test_order_history_queries(self):
+        with self.assertNumQueries(2):
+            fast_serialize(Order.objects.all(), OrderHistorySerializer())
+
+
+class OrderHistoryTests(UnmanagedTablesTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        delivered = OrderStatus.objects.create(status_name='DELIVERED')
+        cls.user = User.objects.create(username='h', email='h@test.no')
+        other = User.objects.create(username='o', email='o@test.no')
+        cls.hot = Order.objects.create(user=cls.user, total_amount='10.00', order_status=delivered, tracking_number='')
+        Order.objects.create(user=other, total_amount='20.00', order_status=delivered, tracking_number='')
+        now = timezone.now()
+        for order_id, user, days in [(1000, cls.user, 400), (1001, cls.user, 800), (1002, other, 500)]:
+            ArchivedOrder.objects.create(
+                id=order_id, user=user, order_date=now - datetime.timedelta(days=days), total_amount='5.00',
+                order_status=delivered, tracking_number='',
+            )
+
+    def order_history(self, query=''):
+        request = APIRequestFactory().get(f'/api/orders/?userid={self.user.id}&{query}')
+        with CaptureQueriesContext(connection) as queries:
+            response = OrderViewSet.as_view({'get': 'list'})(request)
+        self.read_archive = any('order_archive' in query['sql'] for query in queries.captured_queries)
+        return [data['order_id'] for data in response.data]
+
+    def test_reads_only_hot_orders_by_default(self):
+        # Even a user with a single recent order doesn't touch the archive
+        self.assertEqual(self.order_history(), [self.hot.id])
+        self.assertFalse(self.read_archive)
+
+    def test_merges_archive_on_request(self):
+        self.assertEqual(self.order_history('archive=1'), [self.hot.id, 1000, 1001])
+        self.assertTrue(self.read_archive)
+
+
+class SparseFieldsetTests(UnmanagedTablesTestCase):
+    # ?fields= / ?expand= trim the queryset with only() and select_related(),
+    # every combination has to stay a valid query
+    @classmethod
+    def setUpTestData(cls):
+        brand = Brand.objects.create(name='Apple', description='Phones')
+        root = Category.objects.create(name='Electronics', description='')
+        laptops = Category.objects.create(name='Laptops', description='', parent=root)
+        cls.product = Product.objects.create(
+            name='MacBook', description='Laptop', price='999.00', stock_quantity=3, brand=brand, category=laptops,
+        )
+        city = City.objects.create(city_name='Oslo', postal_code='0150', country='Norway')
+        address = Address.objects.create(address_line='Street 1', city=city)
+        cls.admin = User.objects.create(
+            username='admin', email='admin@test.no', first_name='A', last_name='D', phone='1', address=address, role='admin',
+        )
+
+    def optimized_data(self, serializer_class, model, query, path):
+        request = Request(APIRequestFactory().get(f'{path}?{query}'))
+        serializer = serializer_class(context={'request': request})
+        objects = list(serializer.optimize_queryset(model.objects.order_by('id')))
+        return serializer_class(objects, many=True, context={'request': request}).data
+
+    def test_product_fieldsets(self):
+        brand = {'id': self.product.brand_id, 'name': 'Apple', 'description': 'Phones'}
+        cases = [
+            ('fields=name', {'name': 'MacBook'}),
+            ('fields=brand', {'brand': brand}),
+            ('fields=id,name&expand=brand', {'id': self.product.id, 'name': 'MacBook', 'brand': brand}),
+        ]
+        for query, expected in cases:
+            with self.subTest(query=query):
+                self.assertEqual(self.client.get(f'/api/products/?{query}').json(), [expected])
+                self.assertEqual(self.optimized_data(ProductSerializer, Product, query, '/api/products/'), [expected])
+
+    def test_product_expand_category(self):
+        data = self.client.get('/api/products/?expand=category').json()[0]
+        self.assertEqual(data['brand'], self.product.brand_id)
+        self.assertEqual(data['category']['name'], 'Laptops')
+        self.assertEqual(data['category']['parent']['name'], 'Electronics')
+        self.assertNotIn('images', data)
+        self.assertEqual(self.optimized_data(ProductSerializer, Product, 'expand=category', '/api/products/'), [data])
+
+    def test_user_fieldsets(self):
+        session = self.client.session
+        session['user_id'] = self.admin.id
+        session.save()
+        cases = [
+            ('fields=email', {'email': 'admin@test.no'}),
+            ('fields=id,city_name', {'id': self.admin.id, 'city_name': 'Oslo'}),
+            ('fields=address_line', {'address_line': 'Street 1'}),
+        ]
+        for query, expected in cases:
+            with self.subTest(query=query):
+                response = self.client.get(f'/api/users/?{query}')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json()['results'], [expected])
+                self.assertEqual(self.optimized_data(UserSerializer, User, query, '/api/users/'), [expected])
+        self.assertEqual(self.client.get('/api/users/').json()['results'][0]['city_name'], 'Oslo')
+
+
+class BatchTests(UnmanagedTablesTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        product = Product.objects.create(name='Cable', price='9.90', stock_quantity=10)
+        city = City.objects.create(city_name='Oslo', postal_code='0150', country='Norway')
+        address = Address.objects.create(address_line='Street 1', city=city)
+        user = User.objects.create(username='u', email='u@test.no', phone='1', address=address)
+        order = Order.objects.create(
+            user=user, total_amount='19.80', order_status=OrderStatus.objects.create(status_name='PROCESSING'),
+        )
+        OrderItem.objects.create(order=order, product=product, quantity=2, price_per_unit='9.90')
+
+    def test_batched_bodies_match_direct_responses(self):
+        paths = ['/api/order-items/', '/api/products/?fields=name,price', '/api/csrf/']
+        query = '&'.join(f'path={quote(path)}' for path in paths)
+        responses = self.client.get(f'/api/batch/?{query}').json()['responses']
+        for path, entry in zip(paths, responses):
+            with self.subTest(path=path):
+                direct = self.client.get(path)
+                self.assertEqual(entry['status'], direct.status_code)
+                self.assertEqual(entry['body'], direct.json())
+        self.assertEqual(responses[0]['body'][0]['subtotal'], 19.8)
+
+    def test_failing_paths_only_fail_their_entry(self):
+        responses = self.client.get('/api/batch/?path=/api/nothing/&path=/api/orders/export/&path=/api/csrf/').json()['responses']
+        self.assertEqual([entry['status'] for entry in responses], [404, 400, 200])
+
+
+class OrderExportTests(UnmanagedTablesTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        product = Product.objects.create(name='Cable', price='5.00', stock_quantity=10)
+        city = City.objects.create(city_name='Oslo', postal_code='0150', country='Norway')
+        address = Address.objects.create(address_line='Street 1', city=city)
+        user = User.objects.create(username='u', email='u@test.no', phone='1', address=address)
+        delivered = OrderStatus.objects.create(status_name='DELIVERED')
+        cancelled = OrderStatus.objects.create(status_name='CANCELLED')
+        paid = PaymentStatus.objects.create(status_name='PAID')
+        day = datetime.datetime(2025, 1, 10, 12, tzinfo=datetime.timezone.utc)
+
+        archived = ArchivedOrder.objects.create(
+            id=5000, user=user, order_date=day - datetime.timedelta(days=5), total_amount='5.00',
+            order_status=delivered, shipping_address=address,
+        )
+        ArchivedOrderItem.objects.create(id=5000, order=archived, product_id=product.id, quantity=1, price_per_unit='5.00')
+        ArchivedPayment.objects.create(
+            id=5000, order=archived, payment_method='card', amount='5.00', payment_status=paid, payment_date=archived.order_date,
+        )
+        # Several orders on the same timestamp, created out of date order
+        cls.orders = []
+        for offset, order_status in [(1, delivered), (0, delivered), (0, cancelled), (0, delivered), (3, delivered)]:
+            order = Order.objects.create(user=user, total_amount='10.00', order_status=order_status, shipping_address=address)
+            Order.objects.filter(pk=order.pk).update(order_date=day + datetime.timedelta(days=offset))
+            for quantity in (1, 2):
+                OrderItem.objects.create(order=order, product=product, quantity=quantity, price_per_unit='5.00')
+            Payment.objects.create(order=order, payment_method='card', amount='10.00', payment_status=paid)
+            cls.orders.append(order.id)
+
+    def export(self, batch_size=2, **options):
+        return list(iter_order_lines(parse_export_filters(**options), batch_size=batch_size))
+
+    def test_batches_cover_every_line_once(self):
+        rows = self.export()
+        hot = self.orders
+        expected_orders = [5000] + [hot[1], hot[2], hot[3], hot[0], hot[4]]
+        self.assertEqual([row[0] for row in rows], [5000] + [order for order in expected_orders[1:] for _ in (1, 2)])
+        self.assertEqual(len({row[10] for row in rows}), len(rows))
+        self.assertEqual(rows, self.export(batch_size=1000))
+        self.assertEqual(rows[0][14:], (5, 'card', 5, 'PAID'))
+        self.assertEqual(rows[2][12:15], (2, 5, 10))
+
+    def test_filters(self):
+        rows = self.export(date_from='2025-01-10', date_to='2025-01-10')
+        self.assertEqual({row[0] for row in rows}, set(self.orders[1:4]))
+        rows = self.export(date_from='2025-01-01', status='delivered')
+        self.assertEqual({row[0] for row in rows}, {5000, self.orders[0], self.orders[1], self.orders[3], self.orders[4]})
+        self.assertEqual(self.export(date_to='2025-01-04'), [])
+
+
+class SalesRollupTests(UnmanagedTablesTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(name='Cable', price='5.00', stock_quantity=10)
+        city = City.objects.create(city_name='Oslo', postal_code='0150', country='Norway')
+        address = Address.objects.create(address_line='Street 1', city=city)
+        cls.user = User.objects.create(username='u', email='u@test.no', phone='1', address=address)
+        cls.processing = OrderStatus.objects.create(status_name='PROCESSING')
+        cls.cancelled = OrderStatus.objects.create(status_name='CANCELLED')
+
+    def place_order(self, quantity=2):
+        order = Order.objects.create(user=self.user, total_amount='10.00', order_status=self.processing)
+        OrderItem.objects.create(order=order, product=self.product, quantity=quantity, price_per_unit='5.00')
+        return order
+
+    def set_status(self, order, status):
+        Order.objects.filter(pk=order.pk).update(order_status=status)
+        record_status_change(order, status.status_name)
+
+    def run_placed_job(self, order):
+        record_order_placed(Order.objects.select_related('order_status').get(pk=order.pk))
+
+    def totals(self):
+        return list(SalesRollup.objects.values_list('units', 'order_count'))
+
+    def test_placed_then_cancelled(self):
+        order = self.place_order()
+        self.run_placed_job(order)
+        self.assertEqual(self.totals(), [(2, 1)])
+        self.set_status(order, self.cancelled)
+        self.assertEqual(self.totals(), [(0, 0)])
+
+    def test_cancelled_before_the_job_ran(self):
+        order = self.place_order()
+        self.set_status(order, self.cancelled)
+        self.run_placed_job(order)
+        self.assertEqual(self.totals(), [])
+        self.set_status(order, self.processing)
+        self.assertEqual(self.totals(), [(2, 1)])
+
+    def test_job_and_status_changes_count_once(self):
+        order = self.place_order()
+        self.run_placed_job(order)
+        self.run_placed_job(order)
+        self.set_status(order, self.processing)
+        self.assertEqual(self.totals(), [(2, 1)])
+
+    def test_archived_order(self):
+        archived = ArchivedOrder.objects.create(
+            id=7000, user=self.user, order_date=datetime.datetime(2024, 3, 1, tzinfo=datetime.timezone.utc),
+            total_amount='15.00', order_status=self.processing,
+        )
+        ArchivedOrderItem.objects.create(id=7000, order=archived, product_id=self.product.id, quantity=3, price_per_unit='5.00')
+        sync_order(archived, 'PROCESSING')
+        self.assertEqual(self.totals(), [(3, 1)])
+        sync_order(archived, 'CANCELLED')
+        self.assertEqual(self.totals(), [(0, 0)])
+
+    def test_job_after_rebuild(self):
+        order = self.place_order()
+        rebuild_rollups()
+        self.assertEqual(self.totals(), [(2, 1)])
+        self.run_placed_job(order)
+        self.assertEqual(self.totals(), [(2, 1)])
+        self.set_status(order, self.cancelled)
+        self.assertEqual(self.totals(), [(0, 0)])
+
+
+@mock.patch.object(password_hashing, 'workers', 0)
+@mock.patch.object(TunablePBKDF2PasswordHasher, 'iterations', 2000)
+class PasswordHashingTests(UnmanagedTablesTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.city = City.objects.create(city_name='Oslo', postal_code='0150', country='Norway')
+        cls.user = User.objects.create(
+            username='u', email='u@test.no', phone='1', address=Address.objects.create(address_line='Street 1', city=cls.city),
+            password=PBKDF2PasswordHasher().encode('secret', 'salt', iterations=1000),
+        )
+
+    def login(self, password='secret'):
+        return self.client.post('/api/login/', {'email': 'u@test.no', 'password': password}, content_type='application/json')
+
+    def register(self):
+        return self.client.post('/api/register/', {
+            'username': 'new', 'firstName': 'N', 'lastName': 'U', 'email': 'new@test.no', 'phone': '2', 'password': 'pw',
+            'address': {'city': 'Bergen', 'postalCode': '5003', 'country': 'Norway', 'line': 'Street 2'},
+        }, content_type='application/json')
+
+    def test_login_rehashes_old_hashes(self):
+        self.assertEqual(self.login('wrong').status_code, 401)
+        self.user.refresh_from_db()
+        self.assertEqual(identify_hasher(self.user.password).safe_summary(self.user.password)['iterations'], 1000)
+
+        self.assertEqual(self.login().status_code, 200)
+        self.user.refresh_from_db()
+        self.assertEqual(identify_hasher(self.user.password).safe_summary(self.user.password)['iterations'], 2000)
+        self.assertEqual(self.login().status_code, 200)
+
+    def test_register(self):
+        self.assertEqual(self.register().status_code, 201)
+        self.assertTrue(password_hashing.verify('pw', User.objects.get(email='new@test.no').password)[0])
+
+    def test_overloaded_hashing_answers_503(self):
+        with mock.patch.object(password_hashing, 'max_pending', 0):
+            for response in (self.login(), self.register()):
+                self.assertEqual(response.status_code, 503)
+                self.assertEqual(response['Retry-After'], '1')
+        self.assertFalse(User.objects.filter(email='new@test.no').exists())
+        self.assertFalse(Address.objects.filter(address_line='Street 2').exists())
+
+
+class CheckoutTests(UnmanagedTablesTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(name='Cable', price='5.00', stock_quantity=10)
+        OrderStatus.objects.create(status_name='PROCESSING')
+
+    def checkout(self, *product_ids):
+        return self.client.post('/api/checkout/', {
+            'address': {
+                'city': 'Oslo', 'postalCode': '0150', 'country': 'Norway', 'street': 'Street 1',
+                'firstName': 'U', 'lastName': 'T', 'phone': '1',
+            },
+            'contact': {'email': 'u@test.no'},
+            'totalAmount': '10.00',
+            'items': [{'productId': product_id, 'quantity': 1, 'pricePerUnit': '5.00'} for product_id in product_ids],
+        }, content_type='application/json')
+
+    def test_string_product_ids(self):
+        response = self.checkout(str(self.product.id), self.product.id)
+        self.assertEqual(response.status_code, 201)
+        order_id = response.json()['order_id']
+        self.assertEqual(OrderItem.objects.filter(order_id=order_id).count(), 2)
+        self.assertEqual(Job.objects.filter(payload__order_id=order_id).count(), 6)
+
+    def test_rejected_items_keep_nothing(self):
+        for product_ids in [(self.product.id, 999999), (self.product.id, 'x')]:
+            with self.subTest(product_ids=product_ids):
+                self.assertEqual(self.checkout(*product_ids).status_code, 400)
+                self.assertFalse(Order.objects.exists())
+                self.assertFalse(Address.objects.exists())
+                self.assertFalse(Job.objects.exists())
+
+
+class JobQueueTests(UnmanagedTablesTestCase):
+    def setUp(self):
+        super().setUp()
+        self.calls = []
+        tasks = mock.patch.dict(TASKS)
+        tasks.start()
+        self.addCleanup(tasks.stop)
+
+        @task('test_record')
+        def record(value):
+            self.calls.append(value)
+            Product.objects.create(name=f'Made by job {value}', price='1.00', stock_quantity=1)
+
+        @task('test_fail')
+        def fail(value):
+            Product.objects.create(name='Rolled back', price='1.00', stock_quantity=1)
+            raise RuntimeError(value)
+
+    def test_claims_due_jobs_in_order(self):
+        later = enqueue('test_record', delay=60, value='later')
+        first = enqueue('test_record', value='first')
+        second = enqueue('test_record', value='second')
+        self.assertEqual(claim_job('w1').id, first.id)
+        job = claim_job('w1')
+        self.assertEqual((job.id, job.status, job.attempts, job.locked_by), (second.id, Job.RUNNING, 1, 'w1'))
+        self.assertIsNone(claim_job('w1'))
+        self.assertEqual(Job.objects.get(pk=later.pk).status, Job.QUEUED)
+
+    def test_done_jobs_keep_their_writes(self):
+        enqueue('test_record', value='a')
+        self.assertTrue(run_job(claim_job('w1')))
+        self.assertEqual(self.calls, ['a'])
+        self.assertEqual(Job.objects.get().status, Job.DONE)
+        self.assertTrue(Product.objects.filter(name='Made by job a').exists())
+
+    @override_settings(JOB_RETRY_BASE_DELAY=2, JOB_MAX_RETRY_DELAY=600)
+    def test_failures_are_retried_with_backoff(self):
+        job = enqueue('test_fail', max_attempts=3, value='boom')
+        for attempt, delay in [(1, 2), (2, 4)]:
+            Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+            started = timezone.now()
+            self.assertFalse(run_job(claim_job('w1')))
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts), (Job.QUEUED, attempt))
+            self.assertAlmostEqual((job.run_at - started).total_seconds(), delay, delta=1)
+            self.assertIn('RuntimeError: boom', job.last_error)
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        self.assertFalse(run_job(claim_job('w1')))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 3))
+        self.assertFalse(Product.objects.filter(name='Rolled back').exists())
+
+    def test_unknown_tasks_fail_at_once(self):
+        enqueue('no_such_task')
+        self.assertFalse(run_job(claim_job('w1')))
+        self.assertEqual(Job.objects.get().status, Job.FAILED)
+
+    @override_settings(JOB_LOCK_TIMEOUT=300)
+    def test_stale_locks_are_reclaimed(self):
+        stale = enqueue('test_record', value='stale')
+        fresh = enqueue('test_record', value='fresh')
+        now = timezone.now()
+        Job.objects.filter(pk=stale.pk).update(status=Job.RUNNING, attempts=1, locked_by='dead', locked_at=now - datetime.timedelta(seconds=301))
+        Job.objects.filter(pk=fresh.pk).update(status=Job.RUNNING, attempts=1, locked_by='busy', locked_at=now)
+        job = claim_job('w2')
+        self.assertEqual((job.id, job.attempts, job.locked_by), (stale.id, 2, 'w2'))
+        self.assertIsNone(claim_job('w2'))
+
+
+class OrderUpdateImportTests(UnmanagedTablesTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        city = City.objects.create(city_name='Oslo', postal_code='0150', country='Norway')
+        address = Address.objects.create(address_line='Street 1', city=city)
+        cls.admin = User.objects.create(username='a', email='a@test.no', phone='1', address=address, role='admin')
+        processing = OrderStatus.objects.create(status_name='PROCESSING')
+        OrderStatus.objects.create(status_name='SHIPPED')
+        cls.order = Order.objects.create(user=cls.admin, total_amount='10.00', order_status=processing)
+
+    def post(self, body, content_type='text/csv'):
+        session = self.client.session
+        session['user_id'] = self.admin.id
+        session.save()
+        return self.client.post('/api/orders/bulk-update/', body, content_type=content_type)
+
+    def test_csv_with_byte_order_mark(self):
+        body = f'order_id,status,tracking_number\n{self.order.id},shipped,TRK9\n'.encode('utf-8-sig')
+        summary = self.post(body).json()
+        self.assertEqual((summary['updated'], summary['error_count']), (1, 0))
+        order = Order.objects.select_related('order_status').get(pk=self.order.pk)
+        self.assertEqual((order.order_status.status_name, order.tracking_number), ('SHIPPED', 'TRK9'))
+
+    def test_rejected_rows(self):
+        body = (
+            'order_id,status,tracking_number\n'
+            f'{self.order.id},lost,\n'
+            '999999,shipped,\n'
+            f'{self.order.id},,\n'
+            'abc,shipped,\n'
+            f'{self.order.id},processing,\n'
+        )
+        summary = self.post(body).json()
+        self.assertEqual((summary['processed'], summary['updated'], summary['unchanged']), (5, 0, 1))
+        self.assertEqual([(error['line'], error['error']) for error in summary['errors']], [
+            (2, 'Unknown status "LOST".'),
+            (4, 'Nothing to update.'),
+            (5, 'order_id must be an integer.'),
+            (3, 'Order not found.'),
+        ])
+
+    def test_ndjson(self):
+        body = f'{{"order_id": {self.order.id}, "tracking_number": "TRK1"}}\nnot json\n'.encode('utf-8-sig')
+        summary = self.post(body, 'application/x-ndjson').json()
+        self.assertEqual((summary['updated'], summary['error_count']), (1, 1))
+        self.assertEqual(Order.objects.get(pk=self.order.pk).tracking_number, 'TRK1')
+
+    def test_admin_only(self):
+        self.assertEqual(self.client.post('/api/orders/bulk-update/', '', content_type='text/csv').status_code, 401)
+
+
+class CatalogImportTests(UnmanagedTablesTestCase):
+    FEED = (
+        'id,name,description,price,stock_quantity,is_active,brand,category,category_parent,images\n'
+        '501,Phone,,199.5,3,yes,Acme,Phones,Electronics,http://img.test/a.jpg|http://img.test/b.jpg\n'
+        '502,Case,Soft case,9.99,,no,acme,Accessories,,\n'
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        city = City.objects.create(city_name='Oslo', postal_code='0150', country='Norway')
+        address = Address.objects.create(address_line='Street 1', city=city)
+        cls.admin = User.objects.create(username='a', email='a@test.no', phone='1', address=address, role='admin')
+
+    def post(self, body, content_type='text/csv'):
+        session = self.client.session
+        session['user_id'] = self.admin.id
+        session.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/api/products/import/', body, content_type=content_type).json()
+
+    def counts(self, summary):
+        return {key: summary[key] for key in ('created', 'updated', 'unchanged', 'images_added', 'images_removed', 'error_count')}
+
+    def test_creates_products_brands_and_categories(self):
+        summary = self.post(self.FEED)
+        self.assertEqual(self.counts(summary), {
+            'created': 2, 'updated': 0, 'unchanged': 0, 'images_added': 2, 'images_removed': 0, 'error_count': 0,
+        })
+        phone = Product.objects.select_related('brand', 'category__parent').get(pk=501)
+        self.assertEqual((phone.price, phone.stock_quantity, phone.is_active), (Decimal('199.50'), 3, True))
+        self.assertEqual((phone.brand.name, phone.category.name, phone.category.parent.name), ('Acme', 'Phones', 'Electronics'))
+        case = Product.objects.get(pk=502)
+        self.assertEqual((case.brand_id, case.stock_quantity, case.is_active), (phone.brand_id, 0, False))
+        self.assertEqual(Brand.objects.count(), 1)
+        self.assertEqual(Job.objects.get().task, 'build_image_variants')
+
+    def test_reimport_writes_nothing(self):
+        self.post(self.FEED)
+        with CaptureQueriesContext(connection) as queries:
+            summary = self.post(self.FEED)
+        self.assertEqual((summary['unchanged'], summary['created'], summary['updated']), (2, 0, 0))
+        writes = [query['sql'] for query in queries if query['sql'].split()[0] in ('INSERT', 'UPDATE', 'DELETE')]
+        self.assertEqual([sql for sql in writes if 'product' in sql.lower()], [])
+
+    def test_updates_products_and_images(self):
+        self.post(self.FEED)
+        self.client.get('/api/products/501/')
+        summary = self.post(
+            '{"id": 501, "name": "Phone", "price": "149.00", "stock_quantity": 3, "brand": "Acme", '
+            '"category": "Phones", "images": ["http://img.test/b.jpg", "http://img.test/c.jpg"]}\n',
+            'application/x-ndjson',
+        )
+        self.assertEqual(self.counts(summary), {
+            'created': 0, 'updated': 1, 'unchanged': 0, 'images_added': 1, 'images_removed': 1, 'error_count': 0,
+        })
+        self.assertEqual(Product.objects.get(pk=501).price, Decimal('149.00'))
+        self.assertEqual(
+            sorted(ProductImage.objects.filter(product_id=501).values_list('image_url', flat=True)),
+            ['http://img.test/b.jpg', 'http://img.test/c.jpg'],
+        )
+        # The cached product was invalidated after the import committed
+        self.assertEqual(self.client.get('/api/products/501/').json()['price'], '149.00')
+
+    def test_rejected_rows(self):
+        summary = self.post(
+            'id,name,price,stock_quantity\n'
+            'x,Bad id,1.00,1\n'
+            '601,,1.00,1\n'
+            '602,Bad price,cheap,1\n'
+            '603,Bad stock,1.00,many\n'
+            '604,Good,1.00,1\n'
+        )
+        self.assertEqual((summary['created'], summary['error_count']), (1, 4))
+        self.assertEqual([error['line'] for error in summary['errors']], [2, 3, 4, 5])
+        self.assertEqual(list(Product.objects.values_list('id', flat=True)), [604])
+
+    def test_imports_have_their_own_admission_class(self):
+        route = admission_controller.classify(APIRequestFactory().post('/api/products/import/'))
+        catalog = admission_controller.classify(APIRequestFactory().get('/api/products/'))
+        self.assertEqual((route.name, catalog.name), ('import', 'catalog'))
+        service_time = catalog.service_time
+        admission_controller.acquire(route)
+        try:
+            session = self.client.session
+            session['user_id'] = self.admin.id
+            session.save()
+            response = self.client.post('/api/products/import/', self.FEED, content_type='text/csv')
+        finally:
+            admission_controller.release(route, 0)
+        self.assertEqual(response.status_code, 503)
+        self.assertTrue(response['Retry-After'])
+        self.post(self.FEED)
+        self.assertEqual(catalog.service_time, service_time)
+
+
+@override_settings(CATALOG_CHANGES_SETTLE_SECONDS=30)
+class CatalogChangeTests(UnmanagedTablesTestCase):
+    def log(self, version, object_id, age):
+        CatalogChange.objects.create(version=version, entity='product', object_id=object_id, action=CatalogChange.UPSERT)
+        CatalogChange.objects.filter(version=version).update(changed_at=timezone.now() - datetime.timedelta(seconds=age))
+
+    def test_version_stays_below_unsettled_gaps(self):
+        self.log(1, 101, age=60)
+        self.log(2, 102, age=1)
+        self.log(4, 104, age=1)
+        self.assertEqual(current_version(), 2)
+        changes = collect_changes(0)
+        self.assertEqual((changes['version'], changes['changed']['product']), (2, {101, 102, 104}))
+        self.assertEqual(collect_changes(2)['version'], 2)
+
+        # Version 3 committed late
+        self.log(3, 103, age=1)
+        self.assertEqual(current_version(), 4)
+        self.assertEqual(collect_changes(2)['version'], 4)
+
+    def test_old_gaps_are_skipped(self):
+        self.log(1, 101, age=120)
+        self.log(3, 103, age=60)
+        self.log(5, 105, age=1)
+        self.assertEqual(current_version(), 3)
+        self.assertEqual(collect_changes(0)['version'], 3)
+
+    def test_settle_window_uses_the_database_clock(self):
+        self.log(1, 101, age=1)
+        self.log(3, 103, age=1)
+        # Django's clock running ahead of the database must not settle the gap
+        later = timezone.now() + datetime.timedelta(hours=2)
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            self.assertEqual(current_version(), 1)
+            self.assertEqual(collect_changes(0)['version'], 1)
+
+
+class OrderEventBrokerTests(UnmanagedTablesTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.status = OrderStatus.objects.create(status_name='SHIPPED')
+
+    def setUp(self):
+        super().setUp()
+        self.broker = OrderEventBroker(settle_seconds=30, batch_size=2)
+        self.queue = asyncio.Queue()
+        self.broker._subscribers[7] = {self.queue}
+
+    async def event(self, event_id, age=1):
+        await OrderEvent.objects.acreate(id=event_id, order_id=1, user_id=7, order_status=self.status, tracking_number='')
+        await OrderEvent.objects.filter(id=event_id).aupdate(created_at=timezone.now() - datetime.timedelta(seconds=age))
+
+    async def received(self):
+        await self.broker._poll_once()
+        events = []
+        while not self.queue.empty():
+            events.append(self.queue.get_nowait()['id'])
+        return events
+
+    async def test_late_commits_are_delivered_once(self):
+        await self.event(1, age=60)
+        await self.event(2)
+        await self.event(4)
+        self.assertEqual(await self.received(), [])
+        await self.event(3)
+        await self.event(5)
+        self.assertEqual(await self.received(), [3, 5])
+        self.assertEqual(await self.received(), [])
+
+    async def test_gaps_settle(self):
+        await self.event(1, age=60)
+        self.assertEqual(await self.received(), [])
+        await self.event(3)
+        self.assertEqual(await self.received(), [3])
+        await OrderEvent.objects.filter(id=3).aupdate(created_at=timezone.now() - datetime.timedelta(seconds=60))
+        self.assertEqual(await self.received(), [])
+        # Too late, id 2 counts as rolled back by now
+        await self.event(2)
+        self.assertEqual(await self.received(), [])
+
+    async def test_open_gap_does_not_hold_back_new_events(self):
+        self.assertEqual(await self.received(), [])
+        await self.event(1)
+        for event_id in range(3, 13):
+            await self.event(event_id)
+        self.assertEqual(await self.received(), [1] + list(range(3, 13)))
+        await self.event(2)
+        await self.event(13)
+        self.assertEqual(await self.received(), [2, 13])
+
+    async def test_large_id_jumps_are_not_tracked(self):
+        self.assertEqual(await self.received(), [])
+        await self.event(1)
+        await self.event(5_000_000)
+        self.assertEqual(await self.received(), [1, 5_000_000])
+        self.assertEqual(self.broker._missing, set())
+
+
+class CatalogCacheTests(UnmanagedTablesTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Laptops', description='')
+        cls.product = Product.objects.create(name='Laptop', price='100.00', stock_quantity=1, category=cls.category)
+        cls.image = ProductImage.objects.create(product=cls.product, image_url='http://img.test/1.jpg')
+
+    def setUp(self):
+        super().setUp()
+        self.cache = TaggedCache(lock_timeout=1)
+
+    def get(self, path):
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def assert_invalidated_on_commit(self, tag, path, value, change):
+        self.assertEqual(value(self.get(path)), value(self.get(path)))
+        before = catalog_cache.tag_versions([tag])
+        with self.captureOnCommitCallbacks() as callbacks:
+            change()
+        # Until the transaction commits the old entry stays in use
+        self.assertEqual(catalog_cache.tag_versions([tag]), before)
+        old = value(self.get(path))
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(catalog_cache.tag_versions([tag]), before)
+        self.assertNotEqual(value(self.get(path)), old)
+
+    def test_product_save_invalidates_after_commit(self):
+        def change():
+            self.product.name = 'Renamed laptop'
+            self.product.save()
+        self.assert_invalidated_on_commit('product', f'/api/products/{self.product.id}/', lambda data: data['name'], change)
+
+    def test_category_save_invalidates_after_commit(self):
+        def change():
+            self.category.name = 'Notebooks'
+            self.category.save()
+        self.assert_invalidated_on_commit('category', '/api/categories/', lambda data: [row['name'] for row in data], change)
+
+    def test_image_save_invalidates_after_commit(self):
+        def change():
+            self.image.image_url = 'http://img.test/2.jpg'
+            self.image.save()
+        self.assert_invalidated_on_commit(
+            'product_image', f'/api/products/{self.product.id}/', lambda data: [image['image_url'] for image in data['images']], change,
+        )
+
+    def test_invalidate_catalog_waits_for_commit(self):
+        before = catalog_cache.tag_versions(['brand', 'product'])
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate_catalog('brand')
+            self.assertEqual(catalog_cache.tag_versions(['brand', 'product']), before)
+        after = catalog_cache.tag_versions(['brand', 'product'])
+        self.assertNotEqual(after[0], before[0])
+        self.assertEqual(after[1], before[1])
+
+    def test_invalidated_tag_misses(self):
+        builds = []
+
+        def build():
+            builds.append(1)
+            return len(builds)
+        self.assertEqual(self.cache.get_or_build('key', {'brand', 'product'}, build), 1)
+        self.assertEqual(self.cache.get_or_build('key', {'brand', 'product'}, build), 1)
+        self.cache.invalidate('category')
+        self.assertEqual(self.cache.get_or_build('key', {'brand', 'product'}, build), 1)
+        self.cache.invalidate('brand')
+        self.assertEqual(self.cache.get_or_build('key', {'brand', 'product'}, build), 2)
+        # Dropping the local tier still hits the shared one
+        self.cache.local.clear()
+        self.assertEqual(self.cache.get_or_build('key', {'brand', 'product'}, build), 2)
+
+    def build_in_thread(self, value):
+        # Holds the stampede lock until release is set
+        started, release = threading.Event(), threading.Event()
+
+        def build():
+            started.set()
+            release.wait(5)
+            return value
+        thread = threading.Thread(target=self.cache.get_or_build, args=('key', {'product'}, build))
+        thread.start()
+        self.assertTrue(started.wait(5))
+        return thread, release
+
+    def test_waits_for_the_worker_holding_the_lock(self):
+        thread, release = self.build_in_thread('built once')
+        builds = []
+        threading.Timer(0.2, release.set).start()
+        self.assertEqual(self.cache.get_or_build('key', {'product'}, lambda: builds.append(1) or 'built twice'), 'built once')
+        thread.join()
+        self.assertEqual(builds, [])
+
+    def test_builds_itself_after_lock_timeout(self):
+        self.cache.lock_timeout = 0.2
+        thread, release = self.build_in_thread('slow')
+        try:
+            self.assertEqual(self.cache.get_or_build('key', {'product'}, lambda: 'fast'), 'fast')
+        finally:
+            release.set()
+            thread.join()
+
+    def test_serves_uncached_when_shared_cache_is_down(self):
+        with mock.patch.object(caches[self.cache.alias], 'get_many', side_effect=ConnectionError), self.assertLogs('core.query_cache', 'WARNING'):
+            self.assertEqual(self.cache.get_or_build('key', {'product'}, lambda: 'fresh'), 'fresh')
+        self.assertEqual(self.cache.get_or_build('key', {'product'}, lambda: 'rebuilt'), 'rebuilt')
+
+
+class ImageSourceHandler(http.server.SimpleHTTPRequestHandler):
+    requested = []
+
+    def do_GET(self):
+        self.requested.append(self.path)
+        super().do_GET()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ImageVariantTests(UnmanagedTablesTestCase):
+    # Sources are served from a local directory over HTTP
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.sources = Path(tempfile.mkdtemp())
+        cls.server = http.server.ThreadingHTTPServer(
+            ('127.0.0.1', 0), functools.partial(ImageSourceHandler, directory=str(cls.sources)),
+        )
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        shutil.rmtree(cls.sources)
+        super().tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+        self.variants = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.variants)
+        overridden = self.settings(IMAGE_VARIANTS_DIR=self.variants, IMAGE_VARIANTS={'thumbnail': [16, 16]})
+        overridden.enable()
+        self.addCleanup(overridden.disable)
+        ImageSourceHandler.requested.clear()
+        self.product = Product.objects.create(name='Camera', price='10.00', stock_quantity=1)
+
+    def source(self, name, color='red'):
+        buffer = io.BytesIO()
+        Image.new('RGB', (40, 20), color).save(buffer, format='PNG')
+        (self.sources / name).write_bytes(buffer.getvalue())
+        return f'http://127.0.0.1:{self.server.server_port}/{name}'
+
+    def image(self, url):
+        return ProductImage.objects.create(product=self.product, image_url=url)
+
+    def variant_ids(self, image):
+        return set(image.variants.values_list('id', flat=True))
+
+    def test_rebuilds_only_stale_images(self):
+        first = self.image(self.source('first.png'))
+        second = self.image(self.source('second.png'))
+        self.assertEqual(VariantBuilder().run(), {'built': 2, 'unchanged': 0, 'failed': 0})
+        self.assertEqual(
+            sorted(first.variants.values_list('variant', 'format', 'width', 'height')),
+            [('thumbnail', 'jpeg', 16, 8), ('thumbnail', 'webp', 16, 8)],
+        )
+        kept = self.variant_ids(second)
+
+        ImageSourceHandler.requested.clear()
+        self.assertEqual(VariantBuilder().run(), {'built': 0, 'unchanged': 2, 'failed': 0})
+        self.assertEqual(ImageSourceHandler.requested, [])
+
+        first.image_url = self.source('third.png', color='blue')
+        first.save()
+        self.assertEqual(VariantBuilder().run(), {'built': 1, 'unchanged': 1, 'failed': 0})
+        self.assertEqual(ImageSourceHandler.requested, ['/third.png'])
+        self.assertEqual(set(first.variants.values_list('source_url', flat=True)), {first.image_url})
+        self.assertEqual(self.variant_ids(second), kept)
+
+    def test_refresh_rebuilds_changed_sources_only(self):
+        first = self.image(self.source('first.png'))
+        self.image(self.source('second.png'))
+        VariantBuilder().run()
+        self.assertEqual(VariantBuilder(refresh=True).run(), {'built': 0, 'unchanged': 2, 'failed': 0})
+
+        old_paths = set(first.variants.values_list('path', flat=True))
+        self.source('first.png', color='green')
+        self.assertEqual(VariantBuilder(refresh=True).run(), {'built': 1, 'unchanged': 1, 'failed': 0})
+        self.assertTrue(set(first.variants.values_list('path', flat=True)).isdisjoint(old_paths))
+
+    def test_failed_images_are_retried_alone(self):
+        good = self.image(self.source('good.png'))
+        late = self.image(f'http://127.0.0.1:{self.server.server_port}/late.png')
+        Job.objects.all().delete()
+        job = enqueue('build_image_variants')
+        with self.assertLogs('core.image_variants', 'WARNING'):
+            self.assertFalse(run_job(claim_job('w1')))
+        # The image that worked keeps its variants for the retry
+        kept = self.variant_ids(good)
+        self.assertEqual(len(kept), 2)
+        self.assertFalse(late.variants.exists())
+
+        self.source('late.png')
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        ImageSourceHandler.requested.clear()
+        self.assertTrue(run_job(claim_job('w1')))
+        self.assertEqual(ImageSourceHandler.requested, ['/late.png'])
+        self.assertEqual(self.variant_ids(good), kept)
+        self.assertEqual(late.variants.count(), 2)
+
+    def test_sources_are_fetched_over_http_only(self):
+        with self.assertRaises(ValueError):
+            fetch_source((self.sources / 'first.png').as_uri())
+
+    def test_serves_variants_as_immutable(self):
+        image = self.image(self.source('first.png'))
+        VariantBuilder().run()
+        path = image.variants.get(format='webp').path
+        response = self.client.get(f'/api/images/{path}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(b''.join(response.streaming_content), (self.variants / path).read_bytes())
+
+    def test_only_variant_files_are_served(self):
+        (self.variants / 'notes.txt').write_text('secret')
+        missing = f'{"0" * 2}/{"0" * 64}.jpg'
+        for path in ['notes.txt', '../notes.txt', '..%2F..%2Fmanage.py', 'ab/../../manage.py', missing]:
+            with self.subTest(path=path):
+                self.assertEqual(self.client.get(f'/api/images/{path}').status_code, 404)
@@ -1,6 +1,12 @@
 from django.urls import path, include
 from .views_auth import csrf,login_view, logout_view, me_view 
 from .views_register import register_user
+from .views_batch import batch_view
+from .views_export import order_export
+from .views_analytics import sales_analytics
+from .views_imports import bulk_order_update, catalog_import
+from .views_events import order_events
+from .views_images import image_variant
 from rest_framework.routers import DefaultRouter
 from .views import (
     CategoryViewSet,ProductViewSet, ProductImageViewSet,checkout,
@@ -29,5 +35,12 @@ urlpatterns = [
     path('csrf/', csrf),
     path('register/', register_user),
     path('checkout/',checkout),
+    path('batch/', batch_view),
+    path('orders/export/', order_export),
+    path('orders/bulk-update/', bulk_order_update),
+    path('orders/events/', order_events),
+    path('products/import/', catalog_import),
+    path('analytics/sales/', sales_analytics),
+    path('images/<path:path>', image_variant),
     path('', include(router.urls)),
 ]
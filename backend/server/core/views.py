@@ -1,16 +1,30 @@
+import heapq
+
 from rest_framework.response import Response
-from rest_framework.decorators import api_view
+from rest_framework.decorators import action, api_view
+from django.conf import settings
 from django.db import transaction
+from django.utils.dateparse import parse_datetime
 from rest_framework import viewsets, filters
 from rest_framework import status
 from django_filters.rest_framework import DjangoFilterBackend
 from .models import (
     Category,Product, ProductImage, Address, User,City,
     ShoppingCart, CartItem, OrderStatus, Order, OrderItem,
-    PaymentStatus, Payment 
+    PaymentStatus, Payment, ArchivedOrder
 )
+from .catalog_changes import ChangesExpired, collect_changes, current_version
+from .fast_serializers import fast_serialize
+from .filters import UserSearchFilter
+from .hot_cache import hot_product_cache
+from .recommendations import related_product_index
+from .reference import order_status
+from .jobs import enqueue_many
+from .pagination import ProductKeysetPagination, UserCursorPagination
+from .query_cache import catalog_cache
+from .permissions import IsAdminRole
 from .serializers import (
-    CategorySerializer, ProductSerializer, ProductImageSerializer,
+    BrandSerializer, CategorySerializer, ProductSerializer, ProductImageSerializer,
     AddressSerializer, UserSerializer, ShoppingCartSerializer, CartItemSerializer,
     OrderStatusSerializer, OrderSerializer, OrderItemSerializer,
     PaymentStatusSerializer, PaymentSerializer,
@@ -18,20 +32,89 @@ from .serializers import (
     OrderItemDetailSerializer, OrderHistorySerializer
 )
 
-class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
+class SparseFieldsetViewMixin:
+    # Lets serializers using SparseFieldsetMixin trim the queryset to the
+    # fields requested through ?fields= / ?expand=
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        return self.get_serializer().optimize_queryset(queryset)
+
+
+class FastListViewMixin:
+    # Renders lists through core/fast_serializers.py (values() rows, nested
+    # data loaded per batch) when the serializer has a fast path, and through
+    # DRF otherwise. The output is the same either way.
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        rows = queryset if page is None else page
+        results = fast_serialize(rows, self.get_serializer())
+        if results is None:
+            data = self.get_serializer(rows, many=True).data
+        else:
+            data = [data for _, data in results]
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+
+class TaggedCacheViewMixin:
+    # Serves list/retrieve from catalog_cache (core/query_cache.py), keyed by
+    # path and query string and tagged with the models the response reads.
+    # Only 200 responses are cached.
+    cache_tags = ()
+
+    def get_cache_tags(self):
+        return set(self.cache_tags)
+
+    def cached_response(self, request, respond):
+        built = []
+
+        def build():
+            response = respond()
+            built.append(response)
+            if response.status_code != status.HTTP_200_OK:
+                return None
+            return response.data, dict(response.items())
+
+        key = f'{request.path}?{"&".join(sorted(request.GET.urlencode().split("&")))}'
+        cached = catalog_cache.get_or_build(key, self.get_cache_tags(), build)
+        if cached is None:
+            return built[-1]
+        data, headers = cached
+        return Response(data, headers=headers)
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, lambda: super(TaggedCacheViewMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(request, lambda: super(TaggedCacheViewMixin, self).retrieve(request, *args, **kwargs))
+
+
+class CategoryViewSet(TaggedCacheViewMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
+    cache_tags = ['category']
 
 class OrderItemViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = OrderItem.objects.all()
     serializer_class = OrderItemSerializer
 
-class ProductViewSet(viewsets.ReadOnlyModelViewSet):
+class ProductViewSet(TaggedCacheViewMixin, FastListViewMixin, SparseFieldsetViewMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
     filterset_fields = []
     search_fields = ['name']
+    pagination_class = ProductKeysetPagination
+    # ?ordering= values, each ends on the id so the keyset cursor is unique.
+    # Products have no creation date, ids are handed out in creation order.
+    orderings = {
+        'price': ('price', 'id'),
+        '-price': ('-price', '-id'),
+        'popularity': ('-units_sold', '-id'),
+        'newest': ('-id',),
+    }
     
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -39,20 +122,181 @@ class ProductViewSet(viewsets.ReadOnlyModelViewSet):
         # Product-category query
         category = self.request.query_params.get('category', None)
         if category:
-            # Use exact matching for category name
-            queryset = queryset.filter(category__name=category)
+            # Use exact matching for category name. The ids are looked up
+            # first so sorted lists can use the (category_id, ...) indexes.
+            category_ids = list(Category.objects.filter(name=category).values_list('id', flat=True))
+            queryset = queryset.filter(category_id__in=category_ids)
         
         # Product-id query
         id = self.request.query_params.get('id', None)
         if id:
             queryset = queryset.filter(id=id)
 
+        ordering = self.request.query_params.get('ordering', None)
+        if ordering in self.orderings:
+            queryset = queryset.order_by(*self.orderings[ordering])
+
         return queryset
 
+    def list(self, request, *args, **kwargs):
+        ordering = request.query_params.get('ordering', None)
+        if ordering is not None and ordering not in self.orderings:
+            return Response(
+                {'message': f'ordering must be one of {", ".join(self.orderings)}.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Batch lookup: /api/products/?ids=3,1,2
+        ids = request.query_params.get('ids', None)
+        if ids is None:
+            # The version is cached together with the list it was read for
+            return super().list(request, *args, **kwargs)
+
+        try:
+            product_ids = [int(part) for part in ids.split(',') if part.strip()]
+        except ValueError:
+            return Response(
+                {'message': 'ids must be a comma separated list of integers.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        max_ids = getattr(settings, 'PRODUCT_BATCH_MAX_IDS', 100)
+        if len(product_ids) > max_ids:
+            return Response(
+                {'message': f'At most {max_ids} ids can be requested at once.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response(self.get_products_by_ids(product_ids))
+
+    def cached_response(self, request, respond):
+        def respond_with_version():
+            # Read the version first: a change made while the list is built
+            # is then sent again by /changes/ rather than missed
+            version = current_version()
+            response = respond()
+            response['X-Catalog-Version'] = str(version)
+            return response
+        return super().cached_response(request, respond_with_version)
+
+    def get_cache_tags(self):
+        fields = self.get_serializer().fields
+        tags = {'product'}
+        if isinstance(fields.get('brand'), BrandSerializer):
+            tags.add('brand')
+        if isinstance(fields.get('category'), CategorySerializer) or 'category' in self.request.query_params:
+            tags.add('category')
+        if 'images' in fields:
+            tags.add('product_image')
+        if self.request.query_params.get('ordering') == 'popularity':
+            tags.add('popularity')
+        return tags
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            product_id = int(kwargs['pk'])
+        except ValueError:
+            return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+        products = self.get_products_by_ids([product_id])
+        if not products:
+            return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(products[0])
+
+    # Delta sync: /api/products/changes/?since=<X-Catalog-Version or last version>
+    @action(detail=False, url_path='changes')
+    def changes(self, request):
+        try:
+            since = int(request.query_params.get('since', 0))
+            limit = min(int(request.query_params.get('limit', 1000)), 5000)
+        except ValueError:
+            return Response(
+                {'message': 'since and limit must be integers.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            delta = collect_changes(since, max(limit, 1))
+        except ChangesExpired:
+            return Response(
+                {'message': 'This version is no longer in the change log, reload the full catalog.',
+                 'version': current_version()},
+                status=status.HTTP_410_GONE
+            )
 
-class ProductImageViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = ProductImage.objects.all()
+        return Response({
+            'version': delta['version'],
+            'has_more': delta['has_more'],
+            'upserted': self.get_products_by_ids(sorted(delta['changed']['product']), use_cache=False),
+            'deleted': sorted(delta['deleted']['product']),
+            'categories': {
+                'upserted': CategorySerializer(delta['categories'], many=True).data,
+                'deleted': sorted(delta['deleted']['category']),
+            },
+            'brands': {
+                'upserted': BrandSerializer(delta['brands'], many=True).data,
+                'deleted': sorted(delta['deleted']['brand']),
+            },
+        })
+
+    # "Frequently bought together": /api/products/<id>/related/?limit=10
+    @action(detail=True, url_path='related')
+    def related(self, request, pk=None):
+        try:
+            product_id = int(pk)
+            limit = min(int(request.query_params.get('limit', 10)), 50)
+        except ValueError:
+            return Response(
+                {'message': 'Product id and limit must be integers.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        related_ids = related_product_index.related(product_id, limit=max(limit, 1))
+        return Response(self.get_products_by_ids(related_ids))
+
+    def get_products_by_ids(self, product_ids, use_cache=True):
+        # Serves from the hot-product cache and resolves the misses with a
+        # single primary-key IN query. Results keep the requested order and
+        # unknown ids are left out.
+        product_ids = list(dict.fromkeys(product_ids))
+        params = self.request.query_params
+        variant = (params.get('fields'), params.get('expand'))
+        if use_cache:
+            # The hot cache is per process. Keying it on the shared tag
+            # versions makes a change saved in another worker visible here
+            # right away instead of after the TTL.
+            try:
+                variant += tuple(catalog_cache.tag_versions(self.get_cache_tags()))
+            except Exception:
+                use_cache = False
+
+        found = {}
+        missing = []
+        for product_id in product_ids:
+            data = hot_product_cache.get((product_id,) + variant) if use_cache else None
+            if data is None:
+                missing.append(product_id)
+            else:
+                found[product_id] = data
+
+        if missing:
+            queryset = Product.objects.filter(pk__in=missing)
+            serializer = self.get_serializer()
+            results = fast_serialize(queryset, serializer)
+            if results is None:
+                products = list(serializer.optimize_queryset(queryset))
+                results = zip([product.pk for product in products], self.get_serializer(products, many=True).data)
+            for product_id, data in results:
+                found[product_id] = data
+                if use_cache:
+                    hot_product_cache.set((product_id,) + variant, data)
+
+        return [found[product_id] for product_id in product_ids if product_id in found]
+
+
+class ProductImageViewSet(TaggedCacheViewMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = ProductImage.objects.prefetch_related('variants')
     serializer_class = ProductImageSerializer
+    cache_tags = ['product_image']
 
 
 class AddressViewSet(viewsets.ReadOnlyModelViewSet):
@@ -60,9 +304,13 @@ class AddressViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = AddressSerializer
 
 
-class UserViewSet(viewsets.ReadOnlyModelViewSet):
+class UserViewSet(SparseFieldsetViewMixin, viewsets.ReadOnlyModelViewSet):
+    # Back office: /api/users/?search=ola&page_size=50, next page via ?cursor=
     queryset = User.objects.all()
     serializer_class = UserSerializer
+    permission_classes = [IsAdminRole]
+    pagination_class = UserCursorPagination
+    filter_backends = [UserSearchFilter]
 
 
 class ShoppingCartViewSet(viewsets.ReadOnlyModelViewSet):
@@ -151,8 +399,9 @@ def checkout(request):
 
         # 4. Get order status from your predefined DB values
         try:
-            default_status = OrderStatus.objects.get(status_name='PROCESSING')
+            default_status = order_status('PROCESSING')
         except OrderStatus.DoesNotExist:
+            transaction.set_rollback(True)
             return Response(
                 {'message': 'Order status "PROCESSING" not found in the database.'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -166,22 +415,44 @@ def checkout(request):
             shipping_address=address
         )
 
-        # 6. Create order items
-        for item in data['items']:
-            try:
-                product = Product.objects.get(pk=item['productId'])
-            except Product.DoesNotExist:
+        # 6. Create order items (one query for all products, one insert).
+        # Nothing is kept when an item is rejected.
+        try:
+            product_ids = [int(item['productId']) for item in data['items']]
+        except (TypeError, ValueError):
+            transaction.set_rollback(True)
+            return Response(
+                {'message': 'productId must be an integer.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        products = Product.objects.in_bulk(product_ids)
+        order_items = []
+        for item, product_id in zip(data['items'], product_ids):
+            product = products.get(product_id)
+            if product is None:
+                transaction.set_rollback(True)
                 return Response(
                     {'message': f'Product with ID {item["productId"]} not found.'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-            OrderItem.objects.create(
+            order_items.append(OrderItem(
                 order=order,
                 product=product,
                 quantity=item['quantity'],
                 price_per_unit=item['pricePerUnit']
-            )
+            ))
+        OrderItem.objects.bulk_create(order_items)
+
+        # 7. Queue the follow-up work, run by `python manage.py run_jobs`
+        enqueue_many([
+            ('create_payment', {'order_id': order.id, 'payment_method': data.get('paymentMethod', 'card')}),
+            ('assign_tracking_number', {'order_id': order.id}),
+            ('update_sales_rollups', {'order_id': order.id}),
+            ('record_order_pairs', {'order_id': order.id}),
+            ('update_popularity', {'order_id': order.id}),
+            ('send_order_confirmation', {'order_id': order.id}),
+        ])
 
         # ✅ Success response
         return Response(
@@ -190,13 +461,14 @@ def checkout(request):
         )
 
     except Exception as e:
+        transaction.set_rollback(True)
         return Response(
             {'message': f'Internal server error: {str(e)}'},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
 
-class OrderViewSet(viewsets.ReadOnlyModelViewSet):
+class OrderViewSet(FastListViewMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
@@ -222,6 +494,34 @@ class OrderViewSet(viewsets.ReadOnlyModelViewSet):
             return OrderHistorySerializer
         return OrderSerializer
 
+    def list(self, request, *args, **kwargs):
+        # Order history reads the hot order table: the last
+        # ORDER_ARCHIVE_AFTER_DAYS days plus older orders that aren't
+        # finished yet. The archive (core/archive.py) is only read with
+        # ?archive=1, both are then merged newest first.
+        if self.get_serializer_class() is not OrderHistorySerializer:
+            return super().list(request, *args, **kwargs)
+
+        hot = self.serialize_orders(self.filter_queryset(self.get_queryset()))
+        if not request.query_params.get('archive'):
+            return Response(hot)
+
+        archived = ArchivedOrder.objects.order_by('-order_date')
+        user_id = request.query_params.get('userid', None)
+        if user_id:
+            archived = archived.filter(user_id=user_id)
+        archived = self.filter_queryset(archived)
+        return Response(list(heapq.merge(
+            hot, self.serialize_orders(archived), key=lambda data: parse_datetime(data['order_date']), reverse=True,
+        )))
+
+    def serialize_orders(self, queryset):
+        serializer = self.get_serializer()
+        results = fast_serialize(queryset, serializer)
+        if results is None:
+            return self.get_serializer(queryset, many=True).data
+        return [data for _, data in results]
+
 
 class PaymentStatusViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = PaymentStatus.objects.all()
@@ -0,0 +1,83 @@
+from django.db.models import Sum
+from django.utils.dateparse import parse_date
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.response import Response
+
+from .models import Brand, Category, SalesRollup
+from .permissions import IsAdminRole
+
+GROUP_BY_COLUMNS = {
+    'day': 'day',
+    'category': 'category_id',
+    'brand': 'brand_id',
+}
+
+
+def _category_with_descendants(category_id):
+    children = {}
+    for pk, parent_id in Category.objects.values_list('id', 'parent_id'):
+        children.setdefault(parent_id, []).append(pk)
+    found = [category_id]
+    pending = [category_id]
+    while pending:
+        for child in children.get(pending.pop(), []):
+            found.append(child)
+            pending.append(child)
+    return found
+
+
+# Sales figures answered from the sales_rollup table:
+# /api/analytics/sales/?from=2025-01-01&to=2025-01-31&group_by=day,category&category=1
+# "orders" counts an order once per day x category x brand cell it has lines in.
+@api_view(['GET'])
+@permission_classes([IsAdminRole])
+def sales_analytics(request):
+    params = request.query_params
+    rollups = SalesRollup.objects.all()
+
+    for name, lookup in (('from', 'day__gte'), ('to', 'day__lte')):
+        value = params.get(name)
+        if value:
+            day = parse_date(value)
+            if day is None:
+                return Response({'message': f'"{name}" must be a date (YYYY-MM-DD).'}, status=status.HTTP_400_BAD_REQUEST)
+            rollups = rollups.filter(**{lookup: day})
+
+    try:
+        category = params.get('category')
+        if category:
+            rollups = rollups.filter(category_id__in=_category_with_descendants(int(category)))
+        brand = params.get('brand')
+        if brand:
+            rollups = rollups.filter(brand_id=int(brand))
+    except ValueError:
+        return Response({'message': 'category and brand must be ids.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    group_by = [name for name in params.get('group_by', '').split(',') if name]
+    unknown = [name for name in group_by if name not in GROUP_BY_COLUMNS]
+    if unknown:
+        return Response(
+            {'message': f'Unknown group_by: {", ".join(unknown)}. Use {", ".join(GROUP_BY_COLUMNS)}.'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    columns = [GROUP_BY_COLUMNS[name] for name in group_by]
+
+    totals = {'revenue': Sum('revenue'), 'units': Sum('units'), 'orders': Sum('order_count')}
+    if columns:
+        rows = list(rollups.values(*columns).annotate(**totals).order_by(*columns))
+    else:
+        rows = [rollups.aggregate(**totals)]
+
+    category_names = dict(Category.objects.values_list('id', 'name')) if 'category' in group_by else {}
+    brand_names = dict(Brand.objects.values_list('id', 'name')) if 'brand' in group_by else {}
+    for row in rows:
+        row['revenue'] = str(row['revenue'] or 0)
+        row['units'] = row['units'] or 0
+        row['orders'] = row['orders'] or 0
+        if 'category_id' in row:
+            row['category_name'] = category_names.get(row['category_id'])
+        if 'brand_id' in row:
+            row['brand_name'] = brand_names.get(row['brand_id'])
+
+    return Response(rows)
@@ -1,7 +1,7 @@
-from django.contrib.auth.hashers import check_password
 from django.http import JsonResponse
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
+from core.hashing import HashingOverloaded, password_hashing
 from core.models import User
 from core.serializers import UserSerializer
 from django.views.decorators.csrf import csrf_exempt, ensure_csrf_cookie
@@ -12,6 +12,12 @@ from django.views.decorators.csrf import csrf_protect
 def csrf(request):
     return JsonResponse({"detail": "CSRF cookie set"})
 
+# Returned when the password hashing queue is full
+def overloaded_response():
+    response = JsonResponse({'error': 'Too many login attempts right now, try again shortly'}, status=503)
+    response['Retry-After'] = '1'
+    return response
+
 # Login should remain csrf_exempt (token manually passed in header)
 @csrf_exempt
 @api_view(['POST'])
@@ -25,7 +31,12 @@ def login_view(request):
     except User.DoesNotExist:
         return JsonResponse({'error': 'Invalid credentials'}, status=401)
 
-    if not check_password(password, user.password):
+    try:
+        is_correct = password_hashing.check_user_password(user, password)
+    except HashingOverloaded:
+        return overloaded_response()
+
+    if not is_correct:
         return JsonResponse({'error': 'Invalid credentials'}, status=401)
 
     request.session['user_id'] = user.id
@@ -40,9 +51,6 @@ def logout_view(request):
 
 @api_view(['GET'])
 def me_view(request):
-    print("Session ID:", request.session.session_key)
-    print("User from middleware:", request.user)
-
     user = request.user
     if not user or not user.is_authenticated:
         return JsonResponse({'error': 'Not authenticated'}, status=401)
@@ -0,0 +1,122 @@
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpRequest, HttpResponse, JsonResponse, QueryDict
+from django.urls import Resolver404, resolve
+from django.views.decorators.csrf import ensure_csrf_cookie
+
+from .views_auth import csrf
+
+logger = logging.getLogger(__name__)
+
+# Plain Django views that answer GET with a JSON body. DRF views are allowed
+# when they handle GET; streaming and async views (export, order events)
+# can't be batched.
+PLAIN_JSON_VIEWS = {csrf}
+
+
+def _build_subrequest(request, path, query_string):
+    # The sub-request reuses the session and user that the middleware
+    # already resolved for the outer request instead of decoding them again.
+    sub = HttpRequest()
+    sub.method = 'GET'
+    sub.path = sub.path_info = path
+    sub.META = request.META.copy()
+    sub.META['REQUEST_METHOD'] = 'GET'
+    sub.META['PATH_INFO'] = path
+    sub.META['QUERY_STRING'] = query_string
+    # DRF views would otherwise pick the browsable API for browsers
+    sub.META['HTTP_ACCEPT'] = 'application/json'
+    sub.META.pop('CONTENT_LENGTH', None)
+    sub.META.pop('CONTENT_TYPE', None)
+    sub.GET = QueryDict(query_string)
+    sub.COOKIES = request.COOKIES
+    sub.session = request.session
+    sub.user = request.user
+    return sub
+
+
+def _is_batchable(view):
+    if view in PLAIN_JSON_VIEWS:
+        return True
+    cls = getattr(view, 'cls', None)
+    if cls is None:
+        return False
+    # Viewsets list the actions of the route, @api_view / APIView classes
+    # have a get() handler when they allow GET
+    actions = getattr(view, 'actions', None)
+    if actions is not None:
+        return 'get' in actions
+    return hasattr(cls, 'get')
+
+
+def _entry(target, status, body):
+    # The body is embedded as the view rendered it, so a batched response
+    # is the same JSON the endpoint sends when called on its own
+    return b'{"path": %s, "status": %d, "body": %s}' % (json.dumps(target).encode(), status, body)
+
+
+def _error_entry(target, status, detail):
+    return _entry(target, status, json.dumps({'detail': detail}).encode())
+
+
+def _run_subrequest(request, target):
+    parts = urlsplit(target)
+    path = parts.path
+    if not path.startswith('/api/') or path.rstrip('/') == '/api/batch':
+        return _error_entry(target, 400, 'Path is not allowed in a batch.')
+
+    try:
+        match = resolve(path)
+    except Resolver404:
+        return _error_entry(target, 404, 'Not found.')
+    if not _is_batchable(match.func):
+        return _error_entry(target, 400, 'Path is not allowed in a batch.')
+
+    # A failing sub-request only fails its own entry
+    sub = _build_subrequest(request, path, parts.query)
+    try:
+        response = match.func(sub, *match.args, **match.kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+    except Exception:
+        logger.exception('Batched request %s failed', target)
+        return _error_entry(target, 500, 'Internal server error.')
+    return _entry(target, response.status_code, response.content or b'null')
+
+
+def _run_subrequest_in_thread(request, target):
+    try:
+        return _run_subrequest(request, target)
+    finally:
+        # Worker threads get their own connection, don't leave it open
+        connections.close_all()
+
+
+# Runs several read-only GET requests in one round trip:
+# /api/batch/?path=/api/categories/&path=/api/products/%3Fcategory%3DLaptops
+@ensure_csrf_cookie
+def batch_view(request):
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Only GET method is allowed'}, status=405)
+
+    targets = request.GET.getlist('path')
+    if not targets:
+        return JsonResponse({'error': 'At least one path is required'}, status=400)
+
+    max_requests = getattr(settings, 'API_BATCH_MAX_REQUESTS', 10)
+    if len(targets) > max_requests:
+        return JsonResponse({'error': f'At most {max_requests} paths can be batched'}, status=400)
+
+    max_workers = getattr(settings, 'API_BATCH_MAX_WORKERS', 1)
+    if max_workers > 1 and len(targets) > 1:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(targets))) as pool:
+            results = list(pool.map(lambda target: _run_subrequest_in_thread(request, target), targets))
+    else:
+        results = [_run_subrequest(request, target) for target in targets]
+
+    return HttpResponse(b'{"responses": [%s]}' % b', '.join(results), content_type='application/json')
@@ -0,0 +1,59 @@
+import asyncio
+import json
+
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+
+from .order_events import events_for_user, order_event_broker
+
+
+def _format_event(event):
+    return f'id: {event["id"]}\nevent: order\ndata: {json.dumps(event)}\n\n'
+
+
+async def _event_stream(user_id, last_event_id):
+    heartbeat = getattr(settings, 'ORDER_EVENTS_HEARTBEAT', 25)
+    queue = order_event_broker.subscribe(user_id)
+    try:
+        yield 'retry: 5000\n\n'
+        # Live events can arrive out of id order, so only events sent by
+        # the replay are skipped
+        replayed = set()
+        if last_event_id is not None:
+            for event in await events_for_user(user_id, last_event_id):
+                replayed.add(event['id'])
+                yield _format_event(event)
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                yield ': keep-alive\n\n'
+                continue
+            if event['id'] in replayed:
+                continue
+            yield _format_event(event)
+    finally:
+        order_event_broker.unsubscribe(user_id, queue)
+
+
+# Server-Sent Events with the logged in user's order status and tracking
+# number changes. Needs an ASGI server, e.g. `uvicorn server.asgi:application`.
+async def order_events(request):
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Only GET method is allowed'}, status=405)
+
+    user = request.user
+    if not user or not user.is_authenticated:
+        return JsonResponse({'error': 'Not authenticated'}, status=401)
+
+    last_event_id = request.headers.get('Last-Event-ID')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+
+    response = StreamingHttpResponse(_event_stream(user.id, last_event_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stops nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,40 @@
+from django.http import JsonResponse, StreamingHttpResponse
+
+from .exports import EXPORT_FORMATS, ExportFilterError, iter_export, parse_export_filters
+from .permissions import admin_error_response
+
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+# Streams order lines joined with order, payment and address:
+# /api/orders/export/?format=csv&from=2025-01-01&to=2025-01-31&status=DELIVERED
+def order_export(request):
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Only GET method is allowed'}, status=405)
+
+    denied = admin_error_response(request)
+    if denied:
+        return denied
+
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return JsonResponse({'error': f'format must be one of: {", ".join(EXPORT_FORMATS)}'}, status=400)
+
+    try:
+        filters = parse_export_filters(
+            date_from=request.GET.get('from'),
+            date_to=request.GET.get('to'),
+            status=request.GET.get('status'),
+        )
+    except ExportFilterError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    response = StreamingHttpResponse(
+        iter_export(export_format, filters),
+        content_type=CONTENT_TYPES[export_format],
+    )
+    response['Content-Disposition'] = f'attachment; filename="orders.{export_format}"'
+    return response
@@ -0,0 +1,29 @@
+import re
+
+from django.http import FileResponse, JsonResponse
+
+from .image_variants import variants_dir
+
+CONTENT_TYPES = {
+    'jpg': 'image/jpeg',
+    'webp': 'image/webp',
+}
+
+VARIANT_PATH = re.compile(r'^[0-9a-f]{2}/[0-9a-f]{64}\.(jpg|webp)$')
+
+
+# Resized product images: /api/images/<path> from the variants of
+# ProductImageSerializer. A path is the hash of the file's content, so the
+# file behind it never changes and can be cached for good.
+def image_variant(request, path):
+    if request.method not in ('GET', 'HEAD'):
+        return JsonResponse({'error': 'Only GET method is allowed'}, status=405)
+
+    match = VARIANT_PATH.match(path)
+    file_path = variants_dir() / path
+    if match is None or not file_path.is_file():
+        return JsonResponse({'error': 'Image not found'}, status=404)
+
+    response = FileResponse(open(file_path, 'rb'), content_type=CONTENT_TYPES[match.group(1)])
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
@@ -0,0 +1,48 @@
+import codecs
+
+from django.http import JsonResponse
+
+from .catalog_import import CatalogImport
+from .feeds import IMPORT_FORMATS, iter_records
+from .order_updates import OrderUpdateImport
+from .permissions import admin_error_response
+
+
+def _run_feed_import(request, importer_class):
+    # The feed is either the raw request body or a multipart upload named
+    # "file". Both are read line by line, so the feed never sits in memory.
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Only POST method is allowed'}, status=405)
+
+    denied = admin_error_response(request)
+    if denied:
+        return denied
+
+    upload = request.FILES.get('file')
+    if upload is not None:
+        source = upload
+        default_format = 'ndjson' if upload.name.endswith(('.ndjson', '.jsonl')) else 'csv'
+    else:
+        source = request
+        default_format = 'ndjson' if 'ndjson' in request.content_type else 'csv'
+
+    import_format = request.GET.get('format', default_format)
+    if import_format not in IMPORT_FORMATS:
+        return JsonResponse({'error': f'format must be one of: {", ".join(IMPORT_FORMATS)}'}, status=400)
+
+    # utf-8-sig drops the byte order mark spreadsheet programs put in front
+    lines = codecs.iterdecode(source, 'utf-8-sig')
+    summary = importer_class().run(iter_records(lines, import_format))
+    return JsonResponse(summary)
+
+
+# Bulk status / tracking number updates, rows of order_id,status,tracking_number:
+# curl -X POST --data-binary @updates.csv -H 'Content-Type: text/csv' /api/orders/bulk-update/
+def bulk_order_update(request):
+    return _run_feed_import(request, OrderUpdateImport)
+
+
+# Product feed upsert, see CatalogImport for the columns:
+# curl -X POST --data-binary @catalog.ndjson -H 'Content-Type: application/x-ndjson' /api/products/import/
+def catalog_import(request):
+    return _run_feed_import(request, CatalogImport)
@@ -1,9 +1,14 @@
+import json
+import logging
+
 from django.views.decorators.csrf import csrf_exempt
 from django.http import JsonResponse
-import json
 from .models import User, Address, City
 from django.db import transaction
-from django.contrib.auth.hashers import make_password
+from .hashing import HashingOverloaded, password_hashing
+from .views_auth import overloaded_response
+
+logger = logging.getLogger(__name__)
 
 
 @csrf_exempt
@@ -14,40 +19,45 @@ def register_user(request):
     try:
         data = json.loads(request.body)
 
+        # Hash before any write and outside the transaction, hashing is slow
+        # on purpose and a full queue must not leave a half-made account
+        try:
+            password = password_hashing.hash(data['password'])
+        except HashingOverloaded:
+            return overloaded_response()
+
         # Normalize and get/create city
         city_name = data['address']['city'].strip().title()
         postal_code = data['address']['postalCode'].strip()
         country = data['address']['country'].strip().title()
 
-        city, _ = City.objects.get_or_create(
-            city_name=city_name,
-            postal_code=postal_code,
-            country=country
-        )
-
-        print(f"Using city ID: {city.id} ({city.city_name})")
+        with transaction.atomic():
+            city, _ = City.objects.get_or_create(
+                city_name=city_name,
+                postal_code=postal_code,
+                country=country
+            )
 
-        # Create address
-        address = Address.objects.create(
-            address_line=data['address']['line'].strip(),
-            city=city
-        )
+            # Create address
+            address = Address.objects.create(
+                address_line=data['address']['line'].strip(),
+                city=city
+            )
 
-        # Create user
-        with transaction.atomic():
+            # Create user
             user = User.objects.create(
                 username=data['username'],
                 first_name=data['firstName'].strip(),
                 last_name=data['lastName'].strip(),
                 email=data['email'].strip().lower(),
                 phone=data['phone'].strip(),
-                password=make_password(data['password']),
+                password=password,
                 address=address
             )
 
         return JsonResponse({'message': 'User registered successfully'}, status=201)
 
     except Exception as e:
-        print("Registration error:", e)
+        logger.warning('Registration failed', exc_info=True)
         return JsonResponse({'error': str(e)}, status=400)
 
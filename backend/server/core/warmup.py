@@ -0,0 +1,65 @@
+import time
+
+from django.db import connection
+from django.test import Client
+from django.urls import get_resolver, resolve
+
+from .reference import load_reference_data
+from .serializers import OrderHistorySerializer
+
+
+def warm_up_code():
+    # Everything a cold worker would otherwise build during its first
+    # requests that doesn't need the database: URL resolvers, serializer
+    # field maps and filter backends. Safe to run before forking.
+    from .urls import router
+
+    timings = {}
+    started = time.perf_counter()
+    get_resolver().url_patterns
+    for prefix, viewset, basename in router.registry:
+        resolve(f'/api/{prefix}/')
+    timings['urls'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    serializer_classes = {viewset.serializer_class for _, viewset, _ in router.registry}
+    serializer_classes.add(OrderHistorySerializer)
+    for serializer_class in serializer_classes:
+        serializer_class().fields
+    for _, viewset, _ in router.registry:
+        for backend in getattr(viewset, 'filter_backends', []):
+            backend()
+    timings['serializers'] = time.perf_counter() - started
+    return timings
+
+
+def warm_up_database():
+    # Per process work: check that the database is reachable, load the
+    # reference caches and push one cheap request through the middleware and
+    # DRF stack. Run it after forking. The connection opened here belongs to
+    # the startup thread, request threads never reuse it, so it is closed
+    # again at the end.
+    from .recommendations import related_product_index
+
+    timings = {}
+    started = time.perf_counter()
+    connection.ensure_connection()
+    timings['database'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    load_reference_data()
+    related_product_index.load()
+    timings['reference_data'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    Client(SERVER_NAME='localhost').get('/api/order-statuses/')
+    timings['request'] = time.perf_counter() - started
+    connection.close()
+    return timings
+
+
+def warm_up(database=True):
+    timings = warm_up_code()
+    if database:
+        timings.update(warm_up_database())
+    return timings
@@ -0,0 +1,21 @@
+# gunicorn -c gunicorn.conf.py server.asgi:application
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '127.0.0.1:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+# ASGI workers, needed for the order event stream. Database connections are
+# not kept between requests under ASGI (CONN_MAX_AGE stays 0).
+worker_class = 'uvicorn.workers.UvicornWorker'
+
+# Import Django, resolve URLs and build serializers once in the master, the
+# workers inherit all of it when they are forked
+preload_app = True
+os.environ.setdefault('DJANGO_WARMUP', 'code')
+
+
+def post_fork(server, worker):
+    # Runs in the new worker before it accepts connections
+    from core.warmup import warm_up_database
+    timings = warm_up_database()
+    server.log.info('Worker %s warmed up: %s', worker.pid, {name: round(seconds * 1000, 1) for name, seconds in timings.items()})
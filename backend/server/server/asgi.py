@@ -14,3 +14,9 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'server.settings')
 
 application = get_asgi_application()
+
+# DJANGO_WARMUP=full warms the worker up before it serves traffic, "code"
+# skips the database part (used by gunicorn.conf.py before forking)
+if os.environ.get('DJANGO_WARMUP') in ('code', 'full'):
+    from core.warmup import warm_up
+    warm_up(database=os.environ['DJANGO_WARMUP'] == 'full')
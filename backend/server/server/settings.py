@@ -11,7 +11,6 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
-import MySQLdb
 import os
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -52,6 +51,70 @@ REST_FRAMEWORK = {
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
 }
 
+# Batch product lookup (/api/products/?ids=1,2,3)
+PRODUCT_BATCH_MAX_IDS = 100
+HOT_PRODUCT_CACHE_SIZE = 256
+HOT_PRODUCT_CACHE_TTL = 30
+
+# Catalog read cache (core/query_cache.py): a per-process LRU in front of the
+# shared Django cache. Set REDIS_URL so all workers share entries and
+# invalidations, the memory cache fallback only suits a single process.
+if os.environ.get('REDIS_URL'):
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': os.environ['REDIS_URL']}}
+else:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+CATALOG_CACHE_ALIAS = 'default'
+CATALOG_CACHE_LOCAL_SIZE = 512
+CATALOG_CACHE_TTL = 300
+# How long other workers wait for the one rebuilding an expired entry
+CATALOG_CACHE_LOCK_TIMEOUT = 10
+
+# Batch endpoint (/api/batch/?path=...&path=...)
+API_BATCH_MAX_REQUESTS = 10
+API_BATCH_MAX_WORKERS = 1
+
+# Orders in these statuses are left out of the sales rollups
+SALES_ROLLUP_EXCLUDED_STATUSES = ['CANCELLED']
+
+# Background jobs (python manage.py run_jobs)
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_BASE_DELAY = 2
+JOB_MAX_RETRY_DELAY = 600
+# Seconds before a job left running by a dead worker is picked up again
+JOB_LOCK_TIMEOUT = 300
+
+# Order confirmation emails are written to files instead of being sent
+EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+EMAIL_FILE_PATH = BASE_DIR / 'sent_emails'
+DEFAULT_FROM_EMAIL = 'orders@electromart.local'
+
+# Order event stream (/api/orders/events/), seconds
+ORDER_EVENTS_POLL_INTERVAL = 1.0
+ORDER_EVENTS_HEARTBEAT = 25
+# Seconds a gap in the event ids is treated as an event still being committed
+ORDER_EVENTS_SETTLE_SECONDS = 30
+
+# "Frequently bought together" index, built by `python manage.py build_recommendations`
+RECOMMENDATIONS_DIR = BASE_DIR / 'recommendations'
+RECOMMENDATIONS_TOP_K = 20
+# Seconds between checks for a new build
+RECOMMENDATIONS_RELOAD_INTERVAL = 60
+
+# Resized product images (python manage.py build_image_variants), served from
+# IMAGE_VARIANTS_URL; the web server can serve IMAGE_VARIANTS_DIR there instead
+IMAGE_VARIANTS_DIR = BASE_DIR / 'image_variants'
+IMAGE_VARIANTS_URL = '/api/images/'
+# Variant name -> bounding box in pixels, each is made in every format
+IMAGE_VARIANTS = {
+    'thumbnail': [160, 160],
+    'card': [480, 480],
+    'detail': [1200, 1200],
+}
+IMAGE_VARIANT_FORMATS = ['jpeg', 'webp']
+IMAGE_VARIANT_QUALITY = 82
+IMAGE_SOURCE_TIMEOUT = 10
+IMAGE_SOURCE_MAX_BYTES = 20 * 1024 * 1024
+
 SESSION_COOKIE_SAMESITE = "None"
 SESSION_COOKIE_SECURE = True
 CSRF_COOKIE_SAMESITE = "None"
@@ -61,6 +124,11 @@ CORS_ALLOW_CREDENTIALS = True
 CORS_ALLOWED_ORIGINS = [
    'http://localhost:5173',
 ]
+# Lets the frontend read the catalog version for /api/products/changes/
+CORS_EXPOSE_HEADERS = ['X-Catalog-Version']
+# Seconds a gap in the catalog change log is treated as a change that is
+# still being committed (see core/change_log.py)
+CATALOG_CHANGES_SETTLE_SECONDS = 30
 
 
 CSRF_TRUSTED_ORIGINS = [
@@ -70,6 +138,7 @@ CSRF_TRUSTED_ORIGINS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
+    'core.middleware.AdmissionControlMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -82,6 +151,29 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Order archive (python manage.py archive_orders): orders in one of these
+# statuses and older than this many days move to the archive tables
+ORDER_ARCHIVE_AFTER_DAYS = 365
+ORDER_ARCHIVE_STATUSES = ['DELIVERED', 'CANCELLED']
+
+# Admission control (core/admission.py), limits are per worker process.
+# Requests wait at most max_wait seconds for a slot and get 503 with
+# Retry-After when the queue is full or the expected wait is longer.
+# Freed slots go to the lowest priority number first. A request belongs to
+# the first class with a matching path prefix.
+ADMISSION_CONTROL = {
+    'checkout': {'paths': ['/api/checkout/'], 'max_concurrent': 8, 'max_queue': 50, 'max_wait': 5.0, 'priority': 0},
+    'auth': {'paths': ['/api/login/', '/api/register/'], 'max_concurrent': 4, 'max_queue': 20, 'max_wait': 2.0, 'priority': 1},
+    # Before catalog so long imports don't skew its service time, one at a time
+    'import': {'paths': ['/api/products/import/'], 'max_concurrent': 1, 'max_queue': 0, 'max_wait': 0.0, 'priority': 3},
+    'catalog': {
+        'paths': ['/api/products/', '/api/categories/', '/api/batch/'],
+        'max_concurrent': 16, 'max_queue': 100, 'max_wait': 1.0, 'priority': 2,
+    },
+}
+# All admitted requests together, keep it within the MySQL connections a worker may use
+ADMISSION_MAX_CONCURRENT = 20
+
 ROOT_URLCONF = 'server.urls'
 
 TEMPLATES = [
@@ -110,12 +202,32 @@ DATABASES = {
         'ENGINE': 'django.db.backends.mysql',
         'OPTIONS': {
             'read_default_file': os.path.join(BASE_DIR, 'my.cnf')
-        }
+        },
+        # Persistent connections only work under WSGI. The app is served
+        # with ASGI (gunicorn.conf.py), where every sync_to_async thread
+        # would keep its own connection open, so leave this at 0 there.
+        'CONN_MAX_AGE': int(os.environ.get('DJANGO_CONN_MAX_AGE', 0)),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
 
 
+# Password hashing
+# PBKDF2 work factor, stored hashes with another value are upgraded on login
+PASSWORD_PBKDF2_ITERATIONS = 1_000_000
+PASSWORD_HASHERS = [
+    'core.hashers.TunablePBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+# Processes used for hashing (0 hashes on the request thread)
+PASSWORD_HASHING_WORKERS = 2
+# Hashes allowed to be queued or running before logins get a 503
+PASSWORD_HASHING_MAX_PENDING = 32
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -21,6 +21,7 @@ CREATE TABLE product (
     brand_id INT,
     category_id INT,
     is_active BOOLEAN DEFAULT TRUE,
+    units_sold INT NOT NULL DEFAULT 0, /* ordered quantity, kept up to date by core/popularity.py */
     FOREIGN KEY (brand_id) REFERENCES brand(brand_id) ON DELETE CASCADE,
     FOREIGN KEY (category_id) REFERENCES category(category_id) ON DELETE CASCADE
 );
@@ -118,3 +119,197 @@ CREATE TABLE payment (
     FOREIGN KEY (order_id) REFERENCES `order` (order_id) ON DELETE CASCADE,
     FOREIGN KEY (payment_status_id) REFERENCES payment_status (payment_status_id) ON DELETE CASCADE
 );
+
+/* Order export and reporting filter on order date and status */
+CREATE INDEX idx_order_date ON `order` (order_date);
+CREATE INDEX idx_order_status_date ON `order` (order_status_id, order_date);
+
+/* Back-office user search matches name prefixes (email is UNIQUE, so already indexed) */
+CREATE INDEX idx_user_first_name ON `user` (first_name);
+CREATE INDEX idx_user_last_name ON `user` (last_name, first_name);
+
+/* Sorted product lists (?ordering=price|-price|popularity|newest) with and
+   without a category, read with keyset pagination */
+CREATE INDEX idx_product_category_price ON product (category_id, price, product_id);
+CREATE INDEX idx_product_category_units_sold ON product (category_id, units_sold, product_id);
+CREATE INDEX idx_product_price ON product (price, product_id);
+CREATE INDEX idx_product_units_sold ON product (units_sold, product_id);
+
+/* Sales per day x category x brand, kept up to date by the backend (core/rollups.py) */
+CREATE TABLE sales_rollup (
+    rollup_id INT AUTO_INCREMENT PRIMARY KEY,
+    day DATE NOT NULL,
+    category_id INT NOT NULL DEFAULT 0,
+    brand_id INT NOT NULL DEFAULT 0,
+    revenue DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    units INT NOT NULL DEFAULT 0,
+    order_count INT NOT NULL DEFAULT 0,
+    UNIQUE KEY uq_sales_rollup_cell (day, category_id, brand_id),
+    KEY idx_sales_rollup_category (category_id, day),
+    KEY idx_sales_rollup_brand (brand_id, day)
+);
+
+/* Orders whose lines are currently counted in sales_rollup, so the job of a new
+   order and a later status change can run in any order without counting twice */
+CREATE TABLE sales_rollup_order (
+    order_id INT PRIMARY KEY,
+    applied_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6)
+);
+
+/* Background jobs (core/jobs.py), processed by `python manage.py run_jobs` */
+CREATE TABLE job (
+    job_id INT AUTO_INCREMENT PRIMARY KEY,
+    task VARCHAR(100) NOT NULL,
+    payload JSON NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'queued', /* queued, running, done, failed */
+    attempts INT NOT NULL DEFAULT 0,
+    max_attempts INT NOT NULL DEFAULT 5,
+    run_at DATETIME(6) NOT NULL,
+    locked_by VARCHAR(100) NOT NULL DEFAULT '',
+    locked_at DATETIME(6) NULL,
+    last_error TEXT,
+    created_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+    KEY idx_job_pick (status, run_at)
+);
+
+/* Orders whose confirmation email was sent, so a job that runs twice sends it once */
+CREATE TABLE order_confirmation (
+    order_id INT PRIMARY KEY,
+    sent_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6)
+);
+
+/* Catalog change log for /api/products/changes/?since=<version>.
+   Every write to product, product_image, category and brand adds a row, image
+   changes are logged as a change to their product. */
+CREATE TABLE catalog_change (
+    version BIGINT AUTO_INCREMENT PRIMARY KEY,
+    entity VARCHAR(20) NOT NULL, /* product, category, brand */
+    object_id INT NOT NULL,
+    action VARCHAR(10) NOT NULL, /* upsert, delete */
+    changed_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+    KEY idx_catalog_change_changed_at (changed_at)
+);
+
+CREATE TRIGGER product_after_insert AFTER INSERT ON product FOR EACH ROW
+    INSERT INTO catalog_change (entity, object_id, action) VALUES ('product', NEW.product_id, 'upsert');
+
+/* Sales counter updates (units_sold) are not catalog changes */
+CREATE TRIGGER product_after_update AFTER UPDATE ON product FOR EACH ROW
+    INSERT INTO catalog_change (entity, object_id, action)
+    SELECT 'product', NEW.product_id, 'upsert' FROM DUAL
+    WHERE NOT (NEW.name <=> OLD.name AND NEW.description <=> OLD.description AND NEW.price <=> OLD.price
+        AND NEW.stock_quantity <=> OLD.stock_quantity AND NEW.brand_id <=> OLD.brand_id
+        AND NEW.category_id <=> OLD.category_id AND NEW.is_active <=> OLD.is_active);
+
+CREATE TRIGGER product_after_delete AFTER DELETE ON product FOR EACH ROW
+    INSERT INTO catalog_change (entity, object_id, action) VALUES ('product', OLD.product_id, 'delete');
+
+CREATE TRIGGER product_image_after_insert AFTER INSERT ON product_image FOR EACH ROW
+    INSERT INTO catalog_change (entity, object_id, action) VALUES ('product', NEW.product_id, 'upsert');
+
+CREATE TRIGGER product_image_after_update AFTER UPDATE ON product_image FOR EACH ROW
+    INSERT INTO catalog_change (entity, object_id, action) VALUES ('product', NEW.product_id, 'upsert');
+
+CREATE TRIGGER product_image_after_delete AFTER DELETE ON product_image FOR EACH ROW
+    INSERT INTO catalog_change (entity, object_id, action) VALUES ('product', OLD.product_id, 'upsert');
+
+CREATE TRIGGER category_after_insert AFTER INSERT ON category FOR EACH ROW
+    INSERT INTO catalog_change (entity, object_id, action) VALUES ('category', NEW.category_id, 'upsert');
+
+CREATE TRIGGER category_after_update AFTER UPDATE ON category FOR EACH ROW
+    INSERT INTO catalog_change (entity, object_id, action) VALUES ('category', NEW.category_id, 'upsert');
+
+CREATE TRIGGER category_after_delete AFTER DELETE ON category FOR EACH ROW
+    INSERT INTO catalog_change (entity, object_id, action) VALUES ('category', OLD.category_id, 'delete');
+
+CREATE TRIGGER brand_after_insert AFTER INSERT ON brand FOR EACH ROW
+    INSERT INTO catalog_change (entity, object_id, action) VALUES ('brand', NEW.brand_id, 'upsert');
+
+CREATE TRIGGER brand_after_update AFTER UPDATE ON brand FOR EACH ROW
+    INSERT INTO catalog_change (entity, object_id, action) VALUES ('brand', NEW.brand_id, 'upsert');
+
+CREATE TRIGGER brand_after_delete AFTER DELETE ON brand FOR EACH ROW
+    INSERT INTO catalog_change (entity, object_id, action) VALUES ('brand', OLD.brand_id, 'delete');
+
+/* Order status / tracking number changes, streamed to customers by /api/orders/events/ */
+CREATE TABLE order_event (
+    event_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    order_id INT NOT NULL,
+    user_id INT NOT NULL,
+    order_status_id INT NOT NULL,
+    tracking_number VARCHAR(100) NOT NULL DEFAULT '',
+    created_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+    KEY idx_order_event_user (user_id, event_id),
+    KEY idx_order_event_created_at (created_at)
+);
+
+CREATE TRIGGER order_after_update AFTER UPDATE ON `order` FOR EACH ROW
+    INSERT INTO order_event (order_id, user_id, order_status_id, tracking_number)
+    SELECT NEW.order_id, NEW.user_id, NEW.order_status_id, NEW.tracking_number FROM DUAL
+    WHERE NOT (NEW.order_status_id <=> OLD.order_status_id) OR NOT (NEW.tracking_number <=> OLD.tracking_number);
+
+/* "Frequently bought together": pairs from orders placed since the last
+   `python manage.py build_recommendations`, cleared by the next build */
+CREATE TABLE product_pair_delta (
+    delta_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    order_id INT NOT NULL,
+    product_id INT NOT NULL,
+    related_product_id INT NOT NULL,
+    KEY idx_product_pair_delta_product (product_id),
+    KEY idx_product_pair_delta_order (order_id)
+);
+
+/* Order archive: finished orders older than ORDER_ARCHIVE_AFTER_DAYS are moved
+   here by `python manage.py archive_orders`. Same ids as the hot tables, no
+   foreign keys (users, products and addresses may be deleted later), and
+   compressed rows since they are rarely read. */
+CREATE TABLE order_archive (
+    order_id INT PRIMARY KEY,
+    user_id INT NOT NULL,
+    order_date TIMESTAMP NOT NULL,
+    total_amount DECIMAL(10, 2) NOT NULL,
+    order_status_id INT NOT NULL,
+    tracking_number VARCHAR(100) NOT NULL DEFAULT '',
+    shipping_address_id INT NULL,
+    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    KEY idx_order_archive_user_date (user_id, order_date),
+    KEY idx_order_archive_date (order_date)
+) ROW_FORMAT=COMPRESSED;
+
+CREATE TABLE order_item_archive (
+    order_item_id INT PRIMARY KEY,
+    order_id INT NOT NULL,
+    product_id INT NULL,
+    quantity INT NOT NULL,
+    price_per_unit DECIMAL(10, 2) NOT NULL,
+    KEY idx_order_item_archive_order (order_id)
+) ROW_FORMAT=COMPRESSED;
+
+CREATE TABLE payment_archive (
+    payment_id INT PRIMARY KEY,
+    order_id INT NOT NULL,
+    payment_method VARCHAR(50) NOT NULL,
+    amount DECIMAL(10, 2) NOT NULL,
+    payment_date TIMESTAMP NOT NULL,
+    payment_status_id INT NOT NULL,
+    KEY idx_payment_archive_order (order_id)
+) ROW_FORMAT=COMPRESSED;
+
+/* Resized copies of product images (python manage.py build_image_variants).
+   The files are content addressed under IMAGE_VARIANTS_DIR; source_digest and
+   spec tell which source image and which settings they were made from. */
+CREATE TABLE product_image_variant (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    image_id INT NOT NULL,
+    variant VARCHAR(20) NOT NULL, /* thumbnail, card, detail */
+    format VARCHAR(10) NOT NULL, /* jpeg, webp */
+    width INT NOT NULL,
+    height INT NOT NULL,
+    path VARCHAR(100) NOT NULL,
+    source_url VARCHAR(255) NOT NULL,
+    source_digest CHAR(64) NOT NULL,
+    spec VARCHAR(16) NOT NULL,
+    created_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+    UNIQUE KEY uq_product_image_variant (image_id, variant, format),
+    FOREIGN KEY (image_id) REFERENCES product_image(image_id) ON DELETE CASCADE
+);
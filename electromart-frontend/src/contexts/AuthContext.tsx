@@ -1,6 +1,6 @@
 import React, { createContext, useState, useEffect, ReactNode } from "react";
 import { User } from "../data/models";
-import { fetchCurrentUser, registerUser } from "../services/apiService";
+import { fetchCurrentUser, fetchSession, registerUser } from "../services/apiService";
 
 export interface AuthContextType {
   currentUser: User | null;
@@ -27,26 +27,21 @@ export const AuthProvider: React.FC<AuthProviderProps> = ({ children }) => {
       .find((row) => row.startsWith("csrftoken="))
       ?.split("=")[1] || "";
 
-  // Ensure CSRF cookie is set before any login/logout
+  // Set the CSRF cookie and load the user on mount in a single request
   useEffect(() => {
-    fetch("http://localhost:8000/api/csrf/", {
-      credentials: "include",
-    }).then(() => setCsrfReady(true));
-  }, []);
-
-  // Load user on mount
-  useEffect(() => {
-    const loadUser = async () => {
+    const loadSession = async () => {
       try {
-        const user = await fetchCurrentUser();
+        const user = await fetchSession();
         setCurrentUser(user);
       } catch {
         setCurrentUser(null);
       } finally {
+        // Unblock login/register even if the session request failed
+        setCsrfReady(true);
         setIsLoading(false);
       }
     };
-    loadUser();
+    loadSession();
   }, []);
 
   const login = async (email: string, password: string) => {
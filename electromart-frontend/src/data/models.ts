@@ -124,6 +124,16 @@ export interface OrderFromDB {
   itemCount?: number;
 }
 
+// Pushed by /api/orders/events/ when an order's status or tracking number changes
+export interface OrderEvent {
+  id: number;
+  order_id: number;
+  user_id: number;
+  order_status_id: number;
+  status: string;
+  tracking_number: string;
+}
+
 export const OrderStatusMap: { [key: number]: string } = {
   1: 'Confirmed',
   2: 'Processing',
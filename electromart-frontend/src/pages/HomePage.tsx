@@ -1,7 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { Link } from 'react-router-dom';
 import { Category, Product } from '../data/models';
-import { fetchCategories, fetchProducts } from '../services/apiService';
+import { fetchHomePageData } from '../services/apiService';
 import ProductCard from '../components/ProductCard';
 
 interface DisplayCategoryRow {
@@ -21,10 +21,7 @@ const HomePage: React.FC = () => {
       setError(null);
 
       try {
-        const [categoriesData, productsData] = await Promise.all([
-          fetchCategories(),
-          fetchProducts(),
-        ]);
+        const [categoriesData, productsData] = await fetchHomePageData();
 
         const parentCategories = categoriesData.filter(cat => cat.parentId === null);
         const childCategories = categoriesData.filter(cat => cat.parentId !== null);
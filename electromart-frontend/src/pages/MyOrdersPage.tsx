@@ -3,7 +3,7 @@ import React, { useState, useEffect } from 'react';
 import { Link } from 'react-router-dom';
 import { useAuth } from '../hooks/useAuth';
 import { OrderFromDB, OrderStatusMap } from '../data/models'; // Import types and map
-import { fetchUserOrders } from '../services/apiService'; // Import the new service function
+import { fetchUserOrders, subscribeToOrderEvents } from '../services/apiService'; // Import the new service function
 
 const MyOrdersPage: React.FC = () => {
   const { currentUser } = useAuth();
@@ -39,6 +39,20 @@ const MyOrdersPage: React.FC = () => {
     }
   }, [currentUser]); // Re-fetch if the currentUser changes
 
+  // Apply status and tracking changes pushed by the server instead of re-fetching
+  useEffect(() => {
+    if (!currentUser) return;
+    return subscribeToOrderEvents((event) => {
+      setOrders((prevOrders) =>
+        prevOrders.map((order) =>
+          order.order_id === event.order_id
+            ? { ...order, order_status_id: event.order_status_id, tracking_number: event.tracking_number }
+            : order
+        )
+      );
+    });
+  }, [currentUser]);
+
   if (!currentUser) {
     return (
       <div className="container mx-auto p-4 md:p-8 text-center">
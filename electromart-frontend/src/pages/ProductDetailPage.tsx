@@ -3,7 +3,7 @@ import { useParams, Link } from "react-router-dom";
 import { Product } from "../data/models";
 import { FaChevronLeft, FaChevronRight } from "react-icons/fa";
 import { useCart } from "../hooks/useCart";
-import { fetchProducts } from "../services/apiService";
+import { fetchProductById } from "../services/apiService";
 
 const ProductDetailPage: React.FC = () => {
   const { productId } = useParams<{ productId?: string }>();
@@ -25,18 +25,9 @@ const ProductDetailPage: React.FC = () => {
 
     const loadProduct = async () => {
       try {
-        const allProducts = await fetchProducts();
-        const foundProduct = allProducts.find(
-          (p) => p.id.toString() === productId
-        );
-
-        if (!foundProduct) {
-          setError("Product not found.");
-          setProduct(null);
-        } else {
-          setProduct(foundProduct);
-          setError(null);
-        }
+        const foundProduct = await fetchProductById(productId);
+        setProduct(foundProduct);
+        setError(null);
       } catch (e) {
         console.error("Failed to load product:", e);
         setError(e instanceof Error ? e.message : "Failed to load data");
@@ -5,7 +5,8 @@ import {
   Product,
   Category,
   User,
-  OrderFromDB
+  OrderFromDB,
+  OrderEvent
 } from '../data/models';
 
 // --- Utility: Generic response handler ---
@@ -73,12 +74,81 @@ export const fetchProducts = async (): Promise<Product[]> => {
   return apiProducts.map(transformAPIProductToProduct);
 };
 
+export const fetchProductById = async (productId: number | string): Promise<Product> => {
+  const response = await fetch(`http://localhost:8000/api/products/${productId}/`);
+  const apiProduct: APIProduct = await handleResponse(response);
+  return transformAPIProductToProduct(apiProduct);
+};
+
+// Returns the products in the same order as the ids; unknown ids are skipped
+export const fetchProductsByIds = async (productIds: Array<number | string>): Promise<Product[]> => {
+  if (productIds.length === 0) return [];
+  const response = await fetch(`http://localhost:8000/api/products/?ids=${productIds.join(',')}`);
+  const apiProducts: APIProduct[] = await handleResponse(response);
+  return apiProducts.map(transformAPIProductToProduct);
+};
+
+// --- Catalog delta sync ---
+export interface ProductChanges {
+  version: number;
+  hasMore: boolean;
+  upserted: Product[];
+  deleted: number[];
+}
+
+// Products changed since `version` (the X-Catalog-Version of the last full
+// load or the version of the previous call). Throws on 410, reload everything then.
+export const fetchProductChanges = async (version: number): Promise<ProductChanges> => {
+  const response = await fetch(`http://localhost:8000/api/products/changes/?since=${version}`);
+  const data: { version: number; has_more: boolean; upserted: APIProduct[]; deleted: number[] } =
+    await handleResponse(response);
+  return {
+    version: data.version,
+    hasMore: data.has_more,
+    upserted: data.upserted.map(transformAPIProductToProduct),
+    deleted: data.deleted,
+  };
+};
+
 export const fetchCategories = async (): Promise<Category[]> => {
   const response = await fetch('http://localhost:8000/api/categories/');
   const apiCategories: APICategory[] = await handleResponse(response);
   return apiCategories.map(transformAPICategory);
 };
 
+// --- Batch: several GET requests in one round trip ---
+export interface BatchResponse<T = unknown> {
+  path: string;
+  status: number;
+  body: T;
+}
+
+export const fetchBatch = async (paths: string[]): Promise<BatchResponse[]> => {
+  const query = paths.map((path) => `path=${encodeURIComponent(path)}`).join('&');
+  const response = await fetch(`http://localhost:8000/api/batch/?${query}`, {
+    credentials: "include",
+  });
+  const data: { responses: BatchResponse[] } = await handleResponse(response);
+  return data.responses;
+};
+
+export const fetchHomePageData = async (): Promise<[Category[], Product[]]> => {
+  const [categories, products] = await fetchBatch(['/api/categories/', '/api/products/']);
+  if (categories.status !== 200 || products.status !== 200) {
+    throw new Error('API Error: could not load categories and products');
+  }
+  return [
+    (categories.body as APICategory[]).map(transformAPICategory),
+    (products.body as APIProduct[]).map(transformAPIProductToProduct),
+  ];
+};
+
+// Sets the CSRF cookie and loads the current user (null if not logged in)
+export const fetchSession = async (): Promise<User | null> => {
+  const [me] = await fetchBatch(['/api/me/']);
+  return me.status === 200 ? (me.body as User) : null;
+};
+
 export const fetchCurrentUser = async (): Promise<User> => {
   const res = await fetch("http://localhost:8000/api/me/", {
     credentials: "include",
@@ -113,4 +183,15 @@ export const fetchUserOrders = async (userId: number | string): Promise<OrderFro
   });
   
   return handleResponse<OrderFromDB[]>(response);
-};
\ No newline at end of file
+};
+
+// Live order updates for the logged in user. Returns a function that closes the stream.
+export const subscribeToOrderEvents = (onEvent: (event: OrderEvent) => void): (() => void) => {
+  const source = new EventSource("http://localhost:8000/api/orders/events/", {
+    withCredentials: true,
+  });
+  source.addEventListener("order", (message) => {
+    onEvent(JSON.parse((message as MessageEvent).data) as OrderEvent);
+  });
+  return () => source.close();
+};